@@ -1,17 +1,31 @@
 import os
 import json
-from flask import Flask, render_template, request, jsonify, send_from_directory, Response
+import time
+import base64
+import hashlib
+import tempfile
+from flask import Flask, render_template, request, jsonify, send_from_directory, Response, g
 from werkzeug.utils import secure_filename
-from datetime import datetime
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.expression import UnaryExpression
+from datetime import datetime, timedelta
 import morse_processor  # This is our custom logic file
-import audio_preprocessor  # Audio preprocessing module
 import export_utils  # Export utilities
-from models import db, AudioFile, DecodeResult, Session
+from audio_cache import AudioCache
+import metrics as app_metrics  # Prometheus-style metrics
+from models import db, AudioFile, DecodeResult, Session, BatchJob, enable_sqlite_tuning, upgrade_schema
+from timing import StageTimer
+from batch_processor import (decode_params, decode_cache_key, find_cached_result, get_audio_metadata,
+                             store_decode_result, unpack_analysis, DIGEST_CHUNK_BYTES)
+import job_queue
 
 # --- Configuration ---
 UPLOAD_FOLDER = 'uploads'
 GENERATED_FOLDER = 'generated_audio'
 TEMP_FOLDER = 'temp'
+METRICS_FOLDER = os.environ.get('M2T_METRICS_DIR', 'metrics')  # Shared by all worker processes; clear on deploy
 ALLOWED_EXTENSIONS = {'wav', 'mp3', 'flac', 'ogg', 'm4a', 'aac'}
 
 app = Flask(__name__)
@@ -19,8 +33,17 @@ app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['GENERATED_FOLDER'] = GENERATED_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16 MB max upload size
 app.config['TEMP_FOLDER'] = TEMP_FOLDER
+app.config['GENERATED_CACHE_MAX_BYTES'] = 512 * 1024 * 1024  # LRU budget for generated audio
+app.config['GENERATED_CACHE_MAX_AGE'] = 30 * 24 * 3600  # Seconds before an unused file expires
+app.config['BATCH_WORKERS'] = int(os.environ.get('M2T_BATCH_WORKERS', 0)) or None  # Decode processes per batch (default: CPU count)
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///m2t_analysis.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+    # Request threads, event streams and the job runner each check out a connection
+    'pool_size': 10,
+    'max_overflow': 20,
+    'pool_timeout': 30
+}
 
 # Initialize database
 db.init_app(app)
@@ -30,9 +53,45 @@ os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(GENERATED_FOLDER, exist_ok=True)
 os.makedirs(TEMP_FOLDER, exist_ok=True)
 
+# Per-process metrics, aggregated across workers through METRICS_FOLDER
+metrics = app_metrics.create_registry(METRICS_FOLDER)
+
+# Generated audio is content-addressed, so identical requests share one file
+audio_cache = AudioCache(GENERATED_FOLDER, app.config['GENERATED_CACHE_MAX_BYTES'], app.config['GENERATED_CACHE_MAX_AGE'])
+
 # Create database tables
 with app.app_context():
+    enable_sqlite_tuning(db.engine)
     db.create_all()
+    upgrade_schema()
+
+@app.before_request
+def start_request_metrics():
+    g.metrics_start = time.perf_counter()
+    metrics.add_gauge('m2t_http_requests_in_progress', 1)
+
+@app.after_request
+def record_request_metrics(response):
+    endpoint = request.endpoint or 'unmatched'
+    metrics.inc('m2t_http_requests_total', endpoint=endpoint, method=request.method, status=response.status_code)
+    start = g.metrics_start
+
+    def finish():
+        # Runs when the server closes the response, i.e. after a streamed body has been sent
+        metrics.add_gauge('m2t_http_requests_in_progress', -1)
+        metrics.observe('m2t_http_request_duration_seconds', time.perf_counter() - start, endpoint=endpoint)
+        metrics.flush()
+
+    response.call_on_close(finish)
+    g.metrics_on_close = True
+    return response
+
+@app.teardown_request
+def finish_request_metrics(exc):
+    # Only for requests that never produced a response; the rest finish on close
+    if 'metrics_start' in g and 'metrics_on_close' not in g:
+        metrics.add_gauge('m2t_http_requests_in_progress', -1)
+        metrics.flush()
 
 def allowed_file(filename):
     """Checks if the uploaded file has an allowed extension."""
@@ -43,16 +102,64 @@ def allowed_file(filename):
 # == Main Application Routes ==
 # --- ---
 
+def save_upload(file, filename):
+    """
+    Streams an upload into UPLOAD_FOLDER, hashing it on the way.
+    If a stored AudioFile has the same contents and its file is still on disk,
+    the new copy is dropped and that file reused, so repeated uploads are
+    neither stored nor decoded twice. Otherwise a numeric suffix keeps
+    existing files from being overwritten.
+    Returns (filename, filepath, digest).
+    """
+    upload_folder = app.config['UPLOAD_FOLDER']
+    digest = hashlib.sha256()
+    fd, temp_path = tempfile.mkstemp(suffix='.upload', dir=upload_folder)
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            for chunk in iter(lambda: file.stream.read(DIGEST_CHUNK_BYTES), b''):
+                digest.update(chunk)
+                out.write(chunk)
+        digest = digest.hexdigest()
+        
+        for known in AudioFile.query.filter_by(digest=digest).with_entities(AudioFile.filepath):
+            if os.path.exists(known.filepath):
+                os.remove(temp_path)
+                return os.path.basename(known.filepath), known.filepath, digest
+        
+        base_name, ext = os.path.splitext(filename)
+        filepath = os.path.join(upload_folder, filename)
+        counter = 1
+        while os.path.exists(filepath):
+            filename = f"{base_name}_{counter}{ext}"
+            filepath = os.path.join(upload_folder, filename)
+            counter += 1
+        os.replace(temp_path, filepath)
+        return filename, filepath, digest
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
 @app.route('/')
 def index():
     """Serves the main HTML page."""
-    return render_template('index.html')
+    return render_template('index.html', max_upload_bytes=app.config['MAX_CONTENT_LENGTH'])
+
+def synthesis_params(data):
+    """Synthesis parameters from a request, with defaults filled in so cache keys are stable."""
+    return {
+        'wpm': float(data.get('wpm') or morse_processor.WPM),
+        'farnsworth_wpm': float(data['farnsworth_wpm']) if data.get('farnsworth_wpm') else None,
+        'tone_freq': float(data.get('tone_freq') or morse_processor.TONE_FREQUENCY),
+        'sample_rate': int(data.get('sample_rate') or morse_processor.SAMPLE_RATE)
+    }
 
 @app.route('/translate-to-morse', methods=['POST'])
 def translate_to_morse():
     """
     Handles text-to-morse translation.
-    Takes JSON {'text': '...'} and returns JSON {'filepath': '...', 'error': '...'}
+    Takes JSON {'text': '...'} (optionally 'wpm', 'farnsworth_wpm', 'tone_freq',
+    'sample_rate') and returns JSON {'filepath': '...', 'error': '...'}
     """
     data = request.get_json()
     if not data or 'text' not in data:
@@ -61,21 +168,49 @@ def translate_to_morse():
     text_to_translate = data['text']
     
     try:
-        # Generate a unique filename for the audio file
-        output_filename = f"morse_{hash(text_to_translate)}.wav"
-        output_path = os.path.join(app.config['GENERATED_FOLDER'], output_filename)
+        synth_params = synthesis_params(data)
         
-        # Call the processor to generate the audio
-        morse_processor.generate_morse_audio(text_to_translate, output_path)
+        # Serve the cached file, or call the processor to generate it
+        output_filename, cache_hit = audio_cache.get_or_create(
+            text_to_translate, synth_params, morse_processor.SYNTHESIZER_VERSION,
+            morse_processor.generate_morse_audio)
+        metrics.inc('m2t_generated_cache_requests_total', result='hit' if cache_hit else 'miss')
         
         # Return the path so the client can fetch it
         # We return a *relative* path that the /generated/ route can serve
-        return jsonify({'filepath': f'/generated/{output_filename}'})
+        return jsonify({'filepath': f'/generated/{output_filename}', 'cached': cache_hit})
         
     except Exception as e:
         print(f"Error during text-to-morse conversion: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/translate-to-morse/stream', methods=['GET'])
+def translate_to_morse_stream():
+    """
+    Streams text-to-morse audio as it is generated.
+    Takes the same fields as /translate-to-morse as query parameters and
+    returns audio/wav directly, so an <audio> element can start playing
+    before the rest of a long message is rendered. Nothing is written to disk.
+    """
+    text_to_translate = request.args.get('text')
+    if not text_to_translate:
+        return jsonify({'error': 'No text provided.'}), 400
+    
+    try:
+        synthesizer = morse_processor.get_synthesizer(**synthesis_params(request.args))
+        chunks = synthesizer.stream(text_to_translate)
+        header = next(chunks)  # Fails here, before streaming starts, if the message is too long
+    except Exception as e:
+        print(f"Error during text-to-morse streaming: {e}")
+        return jsonify({'error': str(e)}), 500
+    
+    def generate():
+        yield header
+        yield from chunks
+    
+    return Response(generate(), mimetype='audio/wav',
+                    headers={'Content-Length': str(8 + int.from_bytes(header[4:8], 'little'))})  # RIFF size + 8
+
 @app.route('/translate-from-audio', methods=['POST'])
 def translate_from_audio():
     """
@@ -102,29 +237,30 @@ def translate_from_audio():
     
     # Type assertion: after checks above, filename_raw is guaranteed to be a string
     filename = secure_filename(str(filename_raw))
-    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    file.save(filepath)
+    filename, filepath, digest = save_upload(file, filename)
     
-    # Convert to WAV if necessary
-    converted_filepath = filepath
-    temp_wav_path = None
+    timer = StageTimer()
     
     try:
-        if file_ext != 'wav':
-            # Convert to WAV format
-            base_name = os.path.splitext(filename)[0]
-            temp_wav_path = os.path.join(app.config.get('TEMP_FOLDER', TEMP_FOLDER), f"{base_name}_temp.wav")
-            converted_filepath = audio_preprocessor.convert_audio_to_wav(filepath, temp_wav_path)
-        
         # Get tuning parameters from the form
-        wpm_override = request.form.get('wpm', default=None, type=int)
-        threshold_factor = request.form.get('threshold', default=1.0, type=float)
-        frequency_override = request.form.get('frequency', default=None, type=int)
+        hop_s = request.form.get('hop', 'auto')
+        if hop_s != 'auto':
+            hop_s = float(hop_s)
+        config = {
+            'wpm': request.form.get('wpm', default=None, type=int),
+            'threshold': request.form.get('threshold', default=1.0, type=float),
+            'frequency': request.form.get('frequency', default=None, type=int),
+            'front_end': request.form.get('front_end', 'direct'),
+            'resample_quality': request.form.get('resample_quality', 'balanced'),
+            'threshold_mode': request.form.get('threshold_mode', 'global'),
+            'adaptive_window': request.form.get('adaptive_window', default=3.0, type=float),
+            'window': request.form.get('window', default=0.01, type=float),
+            'hop': hop_s
+        }
         
         # Get preprocessing options
-        preprocessing_config = {}
         if request.form.get('preprocess', 'false').lower() == 'true':
-            preprocessing_config = {
+            config['preprocessing'] = {
                 'remove_dc': request.form.get('remove_dc', 'true').lower() == 'true',
                 'apply_bandpass': request.form.get('apply_bandpass', 'false').lower() == 'true',
                 'bandpass_low': float(request.form.get('bandpass_low', 300)),
@@ -140,40 +276,27 @@ def translate_from_audio():
                 'noise_reduction_db': float(request.form.get('noise_reduction_db', 6.0)),
             }
         
-        # Apply preprocessing if configured
-        if preprocessing_config and any(preprocessing_config.values()):
-            # Load audio, preprocess, save temporary preprocessed file
-            import librosa
-            import numpy as np
-            import soundfile as sf
-            
-            audio, sr = librosa.load(converted_filepath, sr=None)
-            processed_audio = audio_preprocessor.preprocess_audio(audio, sr, preprocessing_config)
-            
-            # Save preprocessed audio temporarily
-            preprocessed_path = os.path.join(
-                app.config.get('TEMP_FOLDER', TEMP_FOLDER), 
-                f"{os.path.splitext(os.path.basename(converted_filepath))[0]}_preprocessed.wav"
-            )
-            sf.write(preprocessed_path, processed_audio, sr)
-            converted_filepath = preprocessed_path
-
-        # Call the processor to analyze the audio
-        analysis_data = morse_processor.process_audio_file(
-            converted_filepath, 
-            wpm_override=wpm_override, 
-            threshold_factor=threshold_factor,
-            frequency_override=frequency_override,
-            preprocess_config=None  # Already preprocessed if needed
-        )
+        # Repeats of a decode (same audio, settings and decoder version) come from the database
+        cache_key = decode_cache_key(digest, config)
+        cached = find_cached_result(cache_key)
+        if cached is not None:
+            metrics.inc('m2t_decode_cache_requests_total', source='single', result='hit')
+            analysis_data = unpack_analysis(cached.analysis)
+            analysis_data['cached'] = True
+            return jsonify(analysis_data)
+        metrics.inc('m2t_decode_cache_requests_total', source='single', result='miss')
+        
+        # Call the processor to analyze the audio (preprocessing runs on the loaded samples;
+        # compressed formats are decoded by ffmpeg straight into memory)
+        analysis_data = morse_processor.process_audio_file(filepath, timer=timer, **decode_params(config))
         
-        # Clean up temporary files
-        if temp_wav_path and os.path.exists(temp_wav_path):
-            try:
-                os.remove(temp_wav_path)
-            except:
-                pass
+        app_metrics.record_decode(metrics, analysis_data, 'single', os.path.getsize(filepath))
         
+        # Stored for the result cache and the results history
+        metadata = get_audio_metadata(filepath)
+        if metadata:
+            decoded = {'success': True, 'error': None, 'metadata': metadata, 'analysis': analysis_data}
+            store_decode_result(decoded, filepath, filename_raw, config, digest, cache_key)
         return jsonify(analysis_data)
         
     except Exception as e:
@@ -181,13 +304,6 @@ def translate_from_audio():
         import traceback
         traceback.print_exc()
         
-        # Clean up on error
-        if temp_wav_path and os.path.exists(temp_wav_path):
-            try:
-                os.remove(temp_wav_path)
-            except:
-                pass
-        
         return jsonify({'error': str(e)}), 500
 
 # --- ---
@@ -214,18 +330,8 @@ def batch_upload():
     
     for file in files:
         if file and file.filename and allowed_file(file.filename):
-            filename = secure_filename(file.filename)
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            
-            # Check if file already exists, append number if needed
-            base_name, ext = os.path.splitext(filename)
-            counter = 1
-            while os.path.exists(filepath):
-                filename = f"{base_name}_{counter}{ext}"
-                filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                counter += 1
-            
-            file.save(filepath)
+            # Contents seen before reuse the stored file instead of a suffixed copy
+            filename, filepath, _ = save_upload(file, secure_filename(file.filename))
             uploaded_files.append({
                 'filename': filename,
                 'filepath': filepath,
@@ -238,6 +344,17 @@ def batch_upload():
         'count': len(uploaded_files)
     })
 
+def record_batch_decode(filepath, result):
+    """Decode metrics for one batch file (from /batch-process or a queued job)"""
+    if result.get('cached'):
+        metrics.inc('m2t_decode_cache_requests_total', source='batch', result='hit')
+        return
+    metrics.inc('m2t_decode_cache_requests_total', source='batch', result='miss')
+    if result['success']:
+        app_metrics.record_decode(metrics, result['data']['analysis'], 'batch', os.path.getsize(filepath))
+    else:
+        metrics.inc('m2t_decodes_total', source='batch', outcome='error')
+
 @app.route('/batch-process', methods=['POST'])
 def batch_process():
     """Process multiple files in batch"""
@@ -246,29 +363,23 @@ def batch_process():
         file_ids = data.get('file_ids', [])
         config = data.get('config', {})
         
-        from batch_processor import process_file_batch
+        from batch_processor import process_batch
         
-        results = []
-        for file_info in file_ids:
-            filepath = file_info.get('filepath')
-            original_filename = file_info.get('original_filename')
-            
-            if not os.path.exists(filepath):
-                results.append({
-                    'success': False,
-                    'filename': original_filename,
-                    'error': 'File not found'
-                })
-                continue
-            
-            result = process_file_batch(
-                filepath,
-                original_filename,
-                app.config['UPLOAD_FOLDER'],
-                app.config['TEMP_FOLDER'],
-                config
-            )
-            results.append(result)
+        completed = []
+        
+        def record_result(filepath, result):
+            completed.append(result)
+            metrics.add_gauge('m2t_batch_queue_depth', -1)
+            record_batch_decode(filepath, result)
+        
+        metrics.add_gauge('m2t_batch_queue_depth', len(file_ids))
+        try:
+            # Files are decoded on a process pool; this thread does the database writes
+            files = [(file_info.get('filepath'), file_info.get('original_filename')) for file_info in file_ids]
+            results = process_batch(files, config, workers=app.config['BATCH_WORKERS'], on_result=record_result)
+        finally:
+            # Files not reached (e.g. after an exception) leave the queue too
+            metrics.add_gauge('m2t_batch_queue_depth', len(completed) - len(file_ids))
         
         # Summary statistics
         successful = sum(1 for r in results if r['success'])
@@ -297,8 +408,9 @@ def batch_process():
 def batch_status():
     """Get batch processing status"""
     try:
-        processed_count = AudioFile.query.filter_by(processed=True).count()
-        total_count = AudioFile.query.count()
+        # Plain COUNTs (Query.count() wraps the whole row in a subquery); the first uses the processed index
+        processed_count = db.session.query(func.count(AudioFile.id)).filter(AudioFile.processed.is_(True)).scalar()
+        total_count = db.session.query(func.count(AudioFile.id)).scalar()
         
         recent_results = DecodeResult.query.order_by(DecodeResult.timestamp.desc()).limit(10).all()
         
@@ -310,10 +422,187 @@ def batch_status():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+RESULTS_PAGE_SIZE = 50
+RESULTS_MAX_PAGE_SIZE = 500
+RESULTS_SORT_THRESHOLD = 5000  # Quality matches below which they are sorted rather than found by a timestamp scan
+
+def encode_results_cursor(decode_result):
+    """Opaque keyset cursor: the (timestamp, id) of the last result on a page"""
+    key = f"{decode_result.timestamp.isoformat()}|{decode_result.id}"
+    return base64.urlsafe_b64encode(key.encode()).decode()
+
+def decode_results_cursor(cursor):
+    timestamp, result_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+    return datetime.fromisoformat(timestamp), int(result_id)
+
+def without_index(column):
+    """SQLite's unary ``+column``: the same value, but the planner will not use the column's index for it"""
+    return UnaryExpression(column, operator=operators.custom_op('+'), type_=column.type)
+
+@app.route('/results', methods=['GET'])
+def list_results():
+    """
+    Page through stored decode results, newest first.
+    Query parameters (all optional): 'from'/'to' (ISO dates or datetimes, on the decode time),
+    'min_wpm'/'max_wpm', 'min_frequency'/'max_frequency', 'min_quality'/'max_quality',
+    'limit' (default 50, max 500) and 'cursor' (the 'next_cursor' of the previous page).
+    Pages are keyset-paginated on (timestamp, id), so every page costs the same
+    however deep it is; each result carries its audio file, loaded in the same query.
+    """
+    try:
+        filters, quality_filters = [], []
+        for name, column in (('wpm', DecodeResult.wpm), ('frequency', DecodeResult.frequency),
+                             ('quality', DecodeResult.quality_score)):
+            target = quality_filters if name == 'quality' else filters
+            if request.args.get(f'min_{name}') is not None:
+                target.append(column >= float(request.args[f'min_{name}']))
+            if request.args.get(f'max_{name}') is not None:
+                target.append(column <= float(request.args[f'max_{name}']))
+        
+        date_from = request.args.get('from')
+        date_from = datetime.fromisoformat(date_from) if date_from else None
+        date_to = request.args.get('to')
+        date_to_exclusive = None
+        if date_to:
+            # A bare date includes the whole day
+            date_to_exclusive = 'T' not in date_to
+            date_to = datetime.fromisoformat(date_to) + (timedelta(days=1) if date_to_exclusive else timedelta(0))
+        
+        cursor = request.args.get('cursor')
+        cursor = decode_results_cursor(cursor) if cursor else None
+        
+        limit = min(max(request.args.get('limit', RESULTS_PAGE_SIZE, type=int), 1), RESULTS_MAX_PAGE_SIZE)
+    except ValueError as e:
+        return jsonify({'error': f'Invalid query parameter: {e}'}), 400
+    
+    try:
+        # Results are normally read in order off the timestamp index. SQLite has no range
+        # statistics, so with a narrow quality range that walk would scan most of the table;
+        # when the quality index finds only a few matches, those are read and sorted instead.
+        timestamp = DecodeResult.timestamp
+        if quality_filters:
+            probe = DecodeResult.query.filter(*quality_filters).with_entities(DecodeResult.id).limit(RESULTS_SORT_THRESHOLD)
+            if db.session.query(func.count()).select_from(probe.subquery()).scalar() < RESULTS_SORT_THRESHOLD:
+                timestamp = without_index(DecodeResult.timestamp)
+        
+        query = DecodeResult.query.filter(*filters, *quality_filters)
+        if date_from:
+            query = query.filter(timestamp >= date_from)
+        if date_to:
+            query = query.filter(timestamp < date_to if date_to_exclusive else timestamp <= date_to)
+        if cursor:
+            query = query.filter(db.or_(timestamp < cursor[0], db.and_(timestamp == cursor[0], DecodeResult.id < cursor[1])))
+        
+        # One row more than the page tells whether another page follows
+        rows = (query.options(joinedload(DecodeResult.audio_file))
+                .order_by(timestamp.desc(), DecodeResult.id.desc())
+                .limit(limit + 1)
+                .all())
+        page = rows[:limit]
+        results = []
+        for decode_result in page:
+            entry = decode_result.to_dict()
+            entry['audio_file'] = decode_result.audio_file.to_dict() if decode_result.audio_file else None
+            results.append(entry)
+        
+        return jsonify({
+            'results': results,
+            'count': len(results),
+            'next_cursor': encode_results_cursor(page[-1]) if len(rows) > limit else None
+        })
+    except Exception as e:
+        print(f"Error listing results: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/batch-jobs', methods=['POST'])
+def submit_batch_job():
+    """
+    Queue a batch job and return at once.
+    Accepts the same JSON as /batch-process ('file_ids' from /batch-upload and 'config');
+    progress is available from the job's status, events and results endpoints.
+    """
+    data = request.get_json(silent=True)
+    if not data or not data.get('file_ids'):
+        return jsonify({'error': 'No files provided'}), 400
+    
+    try:
+        files = [(file_info.get('filepath'), file_info.get('original_filename')) for file_info in data['file_ids']]
+        job = job_queue.submit_job(files, data.get('config', {}))
+        batch_jobs.start()  # No-op once running
+        batch_jobs.notify()
+        return jsonify({'success': True, 'job': job.to_dict()}), 202
+    except Exception as e:
+        print(f"Error queueing batch job: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/batch-jobs/<int:job_id>', methods=['GET'])
+def batch_job_status(job_id):
+    """Status and progress counters of a batch job"""
+    job = db.session.get(BatchJob, job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/batch-jobs/<int:job_id>/cancel', methods=['POST'])
+def cancel_batch_job(job_id):
+    """Cancel a queued or running batch job; files already decoded keep their results"""
+    job = db.session.get(BatchJob, job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if not job_queue.cancel_job(job):
+        return jsonify({'error': f'Job already {job.status}'}), 409
+    db.session.refresh(job)
+    return jsonify({'success': True, 'job': job.to_dict()})
+
+@app.route('/batch-jobs/<int:job_id>/results', methods=['GET'])
+def batch_job_results(job_id):
+    """
+    Finished files of a batch job, one page at a time.
+    Query parameters: 'after' (position of the last item already received) and 'limit' (max 1000).
+    """
+    job = db.session.get(BatchJob, job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    after = request.args.get('after', -1, type=int)
+    limit = min(max(request.args.get('limit', 100, type=int), 1), 1000)
+    items = job_queue.job_results(job_id, after, limit)
+    return jsonify({
+        'job': job.to_dict(),
+        'results': [item.to_dict() for item in items],
+        'next_after': items[-1].position if len(items) == limit else None
+    })
+
+@app.route('/batch-jobs/<int:job_id>/events', methods=['GET'])
+def batch_job_events(job_id):
+    """Server-Sent Events stream of a batch job's per-file progress"""
+    if db.session.get(BatchJob, job_id) is None:
+        return jsonify({'error': 'Job not found'}), 404
+    last_event_id = request.headers.get('Last-Event-ID', request.args.get('last_event_id', -1), type=int)
+    
+    def generate():
+        with app.app_context():
+            yield from job_queue.job_events(job_id, last_event_id)
+    
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Stop reverse proxies from buffering the stream
+    return response
+
 @app.route('/generated/<filename>')
 def serve_generated_file(filename):
     """Serves files from the GENERATED_FOLDER."""
-    return send_from_directory(app.config['GENERATED_FOLDER'], filename)
+    # Names are content digests, so a file never changes once written
+    return send_from_directory(app.config['GENERATED_FOLDER'], filename, max_age=24 * 3600)
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Counters and histograms of all worker processes in Prometheus text format."""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/generated-cache/stats')
+def generated_cache_stats():
+    """Hit/miss counters and size of the generated audio cache (this worker)."""
+    return jsonify(audio_cache.stats())
 
 # --- ---
 # == Export Routes ==
@@ -365,6 +654,12 @@ def export_decoded():
         print(f"Error during export: {e}")
         return jsonify({'error': str(e)}), 500
 
+# Queued batch jobs run on a background thread, started by the first submit of a
+# process or at startup below; importing the app (CLI tools, tests, the reloader's
+# watcher process) never starts it. WSGI servers can call batch_jobs.start() from
+# a post-fork hook so that jobs left queued by a restart resume without a submit.
+batch_jobs = job_queue.JobQueue(app, workers=app.config['BATCH_WORKERS'], on_result=record_batch_decode)
+
 # --- ---
 # == Main execution ==
 # --- ---
@@ -372,4 +667,6 @@ def export_decoded():
 if __name__ == '__main__':
     # Runs on localhost, port 5000.
     # debug=True auto-reloads when you save changes.
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        batch_jobs.start()  # Only in the reloader's child, which serves the requests
     app.run(debug=True, host='127.0.0.1', port=5000)
@@ -0,0 +1,178 @@
+"""
+Content-addressed cache for generated Morse audio
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024  # 512 MB of generated audio
+DEFAULT_MAX_AGE_S = 30 * 24 * 3600  # Entries unused for 30 days are dropped
+AGE_SWEEP_INTERVAL_S = 3600  # How often a miss also sweeps expired entries
+STALE_TEMP_S = 3600  # Temporary files older than this were left by a crashed worker
+
+FILE_PREFIX = 'morse_'
+FILE_SUFFIX = '.wav'
+TEMP_PREFIX = 'partial_'
+
+def cache_key(text, params, version):
+    """
+    Stable digest for one generated file
+
+    Args:
+        text: Message text (case-insensitive, as the synthesizer upper-cases it)
+        params: Dict of synthesis parameters (WPM, tone, sample rate, ...)
+        version: Synthesizer version, so output changes invalidate old entries
+
+    Returns:
+        Hex SHA-256 digest
+    """
+    payload = json.dumps({'text': text.upper(), 'params': params, 'version': version},
+                         sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class AudioCache:
+    """
+    Generated audio stored on disk under its content digest.
+
+    Files are named after ``cache_key`` so every worker process (and every
+    restart) finds the same file for the same request. Hits refresh the file's
+    mtime, which doubles as the LRU clock. Misses write to a temporary file and
+    ``os.replace`` it into place, so concurrent workers never serve a partial
+    file. Every miss re-reads the directory size, since other workers write
+    to it too; when it grows past ``max_bytes``, the least recently used
+    entries are removed. Entries older than ``max_age_s`` and temporary files
+    abandoned by crashed workers are also swept. Hit/miss/eviction counters
+    are per process.
+    """
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES, max_age_s=DEFAULT_MAX_AGE_S):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age_s = max_age_s
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._total_bytes = sum(size for _, _, size in self._entries())
+        self._last_sweep = 0.0
+
+    def filename_for(self, key):
+        return f"{FILE_PREFIX}{key}{FILE_SUFFIX}"
+
+    def get_or_create(self, text, params, version, generate):
+        """
+        Returns the cached file for a request, generating it on a miss
+
+        Args:
+            text: Message text
+            params: Dict of synthesis parameters, passed to ``generate`` as keywords
+            version: Synthesizer version included in the key
+            generate: Callable ``generate(text, output_path, **params)``
+
+        Returns:
+            Tuple of (filename, hit)
+        """
+        filename = self.filename_for(cache_key(text, params, version))
+        path = os.path.join(self.directory, filename)
+        try:
+            os.utime(path)
+            with self._lock:
+                self.hits += 1
+            return filename, True
+        except FileNotFoundError:
+            pass
+
+        fd, temp_path = tempfile.mkstemp(prefix=TEMP_PREFIX, suffix=FILE_SUFFIX, dir=self.directory)
+        os.close(fd)
+        try:
+            generate(text, temp_path, **params)
+            os.replace(temp_path, path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        total_bytes = sum(size for _, _, size in self._entries())
+        with self._lock:
+            self.misses += 1
+            self._total_bytes = total_bytes
+            over_budget = total_bytes > self.max_bytes
+            sweep_due = time.time() - self._last_sweep > AGE_SWEEP_INTERVAL_S
+        if over_budget or sweep_due:
+            self.evict(keep=path)
+        return filename, False
+
+    def evict(self, keep=None):
+        """
+        Removes stale temporary files and expired entries, then least recently used ones until under budget
+
+        Args:
+            keep: Path that must survive (the entry just written)
+
+        Returns:
+            Number of files removed
+        """
+        now = time.time()
+        self._remove_stale_temp_files(now)
+        entries = sorted(self._entries(), key=lambda entry: entry[1])
+        total_bytes = sum(size for _, _, size in entries)
+        removed = 0
+        for path, mtime, size in entries:
+            expired = now - mtime > self.max_age_s
+            if not expired and total_bytes <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass  # Another worker evicted it first
+            total_bytes -= size
+            removed += 1
+
+        with self._lock:
+            self.evictions += removed
+            self._total_bytes = total_bytes
+            self._last_sweep = now
+        return removed
+
+    def stats(self):
+        """Counters and current size of the cache"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+                'max_age_s': self.max_age_s
+            }
+
+    def _remove_stale_temp_files(self, now):
+        """Deletes partial files whose writer died before renaming them into place"""
+        with os.scandir(self.directory) as scan:
+            for entry in scan:
+                # tmp* is the name mkstemp gave partial files before they had a prefix of their own
+                if not entry.name.startswith((TEMP_PREFIX, tempfile.gettempprefix())):
+                    continue
+                try:
+                    if now - entry.stat().st_mtime > STALE_TEMP_S:
+                        os.remove(entry.path)
+                except FileNotFoundError:
+                    pass  # Renamed into place or removed by another worker
+
+    def _entries(self):
+        """Yields (path, mtime, size) for every cached file"""
+        with os.scandir(self.directory) as scan:
+            for entry in scan:
+                if entry.name.startswith(FILE_PREFIX) and entry.name.endswith(FILE_SUFFIX):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    yield entry.path, stat.st_mtime, stat.st_size
@@ -2,10 +2,36 @@
 Audio Preprocessing Module
 Provides noise reduction, filtering, and enhancement capabilities for Morse code audio.
 """
+import json
+import math
+import os
+import subprocess
+import tempfile
+from functools import cached_property, lru_cache
+
 import numpy as np
 import librosa
+import soundfile as sf
 from scipy import signal
-from pydub import AudioSegment
+from pydub.utils import get_encoder_name, get_prober_name
+
+FILTER_ORDER = 4
+MAX_CUTOFF_NYQUIST = 0.99  # Filter cutoffs are clamped below this fraction of Nyquist
+
+# ffmpeg decoding
+DECODE_BLOCK_BYTES = 1 << 20  # Raw float32 output read from the pipe per step
+PROBE_TIMEOUT_S = 30
+FFMPEG_FORMATS = {'mp3', 'm4a', 'aac', 'ogg'}  # ffmpeg is faster than libsndfile's MP3 and the only AAC decoder
+
+# Spectral subtraction
+NOISE_FRAME_S = 0.025  # Analysis frame; the FFT covers two of them
+NOISE_HOP_S = 0.010
+NOISE_FRACTION = 0.1  # Share of lowest-energy frames the offline noise spectrum is averaged over
+OVERSUBTRACTION = 2.0  # Over-subtraction factor
+SPECTRAL_FLOOR = 0.01  # Spectral floor factor
+NOISE_DECAY_S = 0.5  # Time constant of the streaming noise-spectrum average
+NOISE_GATE = 2.0  # Frames above this multiple of the noise energy count as signal
+NOISE_RISE_DB_PER_S = 3.0  # Drift of the noise estimate during signal, so it can follow a rising floor
 
 
 def remove_dc_offset(audio_array):
@@ -35,15 +61,7 @@ def apply_bandpass_filter(audio_array, sample_rate, low_freq=300, high_freq=1500
     Returns:
         Filtered audio array
     """
-    nyquist = sample_rate / 2
-    low_normalized = low_freq / nyquist
-    high_normalized = high_freq / nyquist
-    
-    # Ensure frequencies are within valid range
-    low_normalized = max(0.01, min(0.99, low_normalized))
-    high_normalized = max(0.01, min(0.99, high_normalized))
-    
-    sos = signal.butter(order, [low_freq, high_freq], btype='band', fs=sample_rate, output='sos')
+    sos = design_filter_stage(sample_rate, ('bandpass', float(low_freq), float(high_freq), order))
     filtered = signal.sosfilt(sos, audio_array)
     return filtered
 
@@ -83,7 +101,7 @@ def apply_highpass_filter(audio_array, sample_rate, cutoff_freq=50, order=4):
     Returns:
         Filtered audio array
     """
-    sos = signal.butter(order, cutoff_freq, btype='high', fs=sample_rate, output='sos')
+    sos = design_filter_stage(sample_rate, ('highpass', float(cutoff_freq), order))
     filtered = signal.sosfilt(sos, audio_array)
     return filtered
 
@@ -101,11 +119,144 @@ def apply_lowpass_filter(audio_array, sample_rate, cutoff_freq=2000, order=4):
     Returns:
         Filtered audio array
     """
-    sos = signal.butter(order, cutoff_freq, btype='low', fs=sample_rate, output='sos')
+    sos = design_filter_stage(sample_rate, ('lowpass', float(cutoff_freq), order))
     filtered = signal.sosfilt(sos, audio_array)
     return filtered
 
 
+@lru_cache(maxsize=128)
+def design_filter_stage(sample_rate, stage):
+    """
+    Designs one filter stage as second-order sections (memoized).
+    
+    Args:
+        sample_rate: Sample rate of the audio
+        stage: Hashable stage spec, one of
+            ('highpass', cutoff, order), ('lowpass', cutoff, order),
+            ('bandpass', low, high, order) or ('notch', freq, quality)
+        
+    Returns:
+        float64 SOS array, shared between callers (empty for a notch at or above Nyquist)
+    """
+    kind = stage[0]
+    if kind == 'highpass':
+        sos = signal.butter(stage[2], stage[1], btype='high', fs=sample_rate, output='sos')
+    elif kind == 'lowpass':
+        sos = signal.butter(stage[2], stage[1], btype='low', fs=sample_rate, output='sos')
+    elif kind == 'bandpass':
+        sos = signal.butter(stage[3], [stage[1], stage[2]], btype='band', fs=sample_rate, output='sos')
+    elif kind == 'notch':
+        if stage[1] >= sample_rate / 2:
+            sos = np.zeros((0, 6))  # Can't filter above Nyquist frequency
+        else:
+            b, a = signal.iirnotch(stage[1], stage[2], sample_rate)
+            sos = signal.tf2sos(b, a)
+    else:
+        raise ValueError(f"Unknown filter stage: {kind}")
+    return sos
+
+
+def filter_chain_stages(config, sample_rate=None):
+    """
+    Enabled filter stages of a preprocessing config, in processing order.
+    
+    Args:
+        config: Preprocessing config dict (see preprocess_audio)
+        sample_rate: Sample rate the chain will run at; cutoffs are then
+            clamped below Nyquist (audio is decoded at its native rate, so
+            an 8 kHz file can meet a 5 kHz lowpass) and a bandpass left with
+            no passband is dropped
+        
+    Returns:
+        Tuple of stage specs, usable as a cache key
+    """
+    stages = []
+    if config.get('apply_highpass', False):
+        stages.append(('highpass', float(config.get('highpass_cutoff', 50)), FILTER_ORDER))
+    if config.get('apply_notch', False):
+        stages.append(('notch', float(config.get('notch_freq', 60.0)), float(config.get('notch_quality', 30.0))))
+    if config.get('apply_bandpass', False):
+        stages.append(('bandpass', float(config.get('bandpass_low', 300)), float(config.get('bandpass_high', 1500)), FILTER_ORDER))
+    if config.get('apply_lowpass', False):
+        stages.append(('lowpass', float(config.get('lowpass_cutoff', 2000)), FILTER_ORDER))
+    if sample_rate is not None:
+        stages = [_clamp_stage(stage, sample_rate) for stage in stages]
+        stages = [stage for stage in stages if stage is not None]
+    return tuple(stages)
+
+
+def _clamp_stage(stage, sample_rate):
+    if stage[0] == 'notch':
+        return stage  # design_filter_stage skips a notch at or above Nyquist
+    limit = MAX_CUTOFF_NYQUIST * sample_rate / 2
+    if stage[0] == 'bandpass':
+        low, high = min(stage[1], limit), min(stage[2], limit)
+        return ('bandpass', low, high, stage[3]) if low < high else None
+    return (stage[0], min(stage[1], limit), stage[2])
+
+
+def effective_config(config):
+    """
+    Settings of a preprocessing config that actually change the output.
+    
+    Defaults are filled in and parameters of disabled steps dropped, so two
+    configs that preprocess alike compare (and serialize) equal.
+    
+    Args:
+        config: Preprocessing config dict (see preprocess_audio), or None
+        
+    Returns:
+        JSON-ready dict, or None when there is no preprocessing
+    """
+    if not config:
+        return None
+    return {
+        'remove_dc': bool(config.get('remove_dc', True)),
+        'filters': [list(stage) for stage in filter_chain_stages(config)],
+        'noise_reduction_db': float(config.get('noise_reduction_db', 6.0)) if config.get('noise_reduction', False) else None,
+        'normalize': config.get('normalize', 'peak')
+    }
+
+
+@lru_cache(maxsize=64)
+def compile_filter_chain(sample_rate, stages):
+    """
+    Fuses filter stages into a single SOS cascade (memoized).
+    
+    The notch is folded in as one more second-order section, so the whole
+    chain runs in one causal sosfilt pass. Unlike the standalone
+    apply_notch_filter, the notch therefore is not zero-phase.
+    
+    Args:
+        sample_rate: Sample rate of the audio
+        stages: Tuple of stage specs from filter_chain_stages
+        
+    Returns:
+        float32 SOS array of shape (n_sections, 6), shared between callers
+    """
+    sections = [design_filter_stage(sample_rate, stage) for stage in stages]
+    sos = np.concatenate(sections).astype(np.float32) if sections else np.zeros((0, 6), dtype=np.float32)
+    return sos
+
+
+def apply_filter_chain(audio_array, sample_rate, stages):
+    """
+    Runs a fused filter chain over float32 audio in one pass.
+    
+    Args:
+        audio_array: float32 NumPy array of audio samples
+        sample_rate: Sample rate of the audio
+        stages: Tuple of stage specs from filter_chain_stages
+        
+    Returns:
+        Filtered float32 audio array (the input itself if no stage applies)
+    """
+    sos = compile_filter_chain(sample_rate, stages)
+    if len(sos) == 0:
+        return audio_array
+    return signal.sosfilt(sos, audio_array)
+
+
 def normalize_audio(audio_array, method='peak', target_db=0.0):
     """
     Normalize audio signal.
@@ -135,6 +286,27 @@ def normalize_audio(audio_array, method='peak', target_db=0.0):
     return audio_array
 
 
+def normalization_gain(audio_array, method='peak', target_db=0.0):
+    """
+    Gain normalize_audio would apply, without scaling a copy of the signal.
+    
+    Args:
+        audio_array: NumPy array of audio samples
+        method: 'peak', 'rms', or None
+        target_db: Target level in dB (for RMS only)
+        
+    Returns:
+        Scale factor (1.0 for silence or no normalization)
+    """
+    if method == 'peak':
+        peak = float(np.max(np.abs(audio_array))) if len(audio_array) else 0.0
+        return 1.0 / peak if peak > 0 else 1.0
+    elif method == 'rms':
+        rms = float(np.sqrt(np.mean(np.square(audio_array, dtype=np.float64)))) if len(audio_array) else 0.0
+        return 10 ** (target_db / 20) / rms if rms > 0 else 1.0
+    return 1.0
+
+
 def apply_spectral_subtraction(audio_array, sample_rate, noise_reduction_db=6.0):
     """
     Apply spectral subtraction for noise reduction.
@@ -148,41 +320,180 @@ def apply_spectral_subtraction(audio_array, sample_rate, noise_reduction_db=6.0)
     Returns:
         Noise-reduced audio array
     """
-    # Simple spectral subtraction: estimate noise from low-energy segments
-    frame_length = int(0.025 * sample_rate)  # 25ms frames
-    hop_length = int(0.010 * sample_rate)   # 10ms hop
+    return SpectralAnalysis(audio_array, sample_rate).resynthesize()
+
+
+def subtract_noise_spectrum(magnitude, noise_spectrum):
+    """
+    Over-subtracts a noise spectrum from STFT magnitudes.
+    
+    Args:
+        magnitude: Magnitude spectrogram (any layout that broadcasts with noise_spectrum)
+        noise_spectrum: Noise magnitude per frequency bin
+        
+    Returns:
+        Enhanced magnitudes, floored at a fraction of the input to avoid musical noise
+    """
+    return np.maximum(magnitude - OVERSUBTRACTION * noise_spectrum, SPECTRAL_FLOOR * magnitude)
+
+
+class SpectralAnalysis:
+    """
+    One STFT of a signal, shared by noise reduction and tone detection.
     
-    # Compute short-time Fourier transform
-    stft = librosa.stft(audio_array, n_fft=frame_length * 2, hop_length=hop_length)
-    magnitude = np.abs(stft)
-    phase = np.angle(stft)
+    Magnitudes, frame energies and the noise spectrum are computed once per
+    signal. The quietest frames come from ``np.argpartition`` rather than a
+    full sort. ``denoised_magnitude`` is the spectrally subtracted
+    spectrogram, which a consumer such as the decoder can read tone power
+    from directly; ``resynthesize`` goes back to samples only when audio is
+    needed.
+    
+    Args:
+        audio_array: NumPy array of audio samples
+        sample_rate: Sample rate of the audio
+        noise_fraction: Share of lowest-energy frames averaged into the noise spectrum
+    """
+    def __init__(self, audio_array, sample_rate, noise_fraction=NOISE_FRACTION):
+        self.sample_rate = sample_rate
+        self.length = len(audio_array)
+        self.noise_fraction = noise_fraction
+        self.hop_length = int(NOISE_HOP_S * sample_rate)  # 10ms hop
+        self.n_fft = int(NOISE_FRAME_S * sample_rate) * 2  # Two 25ms frames
+        
+        # Centred frames: frame i is centred on sample i * hop_length
+        self.stft = librosa.stft(audio_array, n_fft=self.n_fft, hop_length=self.hop_length)
+        self.magnitude = np.abs(self.stft)
+        self.frequencies = np.fft.rfftfreq(self.n_fft, d=1 / sample_rate)
     
-    # Estimate noise floor from quiet frames (lowest 10% energy frames)
-    frame_energies = np.mean(magnitude**2, axis=0)
-    noise_frames = np.argsort(frame_energies)[:max(1, int(len(frame_energies) * 0.1))]
-    noise_spectrum = np.mean(magnitude[:, noise_frames], axis=1, keepdims=True)
+    @property
+    def num_frames(self):
+        return self.magnitude.shape[1]
     
-    # Subtract noise spectrum with over-subtraction factor
-    alpha = 2.0  # Over-subtraction factor
-    beta = 0.01  # Spectral floor factor
+    @property
+    def window_power(self):
+        """Sum of the squared analysis window, for scaling bin power to tone amplitude"""
+        return float(np.sum(signal.get_window('hann', self.n_fft) ** 2))
     
-    noise_reduction_linear = 10 ** (noise_reduction_db / 20)
-    enhanced_magnitude = magnitude - alpha * noise_spectrum
+    @cached_property
+    def frame_energies(self):
+        return np.mean(self.magnitude**2, axis=0)
     
-    # Apply spectral floor to avoid musical noise
-    enhanced_magnitude = np.maximum(enhanced_magnitude, beta * magnitude)
+    @cached_property
+    def noise_frames(self):
+        """Indices of the lowest-energy frames (unordered)"""
+        count = max(1, int(self.num_frames * self.noise_fraction))
+        if count >= self.num_frames:
+            return np.arange(self.num_frames)
+        return np.argpartition(self.frame_energies, count - 1)[:count]
     
-    # Reconstruct signal
-    enhanced_stft = enhanced_magnitude * np.exp(1j * phase)
-    enhanced_audio = librosa.istft(enhanced_stft, hop_length=hop_length)
+    @cached_property
+    def noise_spectrum(self):
+        """Noise floor per bin: mean magnitude of the quietest frames"""
+        return np.mean(self.magnitude[:, self.noise_frames], axis=1, keepdims=True)
     
-    # Trim to original length
-    if len(enhanced_audio) > len(audio_array):
-        enhanced_audio = enhanced_audio[:len(audio_array)]
-    elif len(enhanced_audio) < len(audio_array):
-        enhanced_audio = np.pad(enhanced_audio, (0, len(audio_array) - len(enhanced_audio)))
+    @cached_property
+    def denoised_magnitude(self):
+        return subtract_noise_spectrum(self.magnitude, self.noise_spectrum)
     
-    return enhanced_audio
+    def band_power(self, min_freq, max_freq, denoised=True):
+        """
+        Mean power per bin strictly between two frequencies.
+        
+        Args:
+            min_freq: Lower band edge (Hz)
+            max_freq: Upper band edge (Hz)
+            denoised: Use the noise-subtracted magnitudes
+            
+        Returns:
+            Tuple of (bin frequencies, mean power per bin)
+        """
+        band = np.flatnonzero((self.frequencies > min_freq) & (self.frequencies < max_freq))
+        magnitude = self.denoised_magnitude if denoised else self.magnitude
+        return self.frequencies[band], np.mean(magnitude[band].astype(np.float64) ** 2, axis=1)
+    
+    def tone_power(self, frequency, bandwidth_hz, denoised=True):
+        """
+        Per-frame power of a tone, summed over the bins around it.
+        
+        Args:
+            frequency: Tone frequency (Hz)
+            bandwidth_hz: Width of the summed band, centred on the tone (at least one bin)
+            denoised: Use the noise-subtracted magnitudes
+            
+        Returns:
+            float64 array with one value per frame, scaled to the squared tone amplitude
+        """
+        band = np.flatnonzero(np.abs(self.frequencies - frequency) <= bandwidth_hz / 2)
+        if len(band) == 0:
+            band = [int(np.argmin(np.abs(self.frequencies - frequency)))]
+        magnitude = self.denoised_magnitude if denoised else self.magnitude
+        power = np.sum(magnitude[band].astype(np.float64) ** 2, axis=0)
+        # A tone of amplitude A puts n_fft * A^2 / 4 * sum(window^2) into the positive bins
+        return power * 4 / (self.n_fft * self.window_power)
+    
+    def burst_shortening_s(self, relative_power):
+        """
+        How much shorter a tone burst's run of above-threshold frames is than the burst.
+        
+        A frame's tone power grows with the share of the window the burst
+        covers, so a threshold at ``relative_power`` of the burst's power is
+        crossed late on the rising edge and early on the falling one.
+        
+        Args:
+            relative_power: Threshold as a fraction of the burst's frame power
+            
+        Returns:
+            Shortening in seconds (negative for thresholds below a quarter of the power)
+        """
+        window = signal.get_window('hann', self.n_fft)
+        covered = np.cumsum(window) / np.sum(window)
+        crossing = np.searchsorted(covered, np.sqrt(np.clip(relative_power, 0.0, 1.0)))
+        return (2 * crossing - self.n_fft) / self.sample_rate
+    
+    def resynthesize(self):
+        """
+        Noise-reduced samples from the denoised magnitudes and the original phase.
+        
+        Returns:
+            Audio array with the length of the analysed signal
+        """
+        # Scaling each bin keeps its phase without an angle/exp round trip
+        gain = self.denoised_magnitude / np.maximum(self.magnitude, np.finfo(self.magnitude.dtype).tiny)
+        enhanced_audio = librosa.istft(self.stft * gain, hop_length=self.hop_length)
+        
+        # Trim to original length
+        if len(enhanced_audio) > self.length:
+            enhanced_audio = enhanced_audio[:self.length]
+        elif len(enhanced_audio) < self.length:
+            enhanced_audio = np.pad(enhanced_audio, (0, self.length - len(enhanced_audio)))
+        
+        return enhanced_audio
+
+
+def prefilter_audio(audio_array, sample_rate, config=None):
+    """
+    DC removal and the fused filter chain: the steps of preprocess_audio before noise reduction.
+    
+    Args:
+        audio_array: NumPy array of audio samples
+        sample_rate: Sample rate of the audio
+        config: Preprocessing config dict (see preprocess_audio)
+        
+    Returns:
+        Filtered float32 audio array
+    """
+    if config is None:
+        config = {}
+    
+    # One float32 working buffer; DC removal works in place
+    processed = np.array(audio_array, dtype=np.float32)
+    
+    # Remove DC offset (almost always beneficial)
+    if config.get('remove_dc', True):
+        processed -= processed.mean(dtype=np.float64)
+    
+    # High-pass, notch, bandpass and low-pass filters as one fused SOS cascade
+    return apply_filter_chain(processed, sample_rate, filter_chain_stages(config, sample_rate))
 
 
 def preprocess_audio(audio_array, sample_rate, config=None):
@@ -213,41 +524,7 @@ def preprocess_audio(audio_array, sample_rate, config=None):
     if config is None:
         config = {}
     
-    processed = audio_array.copy()
-    
-    # Remove DC offset (almost always beneficial)
-    if config.get('remove_dc', True):
-        processed = remove_dc_offset(processed)
-    
-    # High-pass filter (remove low-frequency noise)
-    if config.get('apply_highpass', False):
-        processed = apply_highpass_filter(
-            processed, sample_rate, 
-            cutoff_freq=config.get('highpass_cutoff', 50)
-        )
-    
-    # Notch filter (remove specific interference)
-    if config.get('apply_notch', False):
-        processed = apply_notch_filter(
-            processed, sample_rate,
-            notch_freq=config.get('notch_freq', 60.0),
-            quality_factor=config.get('notch_quality', 30.0)
-        )
-    
-    # Bandpass filter (isolate Morse frequency range)
-    if config.get('apply_bandpass', False):
-        processed = apply_bandpass_filter(
-            processed, sample_rate,
-            low_freq=config.get('bandpass_low', 300),
-            high_freq=config.get('bandpass_high', 1500)
-        )
-    
-    # Low-pass filter (remove high-frequency noise)
-    if config.get('apply_lowpass', False):
-        processed = apply_lowpass_filter(
-            processed, sample_rate,
-            cutoff_freq=config.get('lowpass_cutoff', 2000)
-        )
+    processed = prefilter_audio(audio_array, sample_rate, config)
     
     # Noise reduction (spectral subtraction)
     if config.get('noise_reduction', False):
@@ -257,51 +534,327 @@ def preprocess_audio(audio_array, sample_rate, config=None):
         )
     
     # Normalize
-    normalize_method = config.get('normalize', 'peak')
-    if normalize_method:
-        processed = normalize_audio(processed, method=normalize_method)
+    processed *= normalization_gain(processed, config.get('normalize', 'peak'))
     
     return processed
 
 
+class Preprocessor:
+    """
+    Block-wise preprocess_audio for streamed or live input.
+    
+    Feed blocks of any size to ``process``; each call returns the output
+    samples that are final so far, and ``flush`` returns the rest once the
+    input ends. The output keeps the input's timeline and length, delayed by
+    at most ``latency`` samples (one spectral subtraction FFT frame, or none
+    without noise reduction). Only one FFT frame of input and of overlap-add
+    output is held between blocks.
+    
+    The fused filter chain carries its ``zi`` state across blocks, so the
+    filtered signal is the same as the offline pass. Steps that need the
+    whole file offline use running estimates instead: DC removal subtracts
+    the mean of the input so far, spectral subtraction uses an exponentially
+    decaying average of noise-like frames (instead of the quietest 10% of the
+    file), and normalization scales by the peak or RMS seen so far.
+    
+    Args:
+        sample_rate: Sample rate of the audio
+        config: Preprocessing config dict (see preprocess_audio)
+        noise_decay_s: Time constant of the noise-spectrum average (seconds)
+    """
+    def __init__(self, sample_rate, config=None, noise_decay_s=NOISE_DECAY_S):
+        if config is None:
+            config = {}
+        self.sample_rate = sample_rate
+        self.remove_dc = config.get('remove_dc', True)
+        self.noise_reduction = config.get('noise_reduction', False)
+        self.normalize = config.get('normalize', 'peak')
+        
+        self._sos = compile_filter_chain(sample_rate, filter_chain_stages(config, sample_rate))
+        self._zi = np.zeros((len(self._sos), 2), dtype=np.float32)
+        self._input_sum = 0.0
+        self._samples_in = 0
+        self._samples_out = 0
+        self._peak = 0.0
+        self._sum_squares = 0.0
+        self._samples_normalized = 0
+        
+        if self.noise_reduction:
+            self.hop_length = int(NOISE_HOP_S * sample_rate)
+            self.n_fft = int(NOISE_FRAME_S * sample_rate) * 2
+            # Periodic Hann window, as librosa's stft/istft use
+            self._window = signal.get_window('hann', self.n_fft).astype(np.float32)
+            hop_s = self.hop_length / sample_rate
+            self._noise_decay = math.exp(-hop_s / noise_decay_s)
+            self._noise_rise = 10 ** (NOISE_RISE_DB_PER_S * hop_s / 20)
+            self._warmup_frames = max(1, int(round(noise_decay_s / hop_s)))
+            self._noise = None
+            self._noise_energy = 0.0
+            self._frames_seen = 0
+            # Frames are centred like librosa's: the first starts n_fft // 2 before sample 0
+            self._frame_start = -(self.n_fft // 2)
+            self._buffer = np.zeros(self.n_fft // 2, dtype=np.float32)  # Input from _frame_start on
+            self._overlap = np.zeros(self.n_fft, dtype=np.float32)  # Overlap-add sums from _frame_start on
+            self._overlap_weight = np.zeros(self.n_fft, dtype=np.float32)
+    
+    @property
+    def latency(self):
+        """Maximum delay of output behind input, in samples"""
+        return self.n_fft if self.noise_reduction else 0
+    
+    def process(self, block):
+        """
+        Preprocesses the next block of input.
+        
+        Args:
+            block: NumPy array of audio samples (mono)
+            
+        Returns:
+            float32 array of the output samples completed by this block
+        """
+        processed = np.array(block, dtype=np.float32)
+        if self.remove_dc:
+            self._input_sum += float(np.sum(processed, dtype=np.float64))
+            self._samples_in += len(processed)
+            if self._samples_in:
+                processed -= self._input_sum / self._samples_in
+        else:
+            self._samples_in += len(processed)
+        
+        if len(self._sos) and len(processed):
+            processed, self._zi = signal.sosfilt(self._sos, processed, zi=self._zi)
+        
+        if self.noise_reduction:
+            self._buffer = np.concatenate([self._buffer, processed])
+            processed = self._subtract_noise()
+        return self._normalize(processed)
+    
+    def flush(self):
+        """
+        Ends the input and returns the remaining output samples.
+        
+        Returns:
+            float32 array of the samples still held back
+        """
+        if not self.noise_reduction:
+            return np.zeros(0, dtype=np.float32)
+        # Zero-pad up to the end of the last frame the offline STFT would take
+        last_frame_start = (self._samples_in // self.hop_length) * self.hop_length - self.n_fft // 2
+        padding = last_frame_start + self.n_fft - self._frame_start - len(self._buffer)
+        if padding > 0:
+            self._buffer = np.concatenate([self._buffer, np.zeros(padding, dtype=np.float32)])
+        processed = self._subtract_noise()
+        
+        # Everything left up to the end of the input is final now
+        remaining = self._samples_in - self._samples_out
+        tail = self._pop_output(len(self._overlap))[:remaining]
+        return self._normalize(np.concatenate([processed, tail]))
+    
+    def _subtract_noise(self):
+        """Runs every complete frame in the buffer; returns the samples no later frame overlaps"""
+        n_frames = (len(self._buffer) - self.n_fft) // self.hop_length + 1
+        if n_frames <= 0:
+            return np.zeros(0, dtype=np.float32)
+        frames = np.lib.stride_tricks.sliding_window_view(self._buffer, self.n_fft)[::self.hop_length][:n_frames]
+        stft = np.fft.rfft(frames * self._window, axis=1)
+        magnitude = np.abs(stft)
+        
+        noise = np.empty_like(magnitude)
+        for i, energy in enumerate(np.mean(magnitude**2, axis=1)):
+            self._update_noise(magnitude[i], energy)
+            noise[i] = self._noise
+        
+        enhanced_magnitude = subtract_noise_spectrum(magnitude, noise)
+        enhanced = np.fft.irfft(enhanced_magnitude * np.exp(1j * np.angle(stft)), n=self.n_fft, axis=1)
+        enhanced = (enhanced * self._window).astype(np.float32)
+        
+        # Overlap-add, tracking the summed squared window for istft-style normalization
+        span = (n_frames - 1) * self.hop_length + self.n_fft
+        overlap = np.zeros(span, dtype=np.float32)
+        weight = np.zeros(span, dtype=np.float32)
+        overlap[:self.n_fft] = self._overlap
+        weight[:self.n_fft] = self._overlap_weight
+        window_squared = self._window**2
+        for i in range(n_frames):
+            start = i * self.hop_length
+            overlap[start:start + self.n_fft] += enhanced[i]
+            weight[start:start + self.n_fft] += window_squared
+        self._overlap, self._overlap_weight = overlap, weight
+        
+        advance = n_frames * self.hop_length
+        self._buffer = self._buffer[advance:]
+        return self._pop_output(advance)
+    
+    def _pop_output(self, count):
+        """Removes ``count`` overlap-add samples and returns those from sample 0 on, normalized"""
+        output = self._overlap[:count].copy()
+        weight = self._overlap_weight[:count]
+        nonzero = weight > np.finfo(np.float32).tiny
+        output[nonzero] /= weight[nonzero]
+        skip = min(count, max(0, -self._frame_start))  # Centring pad before the first sample
+        
+        padding = (0, max(0, self.n_fft - len(self._overlap) + count))
+        self._overlap = np.pad(self._overlap[count:], padding)
+        self._overlap_weight = np.pad(self._overlap_weight[count:], padding)
+        self._frame_start += count
+        self._samples_out += count - skip
+        return output[skip:]
+    
+    def _update_noise(self, magnitude, energy):
+        """Folds one frame into the noise-spectrum estimate"""
+        self._frames_seen += 1
+        if self._noise is None:
+            self._noise = magnitude.copy()
+        elif self._frames_seen <= self._warmup_frames:
+            # Plain running mean until the decaying average has settled
+            self._noise += (magnitude - self._noise) / self._frames_seen
+        elif energy <= NOISE_GATE * self._noise_energy:
+            self._noise += (1 - self._noise_decay) * (magnitude - self._noise)
+        else:
+            self._noise *= self._noise_rise
+        self._noise_energy = float(np.mean(self._noise**2))
+    
+    def _normalize(self, processed):
+        if not len(processed) or not self.normalize:
+            return processed
+        if self.normalize == 'peak':
+            self._peak = max(self._peak, float(np.max(np.abs(processed))))
+            if self._peak > 0:
+                processed /= self._peak
+        elif self.normalize == 'rms':
+            self._sum_squares += float(np.sum(processed.astype(np.float64)**2))
+            self._samples_normalized += len(processed)
+            rms = math.sqrt(self._sum_squares / self._samples_normalized)
+            if rms > 0:
+                processed /= rms
+        return processed
+
+
+def probe_audio(input_path):
+    """
+    Read duration and format metadata with ffprobe, without decoding the audio.
+    
+    Args:
+        input_path: Path to an audio file in any format ffmpeg supports
+        
+    Returns:
+        Dict with 'duration' (seconds, None if unknown), 'sample_rate' and 'channels'
+    """
+    command = [get_prober_name(), '-v', 'error', '-select_streams', 'a:0',
+               '-show_entries', 'stream=sample_rate,channels,duration:format=duration',
+               '-of', 'json', input_path]
+    try:
+        completed = subprocess.run(command, capture_output=True, check=True, timeout=PROBE_TIMEOUT_S)
+        info = json.loads(completed.stdout)
+        stream = info['streams'][0]
+    except (OSError, subprocess.SubprocessError, ValueError, KeyError, IndexError) as e:
+        raise Exception(f"Failed to probe audio file: {str(e)}")
+    
+    # Raw AAC and some MP3s only carry a container-level (estimated) duration
+    duration = stream.get('duration') or info.get('format', {}).get('duration')
+    return {
+        'duration': float(duration) if duration not in (None, 'N/A') else None,
+        'sample_rate': int(stream['sample_rate']),
+        'channels': int(stream['channels'])
+    }
+
+
+def decode_audio(input_path, target_sample_rate=None):
+    """
+    Decode any ffmpeg-supported format to mono float32 samples through a pipe.
+    
+    ffmpeg downmixes and (if asked) resamples, and its raw float output is
+    read block by block straight into one preallocated NumPy buffer, so no
+    intermediate WAV is written or parsed.
+    
+    Args:
+        input_path: Path to input audio file
+        target_sample_rate: Output sample rate; None keeps the file's own rate
+        
+    Returns:
+        Tuple of (float32 audio array, sample rate)
+    """
+    info = probe_audio(input_path)
+    sample_rate = int(target_sample_rate or info['sample_rate'])
+    # Size the buffer from the probed duration (plus slack); it grows if that was short
+    expected = int((info['duration'] or 60.0) * sample_rate) + sample_rate
+    buffer = np.empty(expected, dtype=np.float32)
+    
+    command = [get_encoder_name(), '-nostdin', '-v', 'error', '-i', input_path, '-vn',
+               '-ac', '1', '-ar', str(sample_rate), '-f', 'f32le', '-acodec', 'pcm_f32le', 'pipe:1']
+    filled = 0  # Bytes received
+    with tempfile.TemporaryFile() as errors:
+        try:
+            process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=errors)
+        except OSError as e:
+            raise Exception(f"Failed to decode audio file: {str(e)}")
+        with process:
+            view = memoryview(buffer).cast('B')
+            while True:
+                if filled == len(view):
+                    grown = np.empty(2 * len(buffer), dtype=np.float32)
+                    grown[:len(buffer)] = buffer
+                    buffer = grown
+                    view = memoryview(buffer).cast('B')
+                count = process.stdout.readinto(view[filled:filled + DECODE_BLOCK_BYTES])
+                if not count:
+                    break
+                filled += count
+            view.release()
+        if process.returncode != 0:
+            errors.seek(0)
+            message = errors.read().decode('utf-8', 'replace').strip()
+            raise Exception(f"Failed to decode audio file: {message or f'ffmpeg exited with {process.returncode}'}")
+    
+    samples = filled // 4
+    audio = buffer[:samples] if samples > len(buffer) // 2 else buffer[:samples].copy()
+    return audio, sample_rate
+
+
+def needs_ffmpeg(input_path):
+    """
+    Whether a file is decoded through ffmpeg rather than libsndfile.
+    
+    Args:
+        input_path: Path to an audio file
+        
+    Returns:
+        True for the compressed upload formats and any file libsndfile rejects
+    """
+    if os.path.splitext(input_path)[1][1:].lower() in FFMPEG_FORMATS:
+        return True
+    try:
+        sf.info(input_path)
+        return False
+    except RuntimeError:
+        return True
+
+
 def convert_audio_to_wav(input_path, output_path=None, target_sample_rate=44100):
     """
-    Convert any audio format to WAV using pydub.
+    Convert any audio format to a mono WAV using ffmpeg.
     
     Args:
-        input_path: Path to input audio file (any format supported by pydub)
+        input_path: Path to input audio file (any format supported by ffmpeg)
         output_path: Optional output path. If None, creates temp file
         target_sample_rate: Target sample rate for output (default: 44100)
         
     Returns:
         Path to converted WAV file
     """
-    import tempfile
-    
     try:
-        # Load audio file (pydub supports many formats)
-        audio = AudioSegment.from_file(input_path)
-        
-        # Set sample rate if needed
-        if audio.frame_rate != target_sample_rate:
-            audio = audio.set_frame_rate(target_sample_rate)
-        
-        # Convert to mono if stereo
-        if audio.channels > 1:
-            audio = audio.set_channels(1)
+        audio, sample_rate = decode_audio(input_path, target_sample_rate)
         
         # Generate output path if not provided
         if output_path is None:
-            import os
             base_name = os.path.splitext(os.path.basename(input_path))[0]
             output_dir = os.path.dirname(input_path)
             output_path = os.path.join(output_dir, f"{base_name}_converted.wav")
         
         # Export as WAV
-        audio.export(output_path, format="wav")
+        sf.write(output_path, audio, sample_rate, subtype='PCM_16')
         
         return output_path
         
     except Exception as e:
         raise Exception(f"Failed to convert audio format: {str(e)}")
-
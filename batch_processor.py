@@ -3,20 +3,147 @@ Batch processing utilities for M2T
 """
 import os
 import json
-import librosa
+import time
+import hashlib
+import numpy as np
 import soundfile as sf
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
 from models import db, AudioFile, DecodeResult
 import morse_processor
 import audio_preprocessor
+from timing import StageTimer
+
+DIGEST_CHUNK_BYTES = 1 << 20  # Read size when hashing audio files
+BULK_COMMIT_FILES = 50  # Batch results saved per transaction
+BULK_COMMIT_INTERVAL_S = 1.0  # ...or sooner, so progress shows up while slow files decode
+
+def file_digest(filepath):
+    """Hex SHA-256 of a file's contents, read in chunks"""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(DIGEST_CHUNK_BYTES), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def decode_params(config=None):
+    """
+    Keyword arguments for morse_processor.process_audio_file from a processing config
+    
+    Args:
+        config: Processing configuration dict ('wpm', 'threshold', 'frequency',
+            'front_end', 'resample_quality', 'threshold_mode', 'adaptive_window',
+            'window', 'hop', 'preprocessing'); missing entries take their defaults
+        
+    Returns:
+        dict: Decoder keyword arguments
+    """
+    config = config or {}
+    return {
+        'wpm_override': config.get('wpm'),
+        'threshold_factor': config.get('threshold', 1.0),
+        'frequency_override': config.get('frequency'),
+        'preprocess_config': config.get('preprocessing') or None,
+        'front_end': config.get('front_end', 'direct'),
+        'resample_quality': config.get('resample_quality', 'balanced'),
+        'threshold_mode': config.get('threshold_mode', 'global'),
+        'adaptive_window_s': config.get('adaptive_window', 3.0),
+        'window_s': config.get('window', 0.01),
+        'hop_s': config.get('hop', 'auto')
+    }
+
+def decode_cache_key(digest, config=None):
+    """
+    Result cache key of one decode
+    
+    Built from the audio digest, the decode parameters (defaults filled in,
+    numbers as floats, preprocessing reduced to its effective settings) and
+    DECODER_VERSION, so equivalent requests share a key and a decoder
+    change invalidates every cached result.
+    
+    Args:
+        digest: Hex SHA-256 of the audio file
+        config: Processing configuration dict
+        
+    Returns:
+        Hex SHA-256 digest
+    """
+    params = decode_params(config)
+    params['preprocess_config'] = audio_preprocessor.effective_config(params['preprocess_config'])
+    params = {name: float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else value
+              for name, value in params.items()}
+    payload = json.dumps({'digest': digest, 'params': params, 'version': morse_processor.DECODER_VERSION},
+                         sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def pack_analysis(analysis_data):
+    """
+    JSON for DecodeResult.analysis: the decoder output with the per-frame
+    binary signal (about 100 values per second of audio) stored as run
+    lengths, ``[first_state, length, length, ...]``
+    """
+    packed = dict(analysis_data)
+    binary_signal = packed.pop('binary_signal_data', None)
+    if binary_signal:
+        states, lengths = morse_processor.run_length_encode(binary_signal)
+        packed['binary_signal_runs'] = [int(states[0])] + lengths.tolist()
+    return json.dumps(packed)
+
+def unpack_analysis(analysis_json, include_binary_signal=True):
+    """
+    Decoder output stored by pack_analysis; the binary signal is rebuilt only
+    when ``include_binary_signal`` is set and is otherwise empty, as for a
+    decode run without it
+    """
+    analysis_data = json.loads(analysis_json)
+    runs = analysis_data.pop('binary_signal_runs', None)
+    if not include_binary_signal:
+        analysis_data['binary_signal_data'] = []
+    elif runs:
+        states = (runs[0] + np.arange(len(runs) - 1)) % 2  # Runs alternate between mark and space
+        analysis_data['binary_signal_data'] = np.repeat(states, runs[1:]).tolist()
+    else:
+        analysis_data.setdefault('binary_signal_data', [])  # Rows stored before packing keep theirs
+    return analysis_data
+
+def find_cached_result(cache_key):
+    """Most recent stored DecodeResult with this cache key and its full analysis, or None"""
+    return (DecodeResult.query
+            .filter(DecodeResult.cache_key == cache_key, DecodeResult.analysis.isnot(None))
+            .order_by(DecodeResult.id.desc())
+            .first())
+
+def cached_decode_result(decode_result, original_filename, include_binary_signal=False):
+    """Processing result (as from store_decode_result) for a cache hit; writes nothing"""
+    return {
+        'success': True,
+        'filename': original_filename,
+        'error': None,
+        'cached': True,
+        'data': {
+            'file_id': decode_result.file_id,
+            'result_id': decode_result.id,
+            'analysis': unpack_analysis(decode_result.analysis, include_binary_signal),
+            'quality_score': decode_result.quality_score
+        }
+    }
 
 def get_audio_metadata(filepath):
     """Extract metadata from audio file"""
     try:
-        info = sf.info(filepath)
-        duration = info.duration
-        sr = info.samplerate
-        channels = info.channels
+        try:
+            info = sf.info(filepath)
+            duration = info.duration
+            sr = info.samplerate
+            channels = info.channels
+        except RuntimeError:
+            # Not readable by libsndfile (e.g. M4A/AAC): ask ffprobe, which only reads headers
+            info = audio_preprocessor.probe_audio(filepath)
+            duration = info['duration']
+            sr = info['sample_rate']
+            channels = info['channels']
         file_size = os.path.getsize(filepath)
         format = os.path.splitext(filepath)[1][1:].lower()
         return {
@@ -30,139 +157,157 @@ def get_audio_metadata(filepath):
         print(f"Error getting metadata: {e}")
         return None
 
-def process_file_batch(filepath, original_filename, upload_folder, temp_folder, config=None):
+def decode_file(filepath, config=None):
     """
-    Process a single file in batch mode
+    Decode a single file without touching the database
+    
+    Runs in batch worker processes, so it only takes and returns plain,
+    picklable data.
     
     Args:
         filepath: Path to the audio file
-        original_filename: Original filename
-        upload_folder: Upload folder path
-        temp_folder: Temporary folder path
         config: Processing configuration dict
         
     Returns:
-        dict: Processing result with success status and data/error
+        dict: success status, error, file metadata and the decoder's analysis
     """
-    result = {
+    decoded = {
         'success': False,
-        'filename': original_filename,
         'error': None,
-        'data': None
+        'metadata': None,
+        'analysis': None
     }
     
+    timer = StageTimer()
     try:
+        if not os.path.exists(filepath):
+            decoded['error'] = 'File not found'
+            return decoded
+        
         # Get file metadata
-        metadata = get_audio_metadata(filepath)
+        with timer.stage('metadata'):
+            metadata = get_audio_metadata(filepath)
         if not metadata:
-            result['error'] = 'Could not read file metadata'
-            return result
-        
-        # Create AudioFile record
-        audio_file = AudioFile(
-            filename=os.path.basename(filepath),
-            original_filename=original_filename,
-            filepath=filepath,
-            file_size=metadata['file_size'],
-            duration=metadata['duration'],
-            sample_rate=metadata['sample_rate'],
-            channels=metadata['channels'],
-            format=metadata['format'],
-            processed=False
-        )
-        db.session.add(audio_file)
-        db.session.flush()  # Get the ID
-        
-        # Convert to WAV if necessary
-        converted_filepath = filepath
-        temp_wav_path = None
-        file_ext = metadata['format']
-        
-        if file_ext != 'wav':
-            base_name = os.path.splitext(os.path.basename(filepath))[0]
-            temp_wav_path = os.path.join(temp_folder, f"{base_name}_temp.wav")
-            converted_filepath = audio_preprocessor.convert_audio_to_wav(filepath, temp_wav_path)
+            decoded['error'] = 'Could not read file metadata'
+            return decoded
+        decoded['metadata'] = metadata
         
-        # Apply preprocessing if configured
-        preprocessing_config = config.get('preprocessing', {}) if config else {}
-        if preprocessing_config and any(preprocessing_config.values()):
-            audio, sr = librosa.load(converted_filepath, sr=None)
-            processed_audio = audio_preprocessor.preprocess_audio(audio, sr, preprocessing_config)
-            
-            preprocessed_path = os.path.join(
-                temp_folder,
-                f"{os.path.splitext(os.path.basename(converted_filepath))[0]}_preprocessed.wav"
-            )
-            sf.write(preprocessed_path, processed_audio, sr)
-            converted_filepath = preprocessed_path
+        # Preprocessing is applied by the decoder to the samples it loads;
+        # compressed formats are decoded by ffmpeg straight into memory
+        decoded['analysis'] = morse_processor.process_audio_file(filepath, timer=timer, **decode_params(config))
+        decoded['success'] = True
         
-        # Get processing parameters
-        wpm_override = config.get('wpm') if config else None
-        threshold_factor = config.get('threshold', 1.0) if config else 1.0
-        frequency_override = config.get('frequency') if config else None
-        
-        # Process the audio
-        analysis_data = morse_processor.process_audio_file(
-            converted_filepath,
-            wpm_override=wpm_override,
-            threshold_factor=threshold_factor,
-            frequency_override=frequency_override,
-            preprocess_config=None
-        )
-        
-        # Create DecodeResult record
-        events = analysis_data.get('events', [])
-        full_text = analysis_data.get('full_text', '')
-        
-        # Calculate quality metrics
-        quality_score = calculate_quality_score(analysis_data)
-        timing_consistency = calculate_timing_consistency(events)
-        
-        decode_result = DecodeResult(
-            file_id=audio_file.id,
-            wpm=analysis_data.get('wpm'),
-            frequency=analysis_data.get('frequency'),
-            threshold_factor=analysis_data.get('threshold_factor', 1.0),
-            decoded_text=full_text,
-            full_text=full_text,
-            event_count=len(events),
-            quality_score=quality_score,
-            snr=analysis_data.get('snr'),
-            avg_snr=analysis_data.get('avg_snr'),
-            confidence=analysis_data.get('confidence', 0),
-            timing_consistency=timing_consistency,
-            preprocess_config=json.dumps(preprocessing_config) if preprocessing_config else None
-        )
-        
-        # Calculate average dot/dash durations
-        if events:
-            dots = [e.get('duration', 0) for e in events if e.get('type') == 'dot']
-            dashes = [e.get('duration', 0) for e in events if e.get('type') == 'dash']
-            if dots:
-                decode_result.avg_dot_duration = sum(dots) / len(dots)
-            if dashes:
-                decode_result.avg_dash_duration = sum(dashes) / len(dashes)
+    except Exception as e:
+        decoded['error'] = str(e)
+        import traceback
+        traceback.print_exc()
+    
+    return decoded
+
+def build_decode_records(decoded, filepath, original_filename, config=None, digest=None, cache_key=None):
+    """
+    Unsaved database rows for a successful decode from decode_file
+    
+    The DecodeResult is linked to its AudioFile through the relationship, so
+    both can be inserted in one flush without a round trip for the file ID.
+    
+    Args:
+        decoded: Successful result dict of decode_file
+        filepath: Path to the audio file
+        original_filename: Original filename
+        config: Processing configuration dict the file was decoded with
+        digest: Hex SHA-256 of the file, stored for upload deduplication
+        cache_key: decode_cache_key of the decode; the result is then served
+            from the database for identical requests
         
-        db.session.add(decode_result)
-        audio_file.processed = True
+    Returns:
+        tuple: (AudioFile, DecodeResult)
+    """
+    metadata = decoded['metadata']
+    analysis_data = decoded['analysis']
+    preprocessing_config = config.get('preprocessing', {}) if config else {}
+    if str(analysis_data.get('full_text', '')).startswith('[ERROR'):
+        cache_key = None  # Load failures may be transient; never serve them from the cache
+    
+    # Create AudioFile record
+    audio_file = AudioFile(
+        filename=os.path.basename(filepath),
+        original_filename=original_filename,
+        filepath=filepath,
+        file_size=metadata['file_size'],
+        duration=metadata['duration'],
+        sample_rate=metadata['sample_rate'],
+        channels=metadata['channels'],
+        format=metadata['format'],
+        digest=digest,
+        processed=True
+    )
+    
+    timings = analysis_data['timings']
+    
+    # Create DecodeResult record
+    events = analysis_data.get('events', [])
+    full_text = analysis_data.get('full_text', '')
+    
+    # Calculate quality metrics
+    quality_score = calculate_quality_score(analysis_data)
+    timing_consistency = calculate_timing_consistency(events)
+    
+    decode_result = DecodeResult(
+        audio_file=audio_file,
+        wpm=analysis_data.get('wpm'),
+        frequency=analysis_data.get('frequency'),
+        threshold_factor=analysis_data.get('threshold_factor', 1.0),
+        decoded_text=full_text,
+        full_text=full_text,
+        event_count=len(events),
+        quality_score=quality_score,
+        snr=analysis_data.get('snr'),
+        avg_snr=analysis_data.get('avg_snr'),
+        confidence=analysis_data.get('confidence', 0),
+        timing_consistency=timing_consistency,
+        processing_time=timings['total_wall_s'],
+        timings=json.dumps(timings),
+        preprocess_config=json.dumps(preprocessing_config) if preprocessing_config else None,
+        cache_key=cache_key,
+        analysis=pack_analysis(analysis_data) if cache_key else None
+    )
+    
+    # Calculate average dot/dash durations
+    if events:
+        dots = [e.get('duration', 0) for e in events if e.get('type') == 'dot']
+        dashes = [e.get('duration', 0) for e in events if e.get('type') == 'dash']
+        if dots:
+            decode_result.avg_dot_duration = sum(dots) / len(dots)
+        if dashes:
+            decode_result.avg_dash_duration = sum(dashes) / len(dashes)
+    
+    return audio_file, decode_result
+
+def store_decode_result(decoded, filepath, original_filename, config=None, digest=None, cache_key=None):
+    """
+    Save a decode from decode_file to the database in its own transaction
+    
+    Args:
+        decoded: Result dict of decode_file
+        filepath: Path to the audio file
+        original_filename: Original filename
+        config: Processing configuration dict the file was decoded with
+        digest: Hex SHA-256 of the file, stored for upload deduplication
+        cache_key: decode_cache_key of the decode
         
+    Returns:
+        dict: Processing result with success status and data/error
+    """
+    result = _failed_result(original_filename, decoded['error'])
+    if not decoded['success']:
+        return result
+    
+    try:
+        records = build_decode_records(decoded, filepath, original_filename, config, digest, cache_key)
+        db.session.add_all(records)
         db.session.commit()
-        
-        result['success'] = True
-        result['data'] = {
-            'file_id': audio_file.id,
-            'result_id': decode_result.id,
-            'analysis': analysis_data,
-            'quality_score': quality_score
-        }
-        
-        # Clean up temp files
-        if temp_wav_path and os.path.exists(temp_wav_path):
-            try:
-                os.remove(temp_wav_path)
-            except:
-                pass
-        
+        _fill_stored_result(result, decoded, *records)
     except Exception as e:
         db.session.rollback()
         result['error'] = str(e)
@@ -171,6 +316,262 @@ def process_file_batch(filepath, original_filename, upload_folder, temp_folder,
     
     return result
 
+def _failed_result(original_filename, error):
+    return {
+        'success': False,
+        'filename': original_filename,
+        'error': error,
+        'data': None
+    }
+
+def _fill_stored_result(result, decoded, audio_file, decode_result):
+    result['success'] = True
+    result['error'] = None
+    result['data'] = {
+        'file_id': audio_file.id,
+        'result_id': decode_result.id,
+        'analysis': decoded['analysis'],
+        'quality_score': decode_result.quality_score
+    }
+
+class BatchWriter:
+    """
+    Saves batch results in bulk, many files per transaction.
+    
+    Results are added in input order and buffered. Every ``commit_every``
+    files, or once ``commit_interval_s`` has passed, the new AudioFile and
+    DecodeResult rows are inserted with one flush (SQLAlchemy batches them
+    into multi-row INSERTs) and committed together, so a batch pays one
+    fsync per chunk instead of per file. ``on_result`` then sees each file in
+    order just before that commit, so database changes it makes (such as job
+    progress) land in the same transaction. If the bulk insert fails, the
+    chunk is written file by file so only the offending file fails.
+    """
+    def __init__(self, config=None, on_result=None, commit_every=BULK_COMMIT_FILES, commit_interval_s=BULK_COMMIT_INTERVAL_S):
+        self.config = config
+        self.on_result = on_result
+        self.commit_every = commit_every
+        self.commit_interval_s = commit_interval_s
+        self.results = []  # Every result added, in order
+        self._pending = []  # (filepath, result) not yet committed
+        self._decodes = []  # (result, decode_file result, build_decode_records arguments) to insert
+        self._duplicates = []  # (result, result of the file it repeats)
+        self._last_commit = time.monotonic()
+    
+    def add_decoded(self, decoded, filepath, original_filename, digest=None, cache_key=None):
+        """Queues a decode_file result for insertion; returns its result dict (filled in on flush)"""
+        result = _failed_result(original_filename, decoded['error'])
+        if decoded['success']:
+            self._decodes.append((result, decoded, (filepath, original_filename, self.config, digest, cache_key)))
+        return self._add(filepath, result)
+    
+    def add_result(self, filepath, result):
+        """Queues a result that needs no new rows (e.g. a cache hit)"""
+        return self._add(filepath, result)
+    
+    def add_duplicate(self, filepath, original_filename, original):
+        """Queues a file with the same contents as an earlier file of the batch; shares its rows"""
+        result = {'filename': original_filename}
+        self._duplicates.append((result, original))
+        return self._add(filepath, result)
+    
+    def _add(self, filepath, result):
+        self.results.append(result)
+        self._pending.append((filepath, result))
+        if len(self._pending) >= self.commit_every or time.monotonic() - self._last_commit >= self.commit_interval_s:
+            self.flush()
+        return result
+    
+    def flush(self):
+        """Inserts and commits everything pending"""
+        if not self._pending:
+            return
+        try:
+            stored = []
+            for result, decoded, args in self._decodes:
+                records = build_decode_records(decoded, *args)
+                db.session.add_all(records)
+                stored.append((result, decoded, records))
+            db.session.flush()
+        except Exception:
+            db.session.rollback()
+            import traceback
+            traceback.print_exc()
+            stored = self._insert_each()
+        
+        for result, decoded, records in stored:
+            _fill_stored_result(result, decoded, *records)
+        for result, original in self._duplicates:
+            result.update(original, filename=result['filename'], cached=original['success'])
+        if self.on_result:
+            for filepath, result in self._pending:
+                self.on_result(filepath, result)
+        db.session.commit()
+        
+        self._pending = []
+        self._decodes = []
+        self._duplicates = []
+        self._last_commit = time.monotonic()
+    
+    def _insert_each(self):
+        """Fallback after a failed bulk insert: one transaction per file"""
+        stored = []
+        for result, decoded, args in self._decodes:
+            try:
+                records = build_decode_records(decoded, *args)
+                db.session.add_all(records)
+                db.session.commit()
+                stored.append((result, decoded, records))
+            except Exception as e:
+                db.session.rollback()
+                result['error'] = str(e)
+        return stored
+
+def process_file_batch(filepath, original_filename, upload_folder, temp_folder, config=None):
+    """
+    Process a single file in batch mode (decoded in the calling process)
+    
+    Args:
+        filepath: Path to the audio file
+        original_filename: Original filename
+        upload_folder: Upload folder path
+        temp_folder: Temporary folder path
+        config: Processing configuration dict
+        
+    Returns:
+        dict: Processing result with success status and data/error
+    """
+    return store_decode_result(decode_file(filepath, config), filepath, original_filename, config)
+
+def process_batch(files, config=None, workers=None, on_result=None, should_stop=None, commit_every=BULK_COMMIT_FILES):
+    """
+    Process many files, decoding them on a pool of worker processes
+    
+    Workers only run decode_file and return plain dicts; the calling process
+    does every database write, in input order, through a BatchWriter that
+    commits many files per transaction. A file that fails only fails its own
+    entry; if a worker process dies, each file that was running is retried
+    once in a process of its own, so only the one that crashed it fails. Files whose
+    contents were already decoded with the same settings are answered from
+    the result cache, and a file repeated within the batch is decoded once.
+    
+    Args:
+        files: List of (filepath, original_filename) tuples
+        config: Processing configuration dict shared by all files
+        workers: Maximum worker processes (default: CPU count; 1 decodes in this process)
+        on_result: Optional callable(filepath, result) invoked for each file, in
+            order, just before the commit that saves it
+        should_stop: Optional callable checked before each file is stored; when it
+            returns True, queued decodes are cancelled and the remaining files skipped
+        commit_every: Files saved per transaction
+        
+    Returns:
+        list: Processing result of each file stored, in input order
+    """
+    lookups = [_lookup_cache(filepath, config) for filepath, _ in files]
+    first_by_key = {}
+    to_decode = []  # Indexes of files that need a decoder run, in order
+    for index, (cache_key, digest, hit) in enumerate(lookups):
+        if hit is None and (cache_key is None or first_by_key.setdefault(cache_key, index) == index):
+            to_decode.append(index)
+    needs_decode = set(to_decode)
+    result_by_index = {}
+    writer = BatchWriter(config, on_result, commit_every)
+    
+    def store(index, decoded):
+        filepath, original_filename = files[index]
+        cache_key, digest, hit = lookups[index]
+        if hit is not None:
+            result = writer.add_result(filepath, cached_decode_result(hit, original_filename))
+        elif cache_key is not None and first_by_key[cache_key] != index:
+            # Same contents as an earlier file of this batch
+            result = writer.add_duplicate(filepath, original_filename, result_by_index[first_by_key[cache_key]])
+        else:
+            result = writer.add_decoded(decoded, filepath, original_filename, digest, cache_key)
+        result_by_index[index] = result
+    
+    try:
+        workers = min(workers or os.cpu_count() or 1, len(to_decode))
+        if workers <= 1:
+            for index in range(len(files)):
+                if should_stop and should_stop():
+                    break
+                store(index, decode_file(files[index][0], config) if index in needs_decode else None)
+            return writer.results
+        
+        decoded_by_index = {}  # Decodes waiting for their turn to be stored
+        pending = deque(to_decode)
+        next_index = 0
+        
+        def store_ready():
+            nonlocal next_index
+            while next_index < len(files) and (next_index not in needs_decode or next_index in decoded_by_index):
+                if should_stop and should_stop():
+                    return False
+                store(next_index, decoded_by_index.pop(next_index, None))
+                next_index += 1
+            return True
+        
+        while pending:
+            crashed = []
+            # At most one file per worker is submitted, so the files still in
+            # flight when the pool breaks are exactly the ones that were running
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                in_flight = {}
+                while pending or in_flight:
+                    while pending and len(in_flight) < workers:
+                        index = pending.popleft()
+                        in_flight[pool.submit(decode_file, files[index][0], config)] = index
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        index = in_flight.pop(future)
+                        try:
+                            decoded_by_index[index] = future.result()
+                        except BrokenProcessPool:
+                            crashed.append(index)
+                        except Exception as e:
+                            decoded_by_index[index] = _worker_failure(e)
+                    if crashed:
+                        crashed.extend(in_flight.values())
+                        break
+                    if not store_ready():
+                        pool.shutdown(wait=False, cancel_futures=True)
+                        return writer.results
+            # A worker died (e.g. killed for memory). Each file that was running
+            # is retried once on its own, so only the one that crashed fails;
+            # the rest go back to a fresh pool.
+            for index in sorted(crashed):
+                if should_stop and should_stop():
+                    return writer.results
+                decoded_by_index[index] = _decode_isolated(files[index][0], config)
+            if not store_ready():
+                return writer.results
+        store_ready()
+        return writer.results
+    finally:
+        # Results already decoded are saved even when the batch stops early
+        writer.flush()
+
+def _lookup_cache(filepath, config):
+    """(cache_key, digest, cached DecodeResult or None) of one file; all None if it cannot be read"""
+    try:
+        digest = file_digest(filepath)
+    except OSError:
+        return None, None, None
+    cache_key = decode_cache_key(digest, config)
+    return cache_key, digest, find_cached_result(cache_key)
+
+def _decode_isolated(filepath, config):
+    """decode_file in a single-use worker process, so a crash only affects this file"""
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        try:
+            return pool.submit(decode_file, filepath, config).result()
+        except Exception as e:
+            return _worker_failure(e)
+
+def _worker_failure(error):
+    return {'success': False, 'error': f'Worker failed: {error}', 'metadata': None, 'analysis': None}
+
 def calculate_quality_score(analysis_data):
     """Calculate overall quality score (0-100)"""
     score = 50  # Base score
@@ -0,0 +1,591 @@
+"""
+Decoder benchmark for M2T
+
+Generates a deterministic synthetic corpus from MORSE_CODE_DICT, decodes every
+file end to end and stage by stage, and writes throughput/accuracy figures to
+a JSON file that a later run can be compared against.
+
+    python benchmark.py run --output bench.json
+    python benchmark.py compare old.json new.json
+    python benchmark.py check
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+import soundfile as sf
+
+import morse_processor
+
+BENCHMARK_VERSION = 1
+DEFAULT_CORPUS_DIR = 'benchmark_corpus'
+DEFAULT_CASES = 24
+QUICK_CASES = 8
+
+# Parameter grid the corpus is drawn from
+WPM_VALUES = [12, 18, 20, 25, 30, 40]
+TONE_VALUES = [500, 600, 700, 850, 1000]
+SAMPLE_RATES = [8000, 22050, 44100]
+SNR_DB_VALUES = [None, 30, 20, 12]  # None = clean; SNR measured in SNR_REFERENCE_BW_HZ
+FADING_DEPTHS = [0.0, 0.0, 0.5, 0.8]
+DRIFT_HZ_VALUES = [0, 0, 10, 30]  # Total tone drift over the file
+WORD_COUNTS = [5, 20, 60]
+SNR_REFERENCE_BW_HZ = 500
+RAMP_MS = 5
+
+WORD_ALPHABET = [char for char in morse_processor.MORSE_CODE_DICT if char != ' ']
+
+# --- ---
+# == Corpus Generation ==
+# --- ---
+
+def make_cases(num_cases, seed):
+    """
+    Draws ``num_cases`` case specs from the parameter grid
+
+    Args:
+        num_cases: Number of files in the corpus
+        seed: Base seed; case ``i`` is fully determined by ``seed + i``
+
+    Returns:
+        List of case dicts
+    """
+    cases = []
+    for i in range(num_cases):
+        rng = np.random.default_rng(seed + i)
+        cases.append({
+            'name': f"case_{i:03d}",
+            'seed': seed + i,
+            'wpm': int(rng.choice(WPM_VALUES)),
+            'tone_freq': int(rng.choice(TONE_VALUES)),
+            'sample_rate': int(rng.choice(SAMPLE_RATES)),
+            'snr_db': SNR_DB_VALUES[rng.integers(len(SNR_DB_VALUES))],
+            'fading_depth': float(rng.choice(FADING_DEPTHS)),
+            'drift_hz': int(rng.choice(DRIFT_HZ_VALUES)),
+            'words': int(rng.choice(WORD_COUNTS))
+        })
+    return cases
+
+def random_text(rng, num_words):
+    """Random words of 1-7 characters drawn from the Morse alphabet"""
+    words = [''.join(rng.choice(WORD_ALPHABET, size=rng.integers(1, 8))) for _ in range(num_words)]
+    return ' '.join(words)
+
+def keying_envelope(synthesizer, text, ramp_samples):
+    """On/off keying of ``text`` with raised-cosine edges, using the synthesizer's timing"""
+    starts, is_dash, total_samples = synthesizer.layout(text)
+    starts = starts + synthesizer._ramp_lead  # Nominal key-down instants
+    lengths = np.where(is_dash, synthesizer.dash_samples, synthesizer.dot_samples)
+    steps = np.zeros(total_samples + 1)
+    np.add.at(steps, starts, 1.0)
+    np.add.at(steps, starts + lengths, -1.0)
+    keying = np.cumsum(steps)[:total_samples]
+    if ramp_samples > 1:
+        ramp = np.hanning(ramp_samples)
+        keying = np.convolve(keying, ramp / ramp.sum(), mode='same')
+    return keying
+
+def render_case(case):
+    """
+    Renders one case: keyed carrier with drift and fading, plus white noise
+
+    Args:
+        case: Case dict from ``make_cases``
+
+    Returns:
+        Tuple of (samples, reference_text)
+    """
+    rng = np.random.default_rng(case['seed'])
+    text = random_text(rng, case['words'])
+    sr = case['sample_rate']
+    synthesizer = morse_processor.MorseSynthesizer(wpm=case['wpm'], tone_freq=case['tone_freq'], sample_rate=sr)
+    keying = keying_envelope(synthesizer, text, int(sr * RAMP_MS / 1000))
+
+    t = np.arange(len(keying)) / sr
+    duration = max(t[-1], 1e-9)
+    # Linear drift; integrating the instantaneous frequency keeps the phase continuous
+    frequency = case['tone_freq'] + case['drift_hz'] * t / duration
+    phase = 2 * np.pi * np.cumsum(frequency) / sr
+    # Slow QSB: a couple of fades across the file with a random phase
+    fade_rate_hz = rng.uniform(0.05, 0.3)
+    fading = 1.0 - case['fading_depth'] * (0.5 + 0.5 * np.sin(2 * np.pi * fade_rate_hz * t + rng.uniform(0, 2 * np.pi)))
+
+    amplitude = 0.3
+    audio = add_noise(amplitude * keying * fading * np.sin(phase), amplitude, case['snr_db'], sr, rng)
+    return audio.astype(np.float32), text
+
+def add_noise(audio, amplitude, snr_db, sample_rate, rng):
+    """Adds white noise at ``snr_db`` (in SNR_REFERENCE_BW_HZ; None = clean) and keeps the peak within +/-1"""
+    if snr_db is not None:
+        tone_power = amplitude ** 2 / 2
+        noise_power = tone_power / 10 ** (snr_db / 10) * (sample_rate / 2) / SNR_REFERENCE_BW_HZ
+        audio = audio + rng.normal(0.0, np.sqrt(noise_power), len(audio))
+    peak = np.max(np.abs(audio))
+    if peak > 1.0:
+        audio = audio / peak
+    return audio
+
+def _write_case(args):
+    case, corpus_dir = args
+    audio, text = render_case(case)
+    path = os.path.join(corpus_dir, f"{case['name']}.wav")
+    sf.write(path, audio, case['sample_rate'], subtype='PCM_16')
+    return dict(case, file=path, text=text, duration_s=len(audio) / case['sample_rate'])
+
+def build_corpus(cases, corpus_dir, jobs=None):
+    """
+    Writes the corpus in parallel, reusing it when the manifest matches
+
+    Args:
+        cases: Case dicts from ``make_cases``
+        corpus_dir: Output directory
+        jobs: Worker processes (defaults to all cores)
+
+    Returns:
+        Manifest: list of case dicts with ``file``, ``text`` and ``duration_s``
+    """
+    os.makedirs(corpus_dir, exist_ok=True)
+    manifest_path = os.path.join(corpus_dir, 'manifest.json')
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if manifest.get('version') == BENCHMARK_VERSION and manifest.get('cases') == cases \
+                and all(os.path.exists(entry['file']) for entry in manifest['entries']):
+            print(f"Reusing corpus in {corpus_dir} ({len(cases)} files)")
+            return manifest['entries']
+
+    print(f"Generating {len(cases)} files in {corpus_dir}...")
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        entries = list(pool.map(_write_case, [(case, corpus_dir) for case in cases]))
+    with open(manifest_path, 'w') as f:
+        json.dump({'version': BENCHMARK_VERSION, 'cases': cases, 'entries': entries}, f, indent=2)
+    return entries
+
+# --- ---
+# == Decoding ==
+# --- ---
+
+def normalize_text(text):
+    return ' '.join(text.upper().split())
+
+def character_error_rate(reference, hypothesis):
+    """Levenshtein distance between the two texts over the reference length"""
+    reference = normalize_text(reference)
+    hypothesis = normalize_text(hypothesis)
+    if not reference:
+        return float(len(hypothesis) > 0)
+    hyp = np.frombuffer(hypothesis.encode('utf-8', 'replace'), dtype=np.uint8)
+    previous = np.arange(len(hyp) + 1)
+    for i, char in enumerate(reference.encode('utf-8', 'replace'), start=1):
+        # Substitution/deletion are vectorized; insertions need the running minimum
+        current = np.empty_like(previous)
+        current[0] = i
+        current[1:] = np.minimum(previous[1:] + 1, previous[:-1] + (hyp != char))
+        current = np.minimum.accumulate(current - np.arange(len(current))) + np.arange(len(current))
+        previous = current
+    return float(previous[-1]) / len(reference)
+
+def peak_rss_mb():
+    """Peak resident set size of this process (ru_maxrss is KiB on Linux)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+def time_stages(filepath):
+    """
+    Times the decoder's stages separately on one file
+
+    Returns:
+        Dict of stage name -> seconds
+    """
+    stages = {}
+    start = time.perf_counter()
+    y, sr = morse_processor.load_audio(filepath)
+    stages['load'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    target_freq, frequency_detection = morse_processor.select_target_frequency(y, sr)
+    stages['frequency'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    magnitudes, envelope = morse_processor.compute_envelope(y, sr, target_freq)
+    stages['envelope'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    morse_processor.decode_envelope(magnitudes, envelope.hop_size / sr, target_freq,
+                                    frequency_detection=frequency_detection, include_binary_signal=False)
+    stages['decode'] = time.perf_counter() - start
+    return stages
+
+def decode_entry(entry):
+    """
+    Decodes one corpus file in a fresh worker process
+
+    Runs ``process_audio_file`` end to end, then the stages one by one.
+    Decoder output is silenced so the report stays readable.
+    """
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        start = time.perf_counter()
+        result = morse_processor.process_audio_file(entry['file'])
+        latency = time.perf_counter() - start
+        stages = time_stages(entry['file'])
+    except Exception as e:
+        return {'name': entry['name'], 'error': str(e)}
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+    decoded = result.get('full_text', '')
+    return {
+        'name': entry['name'],
+        'duration_s': entry['duration_s'],
+        'latency_s': latency,
+        'rtf': latency / entry['duration_s'],
+        'cer': character_error_rate(entry['text'], decoded),
+        'peak_rss_mb': peak_rss_mb(),
+        'stages': stages,
+        'wpm_true': entry['wpm'],
+        'wpm_decoded': result.get('wpm', 0),
+        'frequency_true': entry['tone_freq'],
+        'frequency_decoded': result.get('frequency')
+    }
+
+def warm_up():
+    """
+    Decodes a short clean file once so lazy imports and first-call setup
+    happen before any worker forks and are not billed to the first file.
+    """
+    case = dict(make_cases(1, 0)[0], snr_db=None, fading_depth=0.0, drift_hz=0, words=3)
+    with tempfile.TemporaryDirectory() as directory:
+        entry = _write_case((dict(case, name='warmup'), directory))
+        decode_entry(entry)
+
+def run_benchmark(entries, repeat=1):
+    """
+    Decodes the corpus one file at a time
+
+    Each decode gets its own forked process (``maxtasksperchild=1``) so the
+    peak RSS figure belongs to that file, and files run one after another so
+    timings are not skewed by contention.
+    """
+    warm_up()
+    results = []
+    with get_context('fork').Pool(processes=1, maxtasksperchild=1) as pool:
+        for entry in entries:
+            runs = [pool.apply(decode_entry, (entry,)) for _ in range(repeat)]
+            ok = [run for run in runs if 'error' not in run]
+            if not ok:
+                results.append(runs[0])
+                print(f"  {entry['name']}: ERROR {runs[0]['error']}")
+                continue
+            best = min(ok, key=lambda run: run['latency_s'])
+            results.append(best)
+            print(f"  {entry['name']}: {best['duration_s']:7.1f}s audio  RTF {best['rtf']:.4f}  "
+                  f"CER {best['cer']:.3f}  {best['peak_rss_mb']:.0f} MB")
+    return results
+
+def summarize(results):
+    """Aggregate figures over all successfully decoded files"""
+    ok = [r for r in results if 'error' not in r]
+    if not ok:
+        return {'files': len(results), 'errors': len(results)}
+    latencies = np.array([r['latency_s'] for r in ok])
+    total_audio = sum(r['duration_s'] for r in ok)
+    stage_names = ok[0]['stages'].keys()
+    return {
+        'files': len(results),
+        'errors': len(results) - len(ok),
+        'audio_s': total_audio,
+        'decode_s': float(latencies.sum()),
+        'rtf': float(latencies.sum() / total_audio),
+        'cer_mean': float(np.mean([r['cer'] for r in ok])),
+        'cer_max': float(np.max([r['cer'] for r in ok])),
+        'latency_p50_s': float(np.percentile(latencies, 50)),
+        'latency_p95_s': float(np.percentile(latencies, 95)),
+        'peak_rss_mb': float(max(r['peak_rss_mb'] for r in ok)),
+        'stages_s': {name: float(sum(r['stages'][name] for r in ok)) for name in stage_names}
+    }
+
+# --- ---
+# == Regression Checks ==
+# --- ---
+
+CHECK_SAMPLE_RATE = 8000
+CHECK_WPM = 20
+CHECK_TONE = 700
+PAUSE_CHECK_TEXTS = ('CQ CQ DE K1ABC', 'TEST MSG 73')
+PAUSE_CHECK_SNR_DB = [None, 30, 20]
+ADAPTIVE_WINDOW_S = 3.0  # The decoder's default adaptive_window_s
+AGREEMENT_TEXTS = ('THE QUICK BROWN FOX', 'JUMPS OVER THE LAZY DOG 0123456789')
+AGREEMENT_WPM_VALUES = [12, 20, 30, 40]
+AGREEMENT_SNR_DB = [None, 30, 20]
+MEMORY_CHECK_SECONDS = 300
+MEMORY_CHECK_SAMPLE_RATE = 44100
+MEMORY_CHECK_LIMIT_MB = 48  # Envelope working memory; the input alone is 50 MB
+
+def render_messages(texts, gap_s, snr_db, wpm=CHECK_WPM, seed=0):
+    """
+    Keyed messages separated by ``gap_s`` seconds of silence, with half a
+    second before and after, at CHECK_SAMPLE_RATE
+
+    Returns:
+        Tuple of (samples, reference_text)
+    """
+    sr = CHECK_SAMPLE_RATE
+    synthesizer = morse_processor.MorseSynthesizer(wpm=wpm, tone_freq=CHECK_TONE, sample_rate=sr)
+    edge = np.zeros(sr // 2)
+    parts = [edge]
+    for i, text in enumerate(texts):
+        if i:
+            parts.append(np.zeros(int(gap_s * sr)))
+        parts.append(keying_envelope(synthesizer, text, int(sr * RAMP_MS / 1000)))
+    parts.append(edge)
+    keying = np.concatenate(parts)
+
+    amplitude = 0.3
+    tone = np.sin(2 * np.pi * CHECK_TONE * np.arange(len(keying)) / sr)
+    audio = add_noise(amplitude * keying * tone, amplitude, snr_db, sr, np.random.default_rng(seed))
+    return audio.astype(np.float32), ' '.join(texts)
+
+def decode_both_ways(audio, **decoder_kwargs):
+    """Decoded text of ``process_audio_array`` and of ``decode_stream`` fed 4096-sample blocks"""
+    blocks = [audio[i:i + 4096] for i in range(0, len(audio), 4096)]
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        offline = morse_processor.process_audio_array(audio, CHECK_SAMPLE_RATE, **decoder_kwargs)
+        streamed = morse_processor.decode_stream(blocks, CHECK_SAMPLE_RATE, **decoder_kwargs)
+    return offline['full_text'], streamed['full_text']
+
+def check_adaptive_pause():
+    """
+    Two messages separated by a pause longer than the adaptive window decode
+    exactly in adaptive mode, offline and streamed; a window with no tone
+    must not threshold its noise into marks
+
+    Returns:
+        List of failure descriptions
+    """
+    failures = []
+    for snr_db in PAUSE_CHECK_SNR_DB:
+        audio, text = render_messages(PAUSE_CHECK_TEXTS, 3 * ADAPTIVE_WINDOW_S, snr_db)
+        for path, decoded in zip(('offline', 'streamed'), decode_both_ways(
+                audio, threshold_mode='adaptive', adaptive_window_s=ADAPTIVE_WINDOW_S)):
+            if normalize_text(decoded) != normalize_text(text):
+                failures.append(f"adaptive pause, SNR {snr_db} dB, {path}: {decoded.strip()[:60]!r}")
+    return failures
+
+def check_streaming_agreement():
+    """
+    ``process_audio_array`` and ``StreamingMorseDecoder`` decode the same
+    text with default settings and in adaptive mode. The offline path sees
+    the whole envelope at once (global statistics, refined hop, vectorized
+    classification) while the streaming one only sees what has arrived, so
+    this is where the two would drift apart
+
+    Returns:
+        List of failure descriptions
+    """
+    failures = []
+    for wpm in AGREEMENT_WPM_VALUES:
+        for snr_db in AGREEMENT_SNR_DB:
+            audio, _ = render_messages(AGREEMENT_TEXTS, 1.0, snr_db, wpm=wpm, seed=wpm)
+            for threshold_mode in ('global', 'adaptive'):
+                offline, streamed = decode_both_ways(audio, threshold_mode=threshold_mode)
+                if normalize_text(offline) != normalize_text(streamed):
+                    failures.append(f"{threshold_mode}, {wpm} WPM, SNR {snr_db} dB: "
+                                    f"offline {offline.strip()[:40]!r}, streamed {streamed.strip()[:40]!r}")
+    return failures
+
+def check_fixed_threshold_identity():
+    """
+    With the file's base threshold and WPM given, the streaming decoder
+    reproduces ``process_audio_array`` exactly (text and events) when the
+    latter runs with ``hop_s=None`` and no preprocessing
+
+    Returns:
+        List of failure descriptions
+    """
+    failures = []
+    sr = CHECK_SAMPLE_RATE
+    for snr_db in AGREEMENT_SNR_DB:
+        audio, _ = render_messages(AGREEMENT_TEXTS, 1.0, snr_db)
+        blocks = [audio[i:i + 4096] for i in range(0, len(audio), 4096)]
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            magnitudes, _ = morse_processor.compute_envelope(audio, sr, CHECK_TONE)
+            threshold = morse_processor.global_threshold(np.mean(magnitudes), np.max(magnitudes))
+            offline = morse_processor.process_audio_array(audio, sr, wpm_override=CHECK_WPM,
+                                                          frequency_override=CHECK_TONE, hop_s=None)
+            streamed = morse_processor.decode_stream(blocks, sr, frequency=CHECK_TONE, wpm=CHECK_WPM,
+                                                     threshold=threshold)
+        if offline['full_text'] != streamed['full_text'] or offline['events'] != streamed['events']:
+            failures.append(f"SNR {snr_db} dB: offline {offline['full_text'].strip()[:40]!r}, "
+                            f"streamed {streamed['full_text'].strip()[:40]!r}")
+    return failures
+
+def check_envelope_memory():
+    """
+    ``compute_envelope`` on five minutes of 44.1 kHz audio stays within
+    MEMORY_CHECK_LIMIT_MB of allocations (tracemalloc peak, input excluded)
+    for every front end, with non-overlapping frames and the finest auto hop
+
+    Returns:
+        List of failure descriptions
+    """
+    failures = []
+    sr = MEMORY_CHECK_SAMPLE_RATE
+    audio = np.random.default_rng(0).normal(0.0, 0.1, sr * MEMORY_CHECK_SECONDS).astype(np.float32)
+    for front_end in ('direct', 'baseband'):
+        for hop_s in (None, morse_processor.MIN_HOP_S):
+            tracemalloc.start()
+            try:
+                morse_processor.compute_envelope(audio, sr, CHECK_TONE, hop_s=hop_s, front_end=front_end)
+                peak_mb = tracemalloc.get_traced_memory()[1] / 2 ** 20
+            finally:
+                tracemalloc.stop()
+            if peak_mb > MEMORY_CHECK_LIMIT_MB:
+                failures.append(f"{front_end}, hop {hop_s}: peak {peak_mb:.0f} MB")
+    return failures
+
+CHECKS = [check_adaptive_pause, check_streaming_agreement, check_fixed_threshold_identity, check_envelope_memory]
+
+def run_checks():
+    """Runs CHECKS and prints each result; returns the number of failed checks"""
+    failed = 0
+    for check in CHECKS:
+        failures = check()
+        print(f"{check.__name__}: {'FAIL' if failures else 'ok'}")
+        for failure in failures:
+            print(f"  {failure}")
+        failed += bool(failures)
+    return failed
+
+# --- ---
+# == Reporting ==
+# --- ---
+
+def environment_info():
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count()
+    }
+
+def print_summary(summary):
+    print("\n--- Summary ---")
+    print(f"Files: {summary['files']} ({summary['errors']} errors)")
+    if 'rtf' not in summary:
+        return
+    print(f"Audio: {summary['audio_s']:.1f}s decoded in {summary['decode_s']:.2f}s (RTF {summary['rtf']:.4f})")
+    print(f"CER: mean {summary['cer_mean']:.3f}, max {summary['cer_max']:.3f}")
+    print(f"Latency: p50 {summary['latency_p50_s'] * 1000:.1f} ms, p95 {summary['latency_p95_s'] * 1000:.1f} ms")
+    print(f"Peak RSS: {summary['peak_rss_mb']:.0f} MB")
+    print("Stages: " + ', '.join(f"{name} {seconds:.3f}s" for name, seconds in summary['stages_s'].items()))
+
+# Summary keys and whether larger is better
+COMPARED_METRICS = [
+    ('rtf', False), ('latency_p50_s', False), ('latency_p95_s', False),
+    ('cer_mean', False), ('cer_max', False), ('peak_rss_mb', False), ('errors', False)
+]
+
+def compare_reports(old, new, tolerance=0.10):
+    """
+    Prints old vs new summaries and per-file CER changes
+
+    Args:
+        old, new: Loaded benchmark reports
+        tolerance: Relative slowdown allowed before a timing counts as a regression
+
+    Returns:
+        List of regressed metric names
+    """
+    if old['meta'].get('cases') != new['meta'].get('cases'):
+        print("Warning: the two runs used different corpora; per-file results are not comparable")
+
+    regressions = []
+    print(f"{'metric':<16}{'old':>12}{'new':>12}{'change':>10}")
+    for key, _ in COMPARED_METRICS:
+        old_value = old['summary'].get(key)
+        new_value = new['summary'].get(key)
+        if old_value is None or new_value is None:
+            continue
+        change = (new_value - old_value) / old_value if old_value else 0.0
+        # Accuracy and errors must not get worse at all; timings and memory get some slack
+        limit = 0.0 if key.startswith('cer') or key == 'errors' else tolerance
+        regressed = new_value > old_value and (old_value == 0 or change > limit)
+        if regressed:
+            regressions.append(key)
+        print(f"{key:<16}{old_value:>12.4f}{new_value:>12.4f}{change:>+9.1%}{'  <--' if regressed else ''}")
+
+    old_files = {r['name']: r for r in old['files'] if 'error' not in r}
+    for result in new['files']:
+        previous = old_files.get(result['name'])
+        if previous and 'error' not in result and abs(result['cer'] - previous['cer']) > 1e-9:
+            print(f"  {result['name']}: CER {previous['cer']:.3f} -> {result['cer']:.3f}")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the M2T decoder on a synthetic corpus")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help="Generate the corpus (if needed) and benchmark the decoder")
+    run.add_argument('--output', '-o', default='benchmark_results.json', help="Where to write the JSON report")
+    run.add_argument('--corpus-dir', default=DEFAULT_CORPUS_DIR)
+    run.add_argument('--cases', type=int, default=DEFAULT_CASES, help="Number of corpus files")
+    run.add_argument('--quick', action='store_true', help=f"Small corpus ({QUICK_CASES} files)")
+    run.add_argument('--seed', type=int, default=1234)
+    run.add_argument('--jobs', type=int, default=None, help="Processes for corpus generation")
+    run.add_argument('--repeat', type=int, default=1, help="Decode each file N times and keep the fastest")
+
+    compare = commands.add_parser('compare', help="Compare two benchmark reports")
+    compare.add_argument('old')
+    compare.add_argument('new')
+    compare.add_argument('--tolerance', type=float, default=0.10, help="Allowed relative slowdown (default 0.10)")
+
+    commands.add_parser('check', help="Run the decoder regression checks")
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'check':
+        return 1 if run_checks() else 0
+
+    if args.command == 'compare':
+        with open(args.old) as f:
+            old = json.load(f)
+        with open(args.new) as f:
+            new = json.load(f)
+        regressions = compare_reports(old, new, args.tolerance)
+        if regressions:
+            print(f"Regressions: {', '.join(regressions)}")
+            return 1
+        print("No regressions")
+        return 0
+
+    cases = make_cases(QUICK_CASES if args.quick else args.cases, args.seed)
+    entries = build_corpus(cases, args.corpus_dir, args.jobs)
+    print(f"Decoding {len(entries)} files...")
+    results = run_benchmark(entries, args.repeat)
+    summary = summarize(results)
+    print_summary(summary)
+
+    report = {
+        'meta': dict(environment_info(), version=BENCHMARK_VERSION, timestamp=time.time(), seed=args.seed, cases=cases),
+        'summary': summary,
+        'files': results
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Report saved to {args.output}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,266 @@
+"""
+SQLite-backed queue for asynchronous batch jobs
+
+Jobs and their files live in the app database (BatchJob, BatchJobItem), so
+the queue needs no broker and survives restarts. Each app process that
+starts its JobQueue runs one runner thread; a job is claimed with a
+conditional UPDATE, so each job runs in exactly one process even under a
+multi-process server.
+"""
+import json
+import os
+import socket
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import insert
+from models import db, BatchJob, BatchJobItem
+from batch_processor import process_batch
+from metrics import pid_alive
+
+POLL_INTERVAL_S = 2.0  # How often an idle runner looks for jobs submitted by other processes
+EVENT_POLL_INTERVAL_S = 0.5  # How often an event stream checks for progress
+EVENT_BATCH_SIZE = 500  # Most progress events read per poll
+KEEPALIVE_INTERVAL_S = 15.0  # Comment lines keep idle event streams open through proxies
+
+FINISHED_STATES = {'completed', 'cancelled', 'failed'}
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def submit_job(files, config=None):
+    """
+    Queues a batch job
+
+    Args:
+        files: List of (filepath, original_filename) tuples
+        config: Processing configuration dict shared by all files
+
+    Returns:
+        BatchJob: The queued job (committed)
+    """
+    job = BatchJob(status='queued', config=json.dumps(config or {}), total=len(files))
+    db.session.add(job)
+    db.session.flush()
+    if files:
+        # Core bulk insert: one statement however many files the job has
+        db.session.execute(insert(BatchJobItem), [
+            {'job_id': job.id, 'position': position, 'filepath': filepath,
+             'original_filename': original_filename, 'status': 'queued'}
+            for position, (filepath, original_filename) in enumerate(files)
+        ])
+    db.session.commit()
+    return job
+
+def cancel_job(job):
+    """
+    Cancels a job: a queued job stops at once, a running one before its next file
+
+    Returns:
+        bool: False if the job had already finished
+    """
+    if job.status in FINISHED_STATES:
+        return False
+    claimed = BatchJob.query.filter_by(id=job.id, status='queued').update(
+        {'status': 'cancelled', 'cancel_requested': True, 'finished_date': datetime.utcnow()})
+    if claimed:
+        _cancel_remaining_items(job.id)
+    else:
+        BatchJob.query.filter_by(id=job.id).update({'cancel_requested': True})
+    db.session.commit()
+    return True
+
+def job_results(job_id, after=-1, limit=100):
+    """
+    Finished files of a job, in order, for keyset pagination
+
+    Args:
+        job_id: BatchJob id
+        after: Return items whose position is greater than this
+        limit: Maximum number of items
+
+    Returns:
+        list: BatchJobItem rows
+    """
+    return (BatchJobItem.query
+            .filter(BatchJobItem.job_id == job_id, BatchJobItem.position > after,
+                    BatchJobItem.status != 'queued')
+            .order_by(BatchJobItem.position)
+            .limit(limit)
+            .all())
+
+def job_events(job_id, last_event_id=-1):
+    """
+    Server-Sent Events for one job
+
+    Yields a ``progress`` event per finished file (its position is the event
+    id, so a reconnecting EventSource resumes through Last-Event-ID), a
+    ``status`` event whenever the job's counters change, and ``end`` once the
+    job has finished and every file has been reported. Files of a job finish
+    in position order, so one indexed range query per poll reads only what is
+    new. Must run inside an app context.
+    """
+    last_position = last_event_id
+    last_status = None
+    last_sent = time.monotonic()
+    while True:
+        db.session.rollback()  # Drop cached rows; the runner updates them from another session
+        job = db.session.get(BatchJob, job_id)
+        if job is None:
+            return
+        items = job_results(job_id, last_position, EVENT_BATCH_SIZE)
+        chunks = []
+        for item in items:
+            if item.status == 'cancelled':
+                continue  # Reported once through the job status, not file by file
+            chunks.append(_format_event('progress', item.to_dict(), item.position))
+        if items:
+            last_position = items[-1].position
+        status = job.to_dict()
+        if status != last_status:
+            chunks.append(_format_event('status', status))
+            last_status = status
+        if chunks:
+            yield ''.join(chunks)
+            last_sent = time.monotonic()
+        if len(items) == EVENT_BATCH_SIZE:
+            continue  # Catching up on a backlog
+        if job.status in FINISHED_STATES:
+            yield _format_event('end', status)
+            return
+        if time.monotonic() - last_sent > KEEPALIVE_INTERVAL_S:
+            yield ': keepalive\n\n'
+            last_sent = time.monotonic()
+        time.sleep(EVENT_POLL_INTERVAL_S)
+
+def _format_event(event, data, event_id=None):
+    lines = [f'id: {event_id}'] if event_id is not None else []
+    lines.append(f'event: {event}')
+    lines.append(f'data: {json.dumps(data)}')
+    return '\n'.join(lines) + '\n\n'
+
+def _cancel_remaining_items(job_id):
+    BatchJobItem.query.filter_by(job_id=job_id, status='queued').update({'status': 'cancelled'})
+
+class JobQueue:
+    """
+    Background runner for queued batch jobs.
+
+    ``start`` launches a daemon thread that claims the oldest queued job,
+    decodes its remaining files with ``process_batch`` and records each result
+    on the job's item and counters in the transaction that saves the result.
+    ``notify`` wakes the thread right after a submit; jobs submitted by other
+    processes are picked up within POLL_INTERVAL_S. Jobs left running by a
+    process that died on this host are queued again at start and resume with
+    their unfinished files.
+    """
+    def __init__(self, app, workers=None, on_result=None):
+        self.app = app
+        self.workers = workers
+        self.on_result = on_result  # Optional callable(filepath, result), e.g. for metrics
+        self._wake = threading.Event()
+        self._start_lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """Starts the runner thread; safe to call repeatedly and from concurrent requests"""
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            with self.app.app_context():
+                self._requeue_orphans()
+            self._thread = threading.Thread(target=self._run, name='batch-job-queue', daemon=True)
+            self._thread.start()
+
+    def notify(self):
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            try:
+                with self.app.app_context():
+                    job_id = self._claim()
+                    if job_id is not None:
+                        self._process(job_id)
+                        continue
+            except Exception as e:
+                import traceback
+                traceback.print_exc()
+                print(f"Error in batch job queue: {e}")
+            self._wake.wait(POLL_INTERVAL_S)
+            self._wake.clear()
+
+    def _claim(self):
+        """Marks the oldest queued job as running in this process; returns its id or None"""
+        while True:
+            job = BatchJob.query.filter_by(status='queued').order_by(BatchJob.id).first()
+            if job is None:
+                return None
+            claimed = BatchJob.query.filter_by(id=job.id, status='queued').update(
+                {'status': 'running', 'worker': worker_name(), 'started_date': datetime.utcnow()})
+            db.session.commit()
+            if claimed:
+                return job.id
+            # Another process claimed it first; try the next one
+
+    def _process(self, job_id):
+        job = db.session.get(BatchJob, job_id)
+        config = json.loads(job.config or '{}')
+        items = (BatchJobItem.query.filter_by(job_id=job_id, status='queued')
+                 .order_by(BatchJobItem.position).all())
+        pending = [(item.id, item.filepath, item.original_filename) for item in items]
+        db.session.commit()
+
+        done = []
+
+        def record_result(filepath, result):
+            item_id = pending[len(done)][0]
+            done.append(item_id)
+            data = result.get('data') or {}
+            quality = data.get('quality_score') if result['success'] else None
+            BatchJobItem.query.filter_by(id=item_id).update({
+                'status': 'done' if result['success'] else 'failed',
+                'file_id': data.get('file_id'),
+                'result_id': data.get('result_id'),
+                'quality_score': quality,
+                'error': result.get('error')
+            })
+            BatchJob.query.filter_by(id=job_id).update({
+                'completed': BatchJob.completed + 1,
+                'succeeded': BatchJob.succeeded + (1 if result['success'] else 0),
+                'failed': BatchJob.failed + (0 if result['success'] else 1),
+                'quality_sum': BatchJob.quality_sum + (quality or 0)
+            })
+            # No commit: process_batch commits these updates with the file's results
+            if self.on_result:
+                self.on_result(filepath, result)
+
+        def cancel_requested():
+            return bool(db.session.query(BatchJob.cancel_requested).filter_by(id=job_id).scalar())
+
+        status, error = 'completed', None
+        try:
+            process_batch([(filepath, name) for _, filepath, name in pending], config,
+                          workers=self.workers, on_result=record_result, should_stop=cancel_requested)
+            if len(done) < len(pending):
+                status = 'cancelled'
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            db.session.rollback()
+            status, error = 'failed', str(e)
+        if status != 'completed':
+            _cancel_remaining_items(job_id)
+        BatchJob.query.filter_by(id=job_id).update(
+            {'status': status, 'error': error, 'finished_date': datetime.utcnow()})
+        db.session.commit()
+
+    def _requeue_orphans(self):
+        """Queues again the jobs whose runner on this host is no longer alive"""
+        host = socket.gethostname()
+        for job in BatchJob.query.filter_by(status='running').all():
+            worker_host, _, pid = (job.worker or '').rpartition(':')
+            if worker_host == host and pid.isdigit() and not pid_alive(int(pid)):
+                job.status = 'queued'
+                job.worker = None
+        db.session.commit()
@@ -0,0 +1,347 @@
+"""
+In-process Prometheus-style metrics for M2T
+
+Counters, gauges and histograms are kept in memory per process. Every
+process writes a snapshot to its own file in a shared metrics directory, so
+`/metrics` can be served by any worker of a multi-process server. The scrape
+sums the snapshots of all processes, after folding the snapshots of exited
+processes into one compacted file.
+"""
+import atexit
+import contextlib
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Seconds; covers quick API calls up to multi-minute decodes
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+FLUSH_INTERVAL_S = 1.0  # Minimum time between snapshot writes of one process
+FILE_PREFIX = 'metrics_'
+COMPACTED_FILE = f'{FILE_PREFIX}compacted.json'  # Counters and histograms of exited processes
+COMPACT_LOCK_FILE = 'compact.lock'
+ABSORBED_GRACE_S = 60.0  # How long compacted snapshot names are remembered, for scrapes in flight
+
+def _label_key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+def _format_labels(label_key, extra=()):
+    pairs = list(label_key) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class MetricsRegistry:
+    """
+    Thread-safe metric store with optional per-process snapshot files.
+
+    Metrics are declared once with ``describe`` and updated with ``inc``,
+    ``set_gauge``/``add_gauge`` and ``observe``; labels are keyword arguments.
+    When ``directory`` is set, ``flush`` writes this process's snapshot to
+    ``metrics_<pid>_<token>.json`` (atomically, at most every
+    FLUSH_INTERVAL_S unless forced) and ``render`` sums all snapshots.
+    Counters and histograms of exited processes are folded into
+    COMPACTED_FILE on scrape, so totals stay monotonic while the directory
+    stays one file per live process; gauges only count live processes.
+    """
+    def __init__(self, directory=None):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._descriptions = {}
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._last_flush = 0.0
+        self._dirty = False
+        self._path = None
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._path = self._new_path()
+            atexit.register(self.flush, force=True)
+            if hasattr(os, 'register_at_fork'):
+                os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def _new_path(self):
+        return os.path.join(self.directory, f"{FILE_PREFIX}{os.getpid()}_{uuid.uuid4().hex[:8]}.json")
+
+    def _reset_after_fork(self):
+        """A forked worker starts empty with a file of its own; the parent keeps reporting its counts."""
+        self._lock = threading.Lock()
+        self._counters, self._gauges, self._histograms = {}, {}, {}
+        self._dirty = False
+        self._path = self._new_path()
+
+    def describe(self, name, metric_type, help_text, buckets=LATENCY_BUCKETS):
+        """Declares a metric; ``metric_type`` is 'counter', 'gauge' or 'histogram'."""
+        self._descriptions[name] = {'type': metric_type, 'help': help_text, 'buckets': list(buckets)}
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+            self._dirty = True
+
+    def set_gauge(self, name, value, **labels):
+        with self._lock:
+            self._gauges[(name, _label_key(labels))] = value
+            self._dirty = True
+
+    def add_gauge(self, name, value, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._gauges[key] = self._gauges.get(key, 0) + value
+            self._dirty = True
+
+    def observe(self, name, value, **labels):
+        buckets = self._descriptions[name]['buckets']
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {'counts': [0] * (len(buckets) + 1), 'sum': 0.0, 'count': 0}
+            # Per-bucket (non-cumulative) counts; the last slot is +Inf
+            index = next((i for i, bound in enumerate(buckets) if value <= bound), len(buckets))
+            histogram['counts'][index] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+            self._dirty = True
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'pid': os.getpid(),
+                'started': process_start_time(os.getpid()),
+                'counters': [[name, list(labels), value] for (name, labels), value in self._counters.items()],
+                'gauges': [[name, list(labels), value] for (name, labels), value in self._gauges.items()],
+                'histograms': [[name, list(labels), dict(h, counts=list(h['counts']))]
+                               for (name, labels), h in self._histograms.items()]
+            }
+
+    def flush(self, force=False):
+        """Writes this process's snapshot file if anything changed (throttled unless forced)."""
+        if not self._path or not self._dirty:
+            return
+        now = time.time()
+        if not force and now - self._last_flush < FLUSH_INTERVAL_S:
+            return
+        self._last_flush = now
+        self._dirty = False
+        _write_json(self._path, self.snapshot())
+
+    def _read_snapshots(self):
+        """Snapshot files of other processes by filename, and the compacted snapshot."""
+        snapshots = {}
+        for filename in os.listdir(self.directory):
+            path = os.path.join(self.directory, filename)
+            if filename.startswith(FILE_PREFIX) and filename != COMPACTED_FILE and path != self._path:
+                snapshot = _load_json(path)
+                if snapshot is not None:
+                    snapshots[filename] = snapshot
+        # Read last: a snapshot that vanished above was compacted first, so it is in here
+        compacted = _load_json(os.path.join(self.directory, COMPACTED_FILE))
+        if compacted is None:
+            compacted = {'pid': None, 'counters': [], 'gauges': [], 'histograms': [], 'absorbed': {}}
+        return snapshots, compacted
+
+    def _compact(self):
+        """Folds the snapshots of exited processes into COMPACTED_FILE and removes them."""
+        with _try_lock(os.path.join(self.directory, COMPACT_LOCK_FILE)) as locked:
+            if not locked:
+                return  # Another process is compacting
+            snapshots, compacted = self._read_snapshots()
+            now = time.time()
+            # Names stay listed for a while after their files are removed, so a scrape that read
+            # one of those files just before skips it instead of adding it to the compacted totals
+            absorbed = {name: when for name, when in compacted['absorbed'].items()
+                        if now - when < ABSORBED_GRACE_S or name in snapshots}
+            dead = [name for name, snapshot in snapshots.items()
+                    if name not in absorbed and not snapshot_alive(snapshot)]
+            if dead or len(absorbed) < len(compacted['absorbed']):
+                counters, histograms = {}, {}
+                for snapshot in [compacted] + [snapshots[name] for name in dead]:
+                    _fold(snapshot, counters, None, histograms)
+                absorbed.update((name, now) for name in dead)
+                written = _write_json(os.path.join(self.directory, COMPACTED_FILE), {
+                    'pid': None,
+                    'counters': [[name, labels, value] for (name, labels), value in counters.items()],
+                    'gauges': [],
+                    'histograms': [[name, labels, h] for (name, labels), h in histograms.items()],
+                    'absorbed': absorbed
+                })
+                if not written:
+                    return
+            # Also retries files a crashed compaction folded in but did not remove
+            for name in absorbed:
+                if name in snapshots:
+                    try:
+                        os.remove(os.path.join(self.directory, name))
+                    except OSError:
+                        pass
+
+    def _collect(self):
+        """Snapshots of every process: this one from memory, the others from disk."""
+        if not self.directory:
+            return self.snapshot(), []
+        self.flush(force=True)
+        self._compact()
+        snapshots, compacted = self._read_snapshots()
+        others = [snapshot for name, snapshot in snapshots.items() if name not in compacted['absorbed']]
+        return self.snapshot(), [compacted] + others
+
+    def render(self):
+        """Aggregated metrics in the Prometheus text exposition format."""
+        counters, gauges, histograms = {}, {}, {}
+        own, others = self._collect()
+        _fold(own, counters, gauges, histograms)
+        for snapshot in others:
+            _fold(snapshot, counters, gauges if snapshot_alive(snapshot) else None, histograms)
+
+        lines = []
+        for name, description in self._descriptions.items():
+            lines.append(f"# HELP {name} {description['help']}")
+            lines.append(f"# TYPE {name} {description['type']}")
+            if description['type'] == 'histogram':
+                bounds = description['buckets'] + [math.inf]
+                for (metric, labels), h in sorted(histograms.items()):
+                    if metric != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(bounds, h['counts']):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_format_labels(labels, [('le', _format_value(bound))])} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(h['sum'])}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {h['count']}")
+            else:
+                values = counters if description['type'] == 'counter' else gauges
+                for (metric, labels), value in sorted(values.items()):
+                    if metric == name:
+                        lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+def _fold(snapshot, counters, gauges, histograms):
+    """Adds a snapshot into running totals keyed by (name, labels); gauges are skipped if None."""
+    for name, labels, value in snapshot['counters']:
+        key = (name, tuple(map(tuple, labels)))
+        counters[key] = counters.get(key, 0) + value
+    if gauges is not None:
+        for name, labels, value in snapshot['gauges']:
+            key = (name, tuple(map(tuple, labels)))
+            gauges[key] = gauges.get(key, 0) + value
+    for name, labels, h in snapshot['histograms']:
+        key = (name, tuple(map(tuple, labels)))
+        total = histograms.setdefault(key, {'counts': [0] * len(h['counts']), 'sum': 0.0, 'count': 0})
+        total['counts'] = [a + b for a, b in zip(total['counts'], h['counts'])]
+        total['sum'] += h['sum']
+        total['count'] += h['count']
+
+def _load_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None  # Being replaced or removed
+
+def _write_json(path, data):
+    """Replaces a file atomically, so readers see the old or the new contents; False on failure."""
+    fd, temp_path = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f)
+        os.replace(temp_path, path)
+        return True
+    except OSError as e:
+        print(f"Error writing metrics snapshot: {e}")
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return False
+
+@contextlib.contextmanager
+def _try_lock(path):
+    """Exclusive lock on a file without waiting; yields False if another process holds it."""
+    with open(path, 'a') as f:
+        try:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+def snapshot_alive(snapshot):
+    """True if the process that wrote a snapshot is still running (not just its pid)"""
+    pid = snapshot['pid']
+    if pid is None or not pid_alive(pid):
+        return False
+    # A recycled pid belongs to a process started later than the one that wrote the snapshot
+    started = snapshot.get('started')
+    return started is None or started == process_start_time(pid)
+
+def process_start_time(pid):
+    """Kernel start time of a process (clock ticks since boot), or None without /proc"""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # Fields resume after the parenthesised command name, which may contain spaces
+    return int(stat.rpartition(')')[2].split()[19])
+
+def pid_alive(pid):
+    """True if a process with this pid exists on this host"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def create_registry(directory=None):
+    """Registry with the metrics the app reports already declared."""
+    registry = MetricsRegistry(directory)
+    registry.describe('m2t_http_requests_total', 'counter', 'HTTP requests by endpoint, method and status')
+    registry.describe('m2t_http_request_duration_seconds', 'histogram', 'HTTP request latency by endpoint')
+    registry.describe('m2t_http_requests_in_progress', 'gauge', 'HTTP requests currently being served')
+    registry.describe('m2t_decodes_total', 'counter', 'Decodes by source and outcome')
+    registry.describe('m2t_decode_stage_seconds', 'histogram', 'Wall time of each decode pipeline stage')
+    registry.describe('m2t_audio_seconds_processed_total', 'counter', 'Seconds of audio decoded')
+    registry.describe('m2t_bytes_processed_total', 'counter', 'Bytes of uploaded audio decoded')
+    registry.describe('m2t_batch_queue_depth', 'gauge', 'Files waiting in running /batch-process requests')
+    registry.describe('m2t_generated_cache_requests_total', 'counter', 'Generated audio cache lookups by result')
+    registry.describe('m2t_decode_cache_requests_total', 'counter', 'Decode result cache lookups by source and result')
+    return registry
+
+def record_decode(registry, analysis, source, file_size=None):
+    """Records one decode's outcome, stage timings and audio processed."""
+    outcome = 'error' if str(analysis.get('full_text', '')).startswith('[ERROR') else 'ok'
+    registry.inc('m2t_decodes_total', source=source, outcome=outcome)
+    timings = analysis.get('timings') or {}
+    for stage, figures in timings.get('stages', {}).items():
+        registry.observe('m2t_decode_stage_seconds', figures['wall_s'], stage=stage)
+    if timings.get('audio_s'):
+        registry.inc('m2t_audio_seconds_processed_total', timings['audio_s'], source=source)
+    if file_size:
+        registry.inc('m2t_bytes_processed_total', file_size, source=source)
@@ -1,11 +1,37 @@
 """
 Database models for M2T Signal Analysis
 """
+import sqlite3
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, inspect, text
 from datetime import datetime
 
+# SQLite connection tuning
+SQLITE_BUSY_TIMEOUT_MS = 30000  # Writers wait this long for the lock instead of failing with "database is locked"
+SQLITE_CACHE_SIZE_KB = 20000  # Page cache per connection
+
 db = SQLAlchemy()
 
+def enable_sqlite_tuning(engine):
+    """
+    Applies connection pragmas to every new SQLite connection of ``engine``.
+    
+    WAL lets readers (status pages, event streams) run alongside the batch
+    writer, and with synchronous=NORMAL a commit no longer waits for an
+    fsync (the WAL is synced at checkpoints; a power cut can lose the last
+    commits but not corrupt the database). Other engines are left alone.
+    """
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        if not isinstance(dbapi_connection, sqlite3.Connection):
+            return
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}')  # First, so switching to WAL waits too
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute(f'PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}')
+        cursor.close()
+
 class AudioFile(db.Model):
     """Audio file metadata"""
     __tablename__ = 'audio_files'
@@ -19,8 +45,9 @@ class AudioFile(db.Model):
     sample_rate = db.Column(db.Integer)
     channels = db.Column(db.Integer)
     format = db.Column(db.String(10))
-    upload_date = db.Column(db.DateTime, default=datetime.utcnow)
-    processed = db.Column(db.Boolean, default=False)
+    digest = db.Column(db.String(64), index=True)  # SHA-256 of the contents, for deduplication
+    upload_date = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    processed = db.Column(db.Boolean, default=False, index=True)
     
     # Relationship to decode results
     results = db.relationship('DecodeResult', backref='audio_file', lazy=True, cascade='all, delete-orphan')
@@ -35,6 +62,7 @@ class AudioFile(db.Model):
             'sample_rate': self.sample_rate,
             'channels': self.channels,
             'format': self.format,
+            'digest': self.digest,
             'upload_date': self.upload_date.isoformat() if self.upload_date else None,
             'processed': self.processed
         }
@@ -44,7 +72,7 @@ class DecodeResult(db.Model):
     __tablename__ = 'decode_results'
     
     id = db.Column(db.Integer, primary_key=True)
-    file_id = db.Column(db.Integer, db.ForeignKey('audio_files.id'), nullable=False)
+    file_id = db.Column(db.Integer, db.ForeignKey('audio_files.id'), nullable=False, index=True)
     
     # Decode parameters
     wpm = db.Column(db.Float)
@@ -57,7 +85,7 @@ class DecodeResult(db.Model):
     event_count = db.Column(db.Integer)
     
     # Quality metrics
-    quality_score = db.Column(db.Float)  # 0-100
+    quality_score = db.Column(db.Float, index=True)  # 0-100
     snr = db.Column(db.Float)  # Signal-to-Noise Ratio in dB
     avg_snr = db.Column(db.Float)
     confidence = db.Column(db.Float)  # 0-100
@@ -69,11 +97,17 @@ class DecodeResult(db.Model):
     
     # Processing metadata
     processing_time = db.Column(db.Float)  # seconds
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    timings = db.Column(db.Text)  # Per-stage wall/CPU time and samples (JSON string)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)  # With the id, the /results keyset order
     
     # Preprocessing config (JSON string)
     preprocess_config = db.Column(db.Text)
     
+    # Result cache: digest of (audio digest, decode config, decoder version) and the
+    # decoder output served on a hit (JSON string, see batch_processor.pack_analysis)
+    cache_key = db.Column(db.String(64), index=True)
+    analysis = db.Column(db.Text)
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -92,6 +126,7 @@ class DecodeResult(db.Model):
             'avg_dash_duration': self.avg_dash_duration,
             'timing_consistency': self.timing_consistency,
             'processing_time': self.processing_time,
+            'timings': self.timings,
             'timestamp': self.timestamp.isoformat() if self.timestamp else None,
             'preprocess_config': self.preprocess_config
         }
@@ -121,3 +156,91 @@ class Session(db.Model):
             'last_modified': self.last_modified.isoformat() if self.last_modified else None
         }
 
+class BatchJob(db.Model):
+    """Queued batch decode; progress counters are kept on the row so status reads stay O(1)"""
+    __tablename__ = 'batch_jobs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, completed, cancelled, failed
+    config = db.Column(db.Text)  # Processing config (JSON string)
+    
+    # Progress
+    total = db.Column(db.Integer, nullable=False, default=0)
+    completed = db.Column(db.Integer, nullable=False, default=0)
+    succeeded = db.Column(db.Integer, nullable=False, default=0)
+    failed = db.Column(db.Integer, nullable=False, default=0)
+    quality_sum = db.Column(db.Float, nullable=False, default=0.0)  # Of successful files
+    
+    # Queue bookkeeping
+    cancel_requested = db.Column(db.Boolean, nullable=False, default=False)
+    worker = db.Column(db.String(100))  # host:pid of the process running the job
+    error = db.Column(db.Text)
+    created_date = db.Column(db.DateTime, default=datetime.utcnow)
+    started_date = db.Column(db.DateTime)
+    finished_date = db.Column(db.DateTime)
+    
+    items = db.relationship('BatchJobItem', backref='job', lazy='dynamic', cascade='all, delete-orphan')
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'total': self.total,
+            'completed': self.completed,
+            'succeeded': self.succeeded,
+            'failed': self.failed,
+            'average_quality': self.quality_sum / self.succeeded if self.succeeded else 0,
+            'cancel_requested': self.cancel_requested,
+            'error': self.error,
+            'created_date': self.created_date.isoformat() if self.created_date else None,
+            'started_date': self.started_date.isoformat() if self.started_date else None,
+            'finished_date': self.finished_date.isoformat() if self.finished_date else None
+        }
+
+class BatchJobItem(db.Model):
+    """One file of a batch job"""
+    __tablename__ = 'batch_job_items'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.Integer, db.ForeignKey('batch_jobs.id'), nullable=False)
+    position = db.Column(db.Integer, nullable=False)  # Order within the job; also the SSE event id
+    filepath = db.Column(db.String(500), nullable=False)
+    original_filename = db.Column(db.String(255))
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, done, failed, cancelled
+    file_id = db.Column(db.Integer, db.ForeignKey('audio_files.id'))
+    result_id = db.Column(db.Integer, db.ForeignKey('decode_results.id'))
+    quality_score = db.Column(db.Float)
+    error = db.Column(db.Text)
+    
+    __table_args__ = (db.UniqueConstraint('job_id', 'position'),)
+    
+    def to_dict(self):
+        return {
+            'position': self.position,
+            'filename': self.original_filename,
+            'status': self.status,
+            'file_id': self.file_id,
+            'result_id': self.result_id,
+            'quality_score': self.quality_score,
+            'error': self.error
+        }
+
+def upgrade_schema():
+    """
+    Adds columns and indexes that were introduced after a table was created.
+    db.create_all() only creates missing tables, so existing databases
+    would otherwise miss them. Call inside an app context.
+    """
+    inspector = inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(dialect=db.engine.dialect)
+                db.session.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+    db.session.commit()
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=db.engine, checkfirst=True)
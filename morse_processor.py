@@ -1,10 +1,20 @@
+import math
+import os
+import struct
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
 import numpy as np
 import librosa
-from pydub import AudioSegment
-from pydub.generators import Sine
+import soundfile as sf
+from scipy import ndimage, signal
+
+import audio_preprocessor
+from timing import StageTimer
 
 # --- ---
-# == Part 1: Text-to-Morse Generation (Unchanged) ==
+# == Part 1: Text-to-Morse Generation ==
 # --- ---
 
 MORSE_CODE_DICT = {
@@ -26,30 +36,189 @@ WORD_SPACE_MS = 7 * DOT_DURATION_MS
 TONE_FREQUENCY = 700
 SAMPLE_RATE = 44100
 
-def generate_morse_audio(text, output_path):
+SYNTHESIZER_VERSION = 1  # Bump whenever generated audio changes, to invalidate cached files
+DECODER_VERSION = 2  # Bump whenever decoded output changes, to invalidate cached decode results
+VOLUME_DB = -10  # Tone peak level in dBFS
+KEYING_RAMP_MS = 5  # Raised-cosine rise/fall time of each tone
+PADDING_MS = 500  # Silence before and after the message
+STREAM_CHUNK_SAMPLES = 16384  # Audio batched per chunk of a streamed response
+
+class MorseSynthesizer:
+    """
+    Renders text as Morse audio with NumPy.
+
+    One keyed waveform per symbol (dot, dash) is built up front with
+    raised-cosine rise and fall ramps so the tones do not click. The ramps are
+    centred on the keying edges, so each tone is at half amplitude exactly at
+    its nominal start and end and keeps its full timing. A message is
+    laid out by mapping every pattern character to its length in samples and
+    taking a cumulative sum, which gives the start of every tone at once. The
+    symbol waveforms are then scattered into a single preallocated buffer.
+
+    ``farnsworth_wpm`` sets a slower overall speed while keeping characters at
+    ``wpm``: only the gaps between characters and words are stretched (ARRL
+    timing).
+    """
+    def __init__(self, wpm=WPM, farnsworth_wpm=None, tone_freq=TONE_FREQUENCY, sample_rate=SAMPLE_RATE,
+                 volume_db=VOLUME_DB, ramp_ms=KEYING_RAMP_MS, padding_ms=PADDING_MS):
+        if wpm <= 0 or (farnsworth_wpm is not None and farnsworth_wpm <= 0):
+            raise ValueError("WPM must be positive")
+        self.wpm = wpm
+        self.farnsworth_wpm = farnsworth_wpm
+        self.tone_freq = tone_freq
+        self.sample_rate = sample_rate
+
+        unit_s = 1.2 / wpm
+        if farnsworth_wpm and farnsworth_wpm < wpm:
+            # Total delay spread over the 19 spacing units of "PARIS "
+            spacing_unit_s = (60.0 * wpm - 37.2 * farnsworth_wpm) / (wpm * farnsworth_wpm) / 19
+        else:
+            spacing_unit_s = unit_s
+        samples = lambda seconds: int(round(seconds * sample_rate))
+        self.dot_samples = samples(unit_s)
+        self.dash_samples = samples(3 * unit_s)
+        self.intra_char_samples = samples(unit_s)
+        self.char_gap_samples = samples(3 * spacing_unit_s)
+        self.word_gap_samples = samples(7 * spacing_unit_s)
+        self.padding_samples = samples(padding_ms / 1000.0)
+
+        amplitude = 10.0 ** (volume_db / 20.0)
+        ramp = min(samples(ramp_ms / 1000.0), self.dot_samples // 2)
+        self._ramp_lead = ramp // 2
+        self.padding_samples = max(self.padding_samples, ramp)
+        self.dot_wave = self._keyed_tone(self.dot_samples, ramp, amplitude)
+        self.dash_wave = self._keyed_tone(self.dash_samples, ramp, amplitude)
+        self._char_templates = {}
+        self._char_lengths = None
+
+    def _keyed_tone(self, duration, ramp, amplitude):
+        length = duration + ramp
+        t = np.arange(length) / self.sample_rate
+        envelope = np.ones(length)
+        if ramp:
+            rise = 0.5 * (1.0 - np.cos(np.pi * np.arange(ramp) / ramp))
+            envelope[:ramp] = rise
+            envelope[length - ramp:] = rise[::-1]
+        return (amplitude * envelope * np.sin(2.0 * np.pi * self.tone_freq * t)).astype(np.float32)
+
+    def pattern(self, text):
+        """
+        Morse pattern for ``text``: '.'/'-' for tones, ' ' after every
+        character and '/' for a word break. Unknown characters are skipped.
+        """
+        return ''.join('/' if char == ' ' else MORSE_CODE_DICT[char] + ' '
+                       for char in text.upper() if char in MORSE_CODE_DICT)
+
+    def layout(self, text):
+        """
+        Returns ``(tone_starts, is_dash, total_samples)`` for ``text``;
+        tone starts include the lead-in of the rise ramp.
+
+        Every pattern character gets a length in samples: tones their own
+        length plus the intra-character gap when another tone follows, ' '
+        the inter-character gap and '/' the rest of a word gap. A cumulative
+        sum of these lengths is the start of every element.
+        """
+        tokens = np.frombuffer(self.pattern(text).encode('ascii'), dtype=np.uint8)
+        is_dot = tokens == ord('.')
+        is_dash = tokens == ord('-')
+        is_tone = is_dot | is_dash
+        lengths = np.zeros(len(tokens), dtype=np.int64)
+        lengths[is_dot] = self.dot_samples
+        lengths[is_dash] = self.dash_samples
+        lengths[:-1][is_tone[:-1] & is_tone[1:]] += self.intra_char_samples
+        lengths[tokens == ord(' ')] = self.char_gap_samples
+        lengths[tokens == ord('/')] = self.word_gap_samples - self.char_gap_samples
+        ends = self.padding_samples + np.cumsum(lengths)
+        starts = ends - lengths
+        total_samples = (ends[-1] if len(ends) else self.padding_samples) + self.padding_samples
+        return starts[is_tone] - self._ramp_lead, is_dash[is_tone], int(total_samples)
+
+    def synthesize(self, text):
+        """Renders ``text`` to a float32 sample array."""
+        starts, is_dash, total_samples = self.layout(text)
+        audio = np.zeros(total_samples, dtype=np.float32)
+        for wave, tone_starts in ((self.dot_wave, starts[~is_dash]), (self.dash_wave, starts[is_dash])):
+            if len(tone_starts):
+                audio[tone_starts[:, None] + np.arange(len(wave))] = wave
+        return audio
+
+    def write(self, text, output_path):
+        """Renders ``text`` and writes it as a 16-bit mono WAV file."""
+        audio = self.synthesize(text)
+        with open(output_path, 'wb') as f:
+            f.write(wav_header(len(audio), self.sample_rate))
+            f.write(pcm16_bytes(audio))
+
+    def stream_length(self, text):
+        """Number of samples ``synthesize(text)`` returns, from a per-character length table."""
+        if self._char_lengths is None:
+            self._char_lengths = np.zeros(128, dtype=np.int64)
+            for char in MORSE_CODE_DICT:
+                self._char_lengths[ord(char)] = self.layout(char)[2] - 2 * self.padding_samples
+        codes = np.frombuffer(text.upper().encode('ascii', 'ignore'), dtype=np.uint8)
+        return int(self._char_lengths[codes].sum()) + 2 * self.padding_samples
+
+    def stream(self, text, chunk_samples=STREAM_CHUNK_SAMPLES):
+        """
+        Yields a 16-bit mono WAV file for ``text`` piece by piece.
+
+        The header carries the exact length (``stream_length``), so it goes
+        out before any audio is rendered. Every character is then emitted
+        from a cached PCM template (its tones plus trailing gap, shifted by the
+        ramp lead-in like ``layout``), batched into chunks of about
+        ``chunk_samples``. The bytes match what ``write`` produces.
+        """
+        num_samples = self.stream_length(text)
+        yield wav_header(num_samples, self.sample_rate)
+        pieces = [bytes(2 * (self.padding_samples - self._ramp_lead))]
+        pending = len(pieces[0]) // 2
+        for char in text.upper():
+            if char not in MORSE_CODE_DICT:
+                continue
+            template = self._char_template(char)
+            pieces.append(template)
+            pending += len(template) // 2
+            if pending >= chunk_samples:
+                yield b''.join(pieces)
+                pieces, pending = [], 0
+        pieces.append(bytes(2 * (self.padding_samples + self._ramp_lead)))
+        yield b''.join(pieces)
+
+    def _char_template(self, char):
+        template = self._char_templates.get(char)
+        if template is None:
+            # One-character message without its padding
+            audio = self.synthesize(char)
+            start = self.padding_samples - self._ramp_lead
+            template = pcm16_bytes(audio[start:start + len(audio) - 2 * self.padding_samples])
+            self._char_templates[char] = template
+        return template
+
+def pcm16_bytes(audio):
+    """Float samples in [-1, 1] as little-endian 16-bit PCM."""
+    return (np.clip(audio, -1.0, 1.0) * 32767.0).round().astype('<i2').tobytes()
+
+def wav_header(num_samples, sample_rate, channels=1, bits_per_sample=16):
+    """44-byte RIFF/WAVE header for ``num_samples`` frames of PCM."""
+    block_align = channels * bits_per_sample // 8
+    data_bytes = num_samples * block_align
+    if 36 + data_bytes > 0xFFFFFFFF:
+        raise ValueError("Audio is too long for a WAV file")
+    return struct.pack('<4sI4s4sIHHIIHH4sI', b'RIFF', 36 + data_bytes, b'WAVE', b'fmt ', 16, 1, channels,
+                       sample_rate, sample_rate * block_align, block_align, bits_per_sample, b'data', data_bytes)
+
+@lru_cache(maxsize=16)
+def get_synthesizer(wpm=WPM, farnsworth_wpm=None, tone_freq=TONE_FREQUENCY, sample_rate=SAMPLE_RATE,
+                    volume_db=VOLUME_DB, ramp_ms=KEYING_RAMP_MS):
+    """Returns a shared ``MorseSynthesizer`` so symbol waveforms are built once per setting."""
+    return MorseSynthesizer(wpm, farnsworth_wpm, tone_freq, sample_rate, volume_db, ramp_ms)
+
+def generate_morse_audio(text, output_path, wpm=WPM, farnsworth_wpm=None, tone_freq=TONE_FREQUENCY,
+                         sample_rate=SAMPLE_RATE, volume_db=VOLUME_DB, ramp_ms=KEYING_RAMP_MS):
     """Converts a string of text into a Morse code .wav file."""
     print(f"Generating Morse for: {text}")
-    dot_silence = AudioSegment.silent(duration=INTRA_CHAR_SPACE_MS)
-    char_silence = AudioSegment.silent(duration=INTER_CHAR_SPACE_MS)
-    word_silence = AudioSegment.silent(duration=WORD_SPACE_MS)
-    dot_tone = Sine(TONE_FREQUENCY).to_audio_segment(duration=DOT_DURATION_MS, volume=-10)
-    dash_tone = Sine(TONE_FREQUENCY).to_audio_segment(duration=DASH_DURATION_MS, volume=-10)
-    final_audio = AudioSegment.silent(duration=500)
-    for char in text.upper():
-        if char == ' ':
-            final_audio += word_silence
-        elif char in MORSE_CODE_DICT:
-            morse_symbols = MORSE_CODE_DICT[char]
-            for i, symbol in enumerate(morse_symbols):
-                if symbol == '.':
-                    final_audio += dot_tone
-                elif symbol == '-':
-                    final_audio += dash_tone
-                if i < len(morse_symbols) - 1:
-                    final_audio += dot_silence
-            final_audio += char_silence
-    final_audio += AudioSegment.silent(duration=500)
-    final_audio.export(output_path, format="wav")
+    get_synthesizer(wpm, farnsworth_wpm, tone_freq, sample_rate, volume_db, ramp_ms).write(text, output_path)
     print(f"File saved to {output_path}")
 
 # --- ---
@@ -81,42 +250,632 @@ def goertzel_mag(frames, sample_rate, target_freq):
     # Return the squared magnitude (power)
     return real**2 + imag**2
 
-def process_audio_file(filepath, wpm_override=None, threshold_factor=1.0, frequency_override=None, preprocess_config=None):
-    # --- 1. Find Peak Frequency using FFT ---
-    # This gives us a much better starting point than a hardcoded frequency
+FREQUENCY_BLOCK_SEGMENTS = 64  # Welch segments transformed per rfft call
+GOERTZEL_BLOCK_FRAMES = 512  # Frames per matrix product; keeps the float64 working copy in cache
+
+def goertzel_frames_mag(frames, sample_rate, target_freq):
+    """
+    Vectorized Goertzel power for every row of a 2-D ``frames`` matrix.
+
+    The Goertzel output power equals |X[k]|^2 for the DFT bin ``k`` nearest to
+    ``target_freq``, so instead of running the recurrence sample by sample each
+    frame is projected onto a precomputed cosine/sine pair in one matrix
+    product. Matches ``goertzel_mag`` applied row by row to within floating
+    point rounding (relative error below 1e-9 of the largest frame power).
+    """
+    frames = np.atleast_2d(frames)
+    num_frames, frame_length = frames.shape
+    k = int(0.5 + (frame_length * target_freq) / sample_rate)
+    omega = (2.0 * np.pi * k) / frame_length
+    n = np.arange(frame_length)
+    basis = np.stack([np.cos(omega * n), np.sin(omega * n)], axis=1)
+
+    powers = np.empty(num_frames, dtype=np.float64)
+    for start in range(0, num_frames, GOERTZEL_BLOCK_FRAMES):
+        block = frames[start:start + GOERTZEL_BLOCK_FRAMES].astype(np.float64, copy=False)
+        projection = block @ basis
+        powers[start:start + len(block)] = np.einsum('ij,ij->i', projection, projection)
+    return powers
+
+# Resampling quality/speed trade-off shared by the loader and the baseband
+# front end: librosa resampler, and (FIR taps per decimation phase, Kaiser beta).
+RESAMPLE_QUALITY = {
+    'fast': {'res_type': 'soxr_qq', 'taps_per_phase': 4, 'beta': 5.0},
+    'balanced': {'res_type': 'soxr_mq', 'taps_per_phase': 8, 'beta': 7.0},
+    'high': {'res_type': 'soxr_hq', 'taps_per_phase': 16, 'beta': 9.0},
+}
+BASEBAND_MIN_RATE = 1600  # Hz; lowest complex rate kept after decimation (+/-640 Hz passband)
+BASEBAND_BLOCK_SAMPLES = 1 << 18  # Input samples mixed and filtered per step
+
+def load_audio(filepath, sample_rate=None, resample_quality='balanced'):
+    """
+    Loads a file as mono float32. ``sample_rate=None`` keeps the native rate,
+    which is what the decoder wants; resampling only happens on request.
+    Formats libsndfile cannot read (M4A, AAC, ...) are decoded by ffmpeg
+    through a pipe instead of being converted to a temporary WAV first.
+    """
+    if audio_preprocessor.needs_ffmpeg(filepath):
+        return audio_preprocessor.decode_audio(filepath, sample_rate)
+    res_type = RESAMPLE_QUALITY[resample_quality]['res_type']
+    return librosa.load(filepath, sr=sample_rate, res_type=res_type)
+
+def baseband_decimation_factor(sample_rate, chunk_size):
+    """Largest divisor of ``chunk_size`` that keeps the decimated rate above BASEBAND_MIN_RATE."""
+    divisors = [d for d in range(1, chunk_size + 1)
+                if chunk_size % d == 0 and sample_rate / d >= BASEBAND_MIN_RATE]
+    return max(divisors) if divisors else 1
+
+class Oscillator:
+    """Mixes real samples by exp(-j * omega * n), carrying the phase across blocks."""
+    def __init__(self, omega):
+        self.omega = omega
+        self._phase = 0.0
+        self._table = np.exp(-1j * omega * np.arange(BASEBAND_BLOCK_SAMPLES)).astype(np.complex64)
+
+    def mix(self, samples):
+        samples = np.asarray(samples, dtype=np.float32)
+        mixed = np.empty(len(samples), dtype=np.complex64)
+        for start in range(0, len(samples), BASEBAND_BLOCK_SAMPLES):
+            block = samples[start:start + BASEBAND_BLOCK_SAMPLES]
+            rotation = np.complex64(np.exp(-1j * self._phase))
+            mixed[start:start + len(block)] = block * (self._table[:len(block)] * rotation)
+            self._phase = (self._phase + self.omega * len(block)) % (2.0 * np.pi)
+        return mixed
+
+class BasebandDecimator:
+    """
+    Mixes a tone down to 0 Hz and decimates it with a polyphase FIR.
+
+    Only every ``factor``-th output of the low-pass filter is computed (one
+    strided window per output), and the last taps' worth of input is carried
+    between ``process`` calls so blocks can be fed incrementally. Output ``m``
+    is centred on input sample ``m * factor``; call ``flush`` at the end to
+    emit the outputs that still need trailing samples.
+    """
+    def __init__(self, sample_rate, center_freq, factor, quality='balanced'):
+        params = RESAMPLE_QUALITY[quality]
+        self.factor = factor
+        self._taps_per_phase = params['taps_per_phase']
+        # taps_per_phase * factor + 1 taps: odd length (integer group delay) and
+        # a window span that is a whole number of output periods
+        num_taps = self._taps_per_phase * factor + 1
+        self.taps = signal.firwin(num_taps, 0.8 / factor, window=('kaiser', params['beta'])).astype(np.float32)
+        self._delay = (num_taps - 1) // 2
+        self._oscillator = Oscillator(2.0 * np.pi * center_freq / sample_rate)
+        self._buffer = np.zeros(self._delay, dtype=np.complex64)
+
+    def process(self, samples):
+        buffer = np.concatenate([self._buffer, self._oscillator.mix(samples)])
+        num_taps = len(self.taps)
+        count = (len(buffer) - num_taps) // self.factor + 1 if len(buffer) >= num_taps else 0
+        self._buffer = buffer[count * self.factor:]
+        if count == 0:
+            return np.zeros(0, dtype=np.complex64)
+        # upfirdn evaluates only the kept outputs (polyphase); full-convolution
+        # output k ends its window at input k * factor, so the windows that
+        # start at m * factor are outputs m + taps_per_phase
+        filtered = signal.upfirdn(self.taps, buffer[:(count - 1) * self.factor + num_taps], down=self.factor)
+        return filtered[self._taps_per_phase:self._taps_per_phase + count].astype(np.complex64, copy=False)
+
+    def flush(self):
+        return self.process(np.zeros(self._delay, dtype=np.float32))
+
+MIN_HOP_S = 0.002  # Finest hop chosen automatically
+AUTO_HOP_MIN_FRAMES_PER_DOT = 4  # Refine the hop when a dot spans fewer frames than this
+AUTO_HOP_FRAMES_PER_DOT = 8  # Frames per dot after refinement
+
+def frame_sizes(sample_rate, window_s=0.01, hop_s=None):
+    """Window and hop lengths in samples; ``hop_s=None`` means non-overlapping frames."""
+    window_size = int(sample_rate * window_s)
+    hop_size = window_size if hop_s is None else max(1, min(window_size, int(round(sample_rate * hop_s))))
+    return window_size, hop_size
+
+def choose_hop_s(dot_duration_s, window_s=0.01):
+    """Hop for a given dot length: the window itself unless a dot would span too few frames."""
+    if dot_duration_s is None or dot_duration_s >= AUTO_HOP_MIN_FRAMES_PER_DOT * window_s:
+        return window_s
+    return min(window_s, max(MIN_HOP_S, dot_duration_s / AUTO_HOP_FRAMES_PER_DOT))
+
+class ToneEnvelope:
+    """
+    Goertzel power of the target tone for consecutive frames, fed block by block.
+
+    Frames are ``window_size`` samples long and start every ``hop_size``
+    samples. With ``front_end='direct'`` and non-overlapping frames the
+    vectorized Goertzel runs on the native-rate samples. Overlapping frames
+    are computed from prefix sums of the signal mixed to 0 Hz (at the
+    Goertzel bin frequency), one ``BASEBAND_BLOCK_SAMPLES`` block at a time:
+    each frame is the difference of two strided views of the prefix sum, so
+    the cost stays O(N) and the memory bounded whatever the hop.
+
+    ``front_end='baseband'`` first decimates the mixed signal
+    (``BasebandDecimator``) and sums frames of the narrowband signal the same
+    way; the power is rescaled by ``factor**2`` so it stays on the same scale as
+    the direct path. The baseband path costs more CPU than the direct Goertzel
+    (a couple of multiply-adds per sample) but rejects neighbouring signals far
+    better than a 10 ms Goertzel bin and does not quantize the target to the
+    bin grid. ``flush`` pads the tail the same way ``process_audio_file``
+    always has (one frame past the last hop boundary).
+    """
+    def __init__(self, sample_rate, target_freq, window_size, hop_size=None, front_end='direct', resample_quality='balanced'):
+        self.sample_rate = sample_rate
+        self.target_freq = target_freq
+        self.window_size = window_size
+        self.hop_size = hop_size or window_size
+        self.front_end = front_end
+        self._samples_seen = 0
+        self._oscillator = None
+        if front_end == 'baseband':
+            self.factor = baseband_decimation_factor(sample_rate, math.gcd(self.window_size, self.hop_size))
+            self._decimator = BasebandDecimator(sample_rate, target_freq, self.factor, resample_quality)
+            self._remainder = np.zeros(0, dtype=np.complex64)
+        elif front_end == 'direct':
+            self.factor = 1
+            if self.hop_size == self.window_size:
+                self._remainder = np.zeros(0, dtype=np.float32)
+            else:
+                k = int(0.5 + (window_size * target_freq) / sample_rate)
+                self._oscillator = Oscillator((2.0 * np.pi * k) / window_size)
+                self._remainder = np.zeros(0, dtype=np.complex64)
+        else:
+            raise ValueError(f"Unknown front end: {front_end}")
+
+    @property
+    def time_offset_s(self):
+        """Offset from a frame's hop slot to its centre, for timestamping overlapping frames."""
+        return (self.window_size - self.hop_size) / 2 / self.sample_rate
+
+    def process(self, samples):
+        self._samples_seen += len(samples)
+        if self._oscillator is None and self.front_end == 'direct':
+            return self._direct_frames(samples)
+        # Mixed samples and their prefix sums are complex, so overlapping
+        # frames are computed block by block to keep memory bounded
+        frames = []
+        for i in range(0, len(samples), BASEBAND_BLOCK_SAMPLES):
+            block = samples[i:i + BASEBAND_BLOCK_SAMPLES]
+            if self.front_end == 'baseband':
+                frames.append(self._sliding_frames([self._decimator.process(block)]))
+            else:
+                frames.append(self._sliding_frames([self._oscillator.mix(block)]))
+        return np.concatenate(frames) if frames else np.zeros(0, dtype=np.float64)
+
+    def flush(self):
+        # Zero-pad so the last frame starts on the final hop boundary
+        padded_length = (self._samples_seen // self.hop_size) * self.hop_size + self.window_size
+        padding = np.zeros(padded_length - self._samples_seen, dtype=np.float32)
+        if self.front_end == 'baseband':
+            return self._sliding_frames([self._decimator.process(padding), self._decimator.flush()])
+        if self._oscillator is not None:
+            return self._sliding_frames([self._oscillator.mix(padding)])
+        return self._direct_frames(padding)
+
+    def _direct_frames(self, samples):
+        if len(self._remainder):
+            samples = np.concatenate([self._remainder, samples])
+        num_chunks = len(samples) // self.window_size
+        self._remainder = samples[num_chunks * self.window_size:].copy()
+        frames = samples[:num_chunks * self.window_size].reshape(num_chunks, self.window_size)
+        return goertzel_frames_mag(frames, self.sample_rate, self.target_freq)
+
+    def _sliding_frames(self, mixed):
+        samples = np.concatenate([self._remainder] + mixed)
+        window = self.window_size // self.factor
+        hop = self.hop_size // self.factor
+        num_frames = (len(samples) - window) // hop + 1 if len(samples) >= window else 0
+        self._remainder = samples[num_frames * hop:].copy()
+        if num_frames == 0:
+            return np.zeros(0, dtype=np.float64)
+        prefix = np.concatenate(([0], np.cumsum(samples[:(num_frames - 1) * hop + window], dtype=np.complex128)))
+        sums = prefix[window::hop] - prefix[:len(prefix) - window:hop]
+        return (sums.real ** 2 + sums.imag ** 2) * self.factor ** 2
+
+TONE_MIN_FREQ = 300
+TONE_MAX_FREQ = 1500
+
+def analyze_tone_frequency(y, sr, min_freq=TONE_MIN_FREQ, max_freq=TONE_MAX_FREQ,
+                           resolution_hz=8.0, max_seconds=None, decimate=False, max_peaks=3):
+    """
+    Finds the Morse tone with an averaged short-window power spectrum (Welch).
+
+    Hann-windowed, 50%-overlapping segments are transformed a block at a time
+    and only the ``min_freq``-``max_freq`` bins are accumulated, so the cost is
+    O(N log segment) and memory is bounded by the block size rather than the
+    signal length. ``max_seconds`` limits the analysis to the start of the
+    signal; ``decimate`` first reduces the rate to just above 2.5x ``max_freq``.
+
+    Returns a dict with the interpolated peak ``frequency``, a 0-1
+    ``confidence`` (peak height above the in-band median, saturating at 20 dB),
+    ``peak_snr_db`` and up to ``max_peaks`` ``secondary_peaks``.
+    """
+    if max_seconds is not None:
+        y = y[:int(max_seconds * sr)]
+    if decimate:
+        factor = int(sr // (2.5 * max_freq))
+        if factor > 1:
+            y = signal.resample_poly(y, 1, factor)
+            sr = sr / factor
+
+    nperseg = int(2 ** np.ceil(np.log2(sr / resolution_hz)))
+    if len(y) < nperseg:
+        y = np.pad(y, (0, nperseg - len(y)), 'constant')
+    hop = nperseg // 2
+    freqs = np.fft.rfftfreq(nperseg, d=1/sr)
+    band = np.flatnonzero((freqs > min_freq) & (freqs < max_freq))
+    window = np.hanning(nperseg).astype(np.float32)
+
+    segments = np.lib.stride_tricks.sliding_window_view(y, nperseg)[::hop]
+    power = np.zeros(len(band), dtype=np.float64)
+    for start in range(0, len(segments), FREQUENCY_BLOCK_SEGMENTS):
+        spectrum = np.fft.rfft(segments[start:start + FREQUENCY_BLOCK_SEGMENTS] * window, axis=1)
+        power += np.sum(np.abs(spectrum[:, band]) ** 2, axis=0)
+    power /= len(segments)
+
+    return _summarize_tone_peaks(freqs[band], power, sr / nperseg, max_peaks)
+
+def analyze_spectrum_frequency(analysis, min_freq=TONE_MIN_FREQ, max_freq=TONE_MAX_FREQ, max_peaks=3):
+    """
+    ``analyze_tone_frequency`` on an existing ``audio_preprocessor.SpectralAnalysis``.
+
+    Reads the in-band power of the denoised spectrogram, so preprocessing
+    and tone detection share one STFT. Returns the same dict.
+    """
+    band_freqs, power = analysis.band_power(min_freq, max_freq)
+    return _summarize_tone_peaks(band_freqs, power, analysis.sample_rate / analysis.n_fft, max_peaks)
+
+def _summarize_tone_peaks(band_freqs, power, bin_hz, max_peaks):
+    """Peak frequency, confidence and secondary peaks of an in-band power spectrum."""
+    peaks, _ = signal.find_peaks(power, distance=max(1, int(round(25.0 / bin_hz))))
+    if len(peaks) == 0:
+        peaks = np.array([int(np.argmax(power))])
+    peaks = peaks[np.argsort(power[peaks])[::-1]]
+
+    def interpolated_freq(i):
+        # Parabolic interpolation on log power around the peak bin
+        if 0 < i < len(power) - 1:
+            a, b, c = np.log(power[i - 1:i + 2] + 1e-30)
+            denom = a - 2 * b + c
+            offset = 0.5 * (a - c) / denom if denom != 0 else 0.0
+        else:
+            offset = 0.0
+        return float(band_freqs[0] + (i + offset) * bin_hz)
+
+    floor = np.median(power)
+    peak_power = power[peaks[0]]
+    peak_snr_db = float(10 * np.log10(peak_power / floor)) if floor > 0 and peak_power > 0 else 0.0
+
+    return {
+        'frequency': interpolated_freq(peaks[0]),
+        'confidence': float(np.clip(peak_snr_db / 20.0, 0.0, 1.0)),
+        'peak_snr_db': peak_snr_db,
+        'secondary_peaks': [
+            {
+                'frequency': interpolated_freq(i),
+                'relative_db': float(10 * np.log10(power[i] / peak_power)) if peak_power > 0 else 0.0
+            }
+            for i in peaks[1:max_peaks + 1]
+        ]
+    }
+
+def detect_peak_frequency(y, sr):
+    """Returns the strongest tone frequency in the 300-1500 Hz Morse range."""
+    return analyze_tone_frequency(y, sr)['frequency']
+
+# Symbol patterns are integer-coded as binary numbers behind a leading 1 bit
+# (dot = 0, dash = 1), e.g. '.-' -> 0b101, so a whole character can be looked
+# up in a flat array instead of building strings symbol by symbol.
+MORSE_DECODE_DICT = {v: k for k, v in MORSE_CODE_DICT.items()}
+MAX_SYMBOLS_PER_CHAR = max(len(code) for code in MORSE_CODE_DICT.values())
+
+def encode_symbols(pattern):
+    """Integer code for a dot/dash pattern such as '.-'."""
+    code = 1
+    for symbol in pattern:
+        code = (code << 1) | (symbol == '-')
+    return code
+
+MORSE_SYMBOL_TABLE = np.full(1 << (MAX_SYMBOLS_PER_CHAR + 1), '?', dtype='<U1')
+for _char, _pattern in MORSE_CODE_DICT.items():
+    if set(_pattern) <= {'.', '-'}:
+        MORSE_SYMBOL_TABLE[encode_symbols(_pattern)] = _char
+
+def run_length_encode(binary_signal):
+    """Returns ``(states, lengths)`` of the runs in a 0/1 signal."""
+    binary_signal = np.asarray(binary_signal)
+    if len(binary_signal) == 0:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(binary_signal)) + 1))
+    lengths = np.diff(np.append(starts, len(binary_signal)))
+    return binary_signal[starts], lengths
+
+def decode_runs(states, durations, dot_duration_s):
+    """
+    Classifies mark/space runs into characters with array operations.
+
+    Marks shorter than 1.7 dots are dots and longer than 2 dots are dashes;
+    spaces longer than 2 dots end a character and longer than 5 dots also
+    end a word. Returns ``(text, events)`` where each event covers a
+    character from the start of its first mark to the end of its last mark
+    (or the end of the signal for a trailing character).
+    """
+    if len(states) == 0:
+        return "", []
+
+    is_mark = states == 1
+    symbols = np.full(len(states), -1, dtype=np.int8)
+    symbols[is_mark & (durations < dot_duration_s * 1.7)] = 0
+    symbols[is_mark & (durations > dot_duration_s * 2.0)] = 1
+    breaks = ~is_mark & (durations > dot_duration_s * 2.0)
+
+    run_ends = np.cumsum(durations)
+    run_starts = np.concatenate(([0.0], run_ends[:-1]))
+
+    # Each break closes the group of runs since the previous break
+    break_idx = np.flatnonzero(breaks)
+    group = np.cumsum(breaks) - breaks
+    num_groups = len(break_idx) + 1
+
+    symbol_idx = np.flatnonzero(symbols >= 0)
+    symbol_group = group[symbol_idx]
+    counts = np.bincount(symbol_group, minlength=num_groups)
+    first = np.searchsorted(symbol_group, symbol_group, side='left')
+    rank = np.arange(len(symbol_idx)) - first
+    shift = counts[symbol_group] - 1 - rank
+    bits = np.where(counts[symbol_group] <= MAX_SYMBOLS_PER_CHAR, symbols[symbol_idx].astype(np.int64) << np.minimum(shift, 62), 0)
+    codes = np.bincount(symbol_group, weights=bits, minlength=num_groups).astype(np.int64)
+
+    emitted = np.flatnonzero(counts > 0)
+    valid = counts[emitted] <= MAX_SYMBOLS_PER_CHAR
+    letters = np.full(len(emitted), '?', dtype='<U1')
+    letters[valid] = MORSE_SYMBOL_TABLE[(1 << counts[emitted][valid]) | codes[emitted][valid]]
+
+    starts = run_starts[symbol_idx[np.searchsorted(symbol_group, emitted)]]
+    # Closed groups end where their break starts; a trailing group ends with the signal
+    closed = emitted < len(break_idx)
+    ends = np.full(len(emitted), run_ends[-1])
+    ends[closed] = run_starts[break_idx[emitted[closed]]]
+    word_gap = np.zeros(len(emitted), dtype=bool)
+    word_gap[closed] = durations[break_idx[emitted[closed]]] > dot_duration_s * 5.0
+
+    letters, starts, ends, word_gap = letters.tolist(), starts.tolist(), ends.tolist(), word_gap.tolist()
+    text = "".join(letter + ' ' if gap else letter for letter, gap in zip(letters, word_gap))
+    events = [{'start': start, 'end': end, 'char': letter} for start, end, letter in zip(starts, ends, letters)]
+    return text, events
+
+def select_target_frequency(y, sr, frequency_override=None, analysis=None):
+    """
+    Returns ``(target_freq, frequency_detection)``; detection is skipped for an
+    override and reads the spectrogram of ``analysis`` (a ``SpectralAnalysis``) if given.
+    """
+    if frequency_override is not None:
+        return frequency_override, None
+    if analysis is not None:
+        frequency_detection = analyze_spectrum_frequency(analysis)
+    else:
+        frequency_detection = analyze_tone_frequency(y, sr)
+    return frequency_detection['frequency'], frequency_detection
+
+def compute_envelope(y, sr, target_freq, window_s=0.01, hop_s=None, front_end='direct', resample_quality='balanced'):
+    """
+    Goertzel power of ``target_freq`` for every frame of ``y`` (see ``ToneEnvelope``).
+
+    Returns ``(magnitudes, envelope)``; the envelope carries the frame sizes
+    and timestamp offset the decoder needs.
+    """
+    window_size, hop_size = frame_sizes(sr, window_s, hop_s)
+    envelope = ToneEnvelope(sr, target_freq, window_size, hop_size, front_end=front_end, resample_quality=resample_quality)
+    return np.concatenate([envelope.process(y), envelope.flush()]), envelope
+
+SPECTRAL_TONE_BANDWIDTH_HZ = 50  # Bins summed around the tone for the spectrogram envelope
+
+def spectral_envelope(analysis, target_freq, window_s=0.01, threshold_factor=1.0):
+    """
+    Tone envelope read from the denoised spectrogram of a ``SpectralAnalysis``.
+
+    One value per STFT frame, scaled to the Goertzel power of a
+    ``window_s`` frame so thresholds and ``avg_snr`` keep their meaning.
+    The long STFT window makes thresholded marks short by ``mark_bias_s``
+    (for the ``(mean + max) / 2.5`` style threshold scaled by
+    ``threshold_factor``), and frames are centred on their hop slot.
+
+    Returns ``(magnitudes, frame_duration_s, time_offset_s, mark_bias_s)``.
+    """
+    window_size = window_s * analysis.sample_rate
+    magnitudes = analysis.tone_power(target_freq, SPECTRAL_TONE_BANDWIDTH_HZ) * (window_size / 2) ** 2
+    frame_duration_s = analysis.hop_length / analysis.sample_rate
+    mark_bias_s = analysis.burst_shortening_s(threshold_factor / 2.5)
+    return magnitudes, frame_duration_s, mark_bias_s / 2, mark_bias_s
+
+def first_pass_dot_duration(magnitudes, frame_duration_s, threshold_factor=1.0, threshold_mode='global',
+                            adaptive_window_s=3.0, mark_bias_s=0.0, timer=None):
+    """Dot length estimated from a thresholded envelope, or None without marks."""
+    timer = timer or StageTimer()
+    window_frames = max(1, int(round(adaptive_window_s / frame_duration_s)))
+    with timer.stage('threshold', len(magnitudes)):
+        binary_signal, _ = threshold_envelope(magnitudes, threshold_factor, threshold_mode, window_frames)
+    with timer.stage('rle', len(binary_signal)):
+        states, run_lengths = run_length_encode(binary_signal)
+    return estimate_dot_duration(run_lengths[states == 1] * frame_duration_s + mark_bias_s)
+
+def process_audio_file(filepath, wpm_override=None, threshold_factor=1.0, frequency_override=None, preprocess_config=None,
+                       front_end='direct', resample_quality='balanced', threshold_mode='global', adaptive_window_s=3.0,
+                       window_s=0.01, hop_s='auto', timer=None):
+    # Stage timings are collected on ``timer`` (a new StageTimer by default) and returned under 'timings'
+    timer = timer or StageTimer()
+
     try:
-        y, sr = librosa.load(filepath, sr=SAMPLE_RATE)
+        with timer.stage('load'):
+            y, sr = load_audio(filepath, resample_quality=resample_quality)
     except Exception as e:
-        return {'full_text': f'[ERROR: Could not load audio file: {e}]', 'wpm': 0, 'avg_snr': 0, 'events': [], 'binary_signal_data': []}
+        return {'full_text': f'[ERROR: Could not load audio file: {e}]', 'wpm': 0, 'avg_snr': 0, 'events': [], 'binary_signal_data': [], 'timings': timer.to_dict()}
+    timer.stages['load']['samples'] = len(y)
 
-    fft_result = np.fft.fft(y)
-    fft_freq = np.fft.fftfreq(len(y), d=1/sr)
-    
-    # Find the peak frequency in a sensible range (e.g., 300Hz to 1500Hz)
-    min_freq_idx = np.where(fft_freq > 300)[0][0]
-    max_freq_idx = np.where(fft_freq < 1500)[0][-1]
-    
-    peak_freq_idx = min_freq_idx + np.argmax(np.abs(fft_result[min_freq_idx:max_freq_idx]))
-    auto_detected_freq = fft_freq[peak_freq_idx]
-    
+    return process_audio_array(y, sr, wpm_override=wpm_override, threshold_factor=threshold_factor,
+                               frequency_override=frequency_override, preprocess_config=preprocess_config,
+                               front_end=front_end, resample_quality=resample_quality, threshold_mode=threshold_mode,
+                               adaptive_window_s=adaptive_window_s, window_s=window_s, hop_s=hop_s,
+                               timer=timer, source=filepath)
+
+def process_audio_array(y, sr, wpm_override=None, threshold_factor=1.0, frequency_override=None, preprocess_config=None,
+                        front_end='direct', resample_quality='balanced', threshold_mode='global', adaptive_window_s=3.0,
+                        window_s=0.01, hop_s='auto', timer=None, source='<array>'):
+    """
+    Decodes mono samples already in memory; ``process_audio_file`` minus the load.
+
+    ``preprocess_config`` (see ``audio_preprocessor.preprocess_audio``) is
+    applied to the samples first, so a single load feeds both preprocessing
+    and decoding without a temporary file. ``source`` only labels the log line.
+    """
+    timer = timer or StageTimer()
+    timer.audio_s = len(y) / sr
+
+    analysis = None
+    if preprocess_config and any(preprocess_config.values()):
+        with timer.stage('preprocessing', len(y)):
+            if preprocess_config.get('noise_reduction', False):
+                # Keep the denoised spectrogram: frequency detection reads it, and so
+                # does the envelope when the traffic is slow enough (see below)
+                y = audio_preprocessor.prefilter_audio(y, sr, preprocess_config)
+                analysis = audio_preprocessor.SpectralAnalysis(y, sr)
+            else:
+                y = audio_preprocessor.preprocess_audio(y, sr, preprocess_config)
+
+    # --- 1. Find Peak Frequency using an averaged short-window spectrum ---
+    # This gives us a much better starting point than a hardcoded frequency
     # Use the override if provided, otherwise use our auto-detected frequency
-    target_freq = frequency_override if frequency_override is not None else auto_detected_freq
-    print(f"Processing: {filepath}, WPM: {wpm_override}, Threshold: {threshold_factor}, Freq: {target_freq} (Auto-detected: {auto_detected_freq:.1f} Hz)")
+    with timer.stage('frequency', len(y) if frequency_override is None else 0):
+        target_freq, frequency_detection = select_target_frequency(y, sr, frequency_override, analysis)
+    if frequency_detection is None:
+        print(f"Processing: {source}, WPM: {wpm_override}, Threshold: {threshold_factor}, Freq: {target_freq}")
+    else:
+        print(f"Processing: {source}, WPM: {wpm_override}, Threshold: {threshold_factor}, Freq: {target_freq:.1f} Hz (auto-detected, confidence {frequency_detection['confidence']:.2f})")
+
+    if analysis is not None:
+        # Decode straight from the denoised bins unless dots are shorter than the
+        # STFT frame (or a specific hop was asked for); otherwise resynthesize audio
+        normalize_method = preprocess_config.get('normalize', 'peak')
+        with timer.stage('envelope', analysis.num_frames):
+            magnitudes, frame_duration_s, time_offset_s, mark_bias_s = spectral_envelope(
+                analysis, target_freq, window_s, threshold_factor)
+            # Level as if the audio had been normalized (by the pre-subtraction signal's level)
+            magnitudes *= audio_preprocessor.normalization_gain(y, normalize_method) ** 2
+        if hop_s == 'auto':
+            dot_duration_s = 1.2 / wpm_override if wpm_override else first_pass_dot_duration(
+                magnitudes, frame_duration_s, threshold_factor, threshold_mode, adaptive_window_s, mark_bias_s, timer)
+            if dot_duration_s is not None and dot_duration_s >= analysis.n_fft / sr:
+                result = decode_envelope(magnitudes, frame_duration_s, target_freq, threshold_factor=threshold_factor,
+                                         wpm_override=wpm_override, frequency_detection=frequency_detection,
+                                         threshold_mode=threshold_mode, adaptive_window_s=adaptive_window_s,
+                                         time_offset_s=time_offset_s, mark_bias_s=mark_bias_s, timer=timer)
+                result['time_resolution']['window_s'] = analysis.n_fft / sr
+                return result
+        with timer.stage('preprocessing', len(y)):
+            y = analysis.resynthesize()
+            y *= audio_preprocessor.normalization_gain(y, normalize_method)
+        analysis = None
 
     # --- 2. Goertzel Analysis ---
-    chunk_duration_s = 0.01
-    chunk_size = int(sr * chunk_duration_s)
-    padding = chunk_size - (len(y) % chunk_size)
-    y_padded = np.pad(y, (0, padding), 'constant')
-    num_chunks = len(y_padded) // chunk_size
-    
-    magnitudes = [goertzel_mag(y_padded[i*chunk_size : (i+1)*chunk_size], sr, target_freq) for i in range(num_chunks)]
-    magnitudes = np.array(magnitudes)
+    # Native-rate samples; the baseband front end narrows them to a few kHz first.
+    # hop_s='auto' starts with non-overlapping frames and only switches to a
+    # finer hop when the dot length (override or first-pass estimate) needs it.
+    auto_hop = hop_s == 'auto'
+    if auto_hop:
+        hop_s = choose_hop_s(1.2 / wpm_override if wpm_override else None, window_s)
+    with timer.stage('envelope', len(y)):
+        magnitudes, envelope = compute_envelope(y, sr, target_freq, window_s, hop_s, front_end, resample_quality)
+    frame_duration_s = envelope.hop_size / sr
 
-    # --- 3. Thresholding and Binary Signal Creation ---
-    if np.max(magnitudes) > 0:
+    if auto_hop and wpm_override is None:
+        dot_duration_s = first_pass_dot_duration(magnitudes, frame_duration_s, threshold_factor, threshold_mode,
+                                                 adaptive_window_s, timer=timer)
+        refined_hop_s = choose_hop_s(dot_duration_s, window_s)
+        if refined_hop_s < hop_s:
+            print(f"Fast traffic: refining hop to {refined_hop_s * 1000:.1f} ms")
+            with timer.stage('envelope', len(y)):
+                magnitudes, envelope = compute_envelope(y, sr, target_freq, window_s, refined_hop_s, front_end, resample_quality)
+            frame_duration_s = envelope.hop_size / sr
+
+    return decode_envelope(magnitudes, frame_duration_s, target_freq, threshold_factor=threshold_factor,
+                           wpm_override=wpm_override, frequency_detection=frequency_detection,
+                           threshold_mode=threshold_mode, adaptive_window_s=adaptive_window_s,
+                           time_offset_s=envelope.time_offset_s, timer=timer)
+
+def estimate_dot_duration(mark_durations, counts=None):
+    """
+    Dot length from mark durations: the median of the marks shorter than the
+    mean when the marks vary (dots and dashes), otherwise of all marks.
+    ``counts`` weights each duration, e.g. a mark-length histogram (the
+    durations must then be sorted). Returns None if there are no marks.
+    """
+    if counts is None:
+        mark_durations = np.sort(mark_durations)
+        counts = np.ones(len(mark_durations), dtype=np.int64)
+    total = np.sum(counts)
+    if total == 0:
+        return None
+    mean_mark = np.dot(counts, mark_durations) / total
+    std_mark = np.sqrt(np.dot(counts, (mark_durations - mean_mark) ** 2) / total)
+    if mean_mark > 0 and std_mark > 0.02:
+        dot_counts = np.where(mark_durations < mean_mark, counts, 0)
+        if not dot_counts.any():
+            return _weighted_median(mark_durations / 3, counts)
+    else:
+        dot_counts = counts
+    return _weighted_median(mark_durations, dot_counts)
+
+def global_threshold(mean, peak):
+    """The automatic base threshold of an envelope, ``(mean + max) / 2.5``; works on running statistics too."""
+    return (mean + peak) / 2.5
+
+ADAPTIVE_NOISE_FLOOR_FACTOR = 16  # Adaptive thresholds stay 12 dB above the noise level
+
+def envelope_noise_level(magnitudes, threshold=None):
+    """
+    Noise level of an envelope: the median of the frames at or below the
+    global ``(mean + max) / 2.5`` threshold (or ``threshold``), so key-down
+    frames do not count however dense the traffic is. 0.0 if there are none.
+    """
+    if len(magnitudes) == 0:
+        return 0.0
+    if threshold is None:
+        threshold = global_threshold(np.mean(magnitudes), np.max(magnitudes))
+    off_frames = magnitudes[magnitudes <= threshold]
+    return float(np.median(off_frames)) if len(off_frames) else 0.0
+
+def adaptive_thresholds(magnitudes, window_frames, threshold_factor=1.0, noise_level=0.0):
+    """
+    Per-frame threshold from trailing-window noise-floor and peak statistics.
+
+    The running minimum and maximum over the last ``window_frames`` frames are
+    computed in O(N) (van Herk/Gil-Werman filters), and the threshold sits
+    1/2.5 of the way from floor to peak, mirroring the global
+    ``(mean + max) / 2.5`` rule. A window with no tone would threshold its
+    noise into marks, so the threshold never drops below
+    ``ADAPTIVE_NOISE_FLOOR_FACTOR`` times ``noise_level``
+    (see ``envelope_noise_level``).
+    """
+    origin = (window_frames - 1) // 2  # Shift the footprint so it ends at the current frame
+    floor = ndimage.minimum_filter1d(magnitudes, window_frames, mode='nearest', origin=origin)
+    peak = ndimage.maximum_filter1d(magnitudes, window_frames, mode='nearest', origin=origin)
+    thresholds = np.maximum(floor + (peak - floor) / 2.5, ADAPTIVE_NOISE_FLOOR_FACTOR * noise_level)
+    return thresholds * threshold_factor
+
+def threshold_envelope(magnitudes, threshold_factor=1.0, threshold_mode='global', window_frames=None):
+    """
+    Returns ``(binary_signal, avg_snr)`` for a magnitude envelope.
+
+    ``threshold_mode='global'`` uses one threshold for the whole envelope;
+    ``'adaptive'`` follows fades and bursts with ``adaptive_thresholds`` over
+    ``window_frames`` frames, floored by the envelope's noise level.
+    """
+    if threshold_mode == 'adaptive':
+        thresholds = adaptive_thresholds(magnitudes, window_frames, threshold_factor, envelope_noise_level(magnitudes))
+        binary_signal = (magnitudes > thresholds).astype(int)
+        on_signals = magnitudes[binary_signal == 1]
+        avg_snr = np.mean(on_signals) if len(on_signals) > 0 else 0.0
+    elif np.max(magnitudes) > 0:
         # The base threshold is calculated automatically
-        base_threshold = (np.mean(magnitudes) + np.max(magnitudes)) / 2.5
+        base_threshold = global_threshold(np.mean(magnitudes), np.max(magnitudes))
         # The user's factor adjusts this threshold
         tuned_threshold = base_threshold * threshold_factor
         
@@ -124,35 +883,49 @@ def process_audio_file(filepath, wpm_override=None, threshold_factor=1.0, freque
         on_signals = magnitudes[binary_signal == 1]
         avg_snr = np.mean(on_signals) if len(on_signals) > 0 else 0.0
     else:
-        binary_signal = np.zeros_like(magnitudes)
+        binary_signal = np.zeros_like(magnitudes, dtype=int)
         avg_snr = 0.0
+    return binary_signal, avg_snr
+
+def decode_envelope(magnitudes, chunk_duration_s, target_freq, threshold_factor=1.0, wpm_override=None,
+                    frequency_detection=None, include_binary_signal=True, threshold_mode='global', adaptive_window_s=3.0,
+                    time_offset_s=0.0, mark_bias_s=0.0, timer=None):
+    """
+    Steps 3-5 of the decoder: threshold, run-length encode and classify an
+    envelope whose frames start every ``chunk_duration_s`` seconds. Marks
+    are lengthened (and spaces shortened) by ``mark_bias_s`` for envelopes
+    whose analysis window shortens them. The stages are recorded on
+    ``timer`` (a ``StageTimer``) and returned under ``timings``.
+    """
+    timer = timer or StageTimer()
+
+    # --- 3. Thresholding and Binary Signal Creation ---
+    window_frames = max(1, int(round(adaptive_window_s / chunk_duration_s)))
+    with timer.stage('threshold', len(magnitudes)):
+        binary_signal, avg_snr = threshold_envelope(magnitudes, threshold_factor, threshold_mode, window_frames)
 
     # --- 4. Decode Binary Signal into Timings ---
-    # A simpler, more explicit run-length encoding implementation
-    durations = []
-    states = []
-    if len(binary_signal) > 0:
-        current_run_length = 1
-        current_run_state = binary_signal[0]
-        for i in range(1, len(binary_signal)):
-            if binary_signal[i] == current_run_state:
-                current_run_length += 1
-            else:
-                durations.append(current_run_length * chunk_duration_s)
-                states.append(current_run_state)
-                current_run_state = binary_signal[i]
-                current_run_length = 1
-        # Append the final run
-        durations.append(current_run_length * chunk_duration_s)
-        states.append(current_run_state)
-    
-    durations = np.array(durations)
-    states = np.array(states)
+    with timer.stage('rle', len(binary_signal)):
+        states, run_lengths = run_length_encode(binary_signal)
+        durations = run_lengths * chunk_duration_s
+        if mark_bias_s:
+            durations = np.maximum(durations + np.where(states == 1, mark_bias_s, -mark_bias_s), 0.0)
+
+    with timer.stage('decode', len(states)):
+        result = _decode_timings(binary_signal, states, durations, avg_snr, target_freq, threshold_factor,
+                                 wpm_override, frequency_detection, include_binary_signal, time_offset_s)
+    result['time_resolution'] = {'hop_s': chunk_duration_s, 'window_s': chunk_duration_s + 2 * time_offset_s}
+    result['timings'] = timer.to_dict()
+    return result
+
+def _decode_timings(binary_signal, states, durations, avg_snr, target_freq, threshold_factor,
+                    wpm_override, frequency_detection, include_binary_signal, time_offset_s=0.0):
+    binary_signal_data = binary_signal.tolist() if include_binary_signal else []
 
     # --- 5. Classify Durations and Decode ---
     mark_durations = durations[states == 1]
     if len(mark_durations) < 2:
-        return {'full_text': '[ERROR: Not enough signal detected]', 'wpm': 0, 'avg_snr': avg_snr, 'events': [], 'binary_signal_data': binary_signal.tolist(), 'frequency': target_freq}
+        return {'full_text': '[ERROR: Not enough signal detected]', 'wpm': 0, 'avg_snr': avg_snr, 'events': [], 'binary_signal_data': binary_signal_data, 'frequency': target_freq, 'frequency_detection': frequency_detection}
 
     # Use WPM override if provided, otherwise auto-detect
     if wpm_override is not None:
@@ -161,76 +934,22 @@ def process_audio_file(filepath, wpm_override=None, threshold_factor=1.0, freque
         print(f"Using WPM override: {wpm}, Dot duration: {estimated_dot_s:.3f}s")
     else:
         # Robust auto-detection
-        if np.mean(mark_durations) > 0 and np.std(mark_durations) > 0.02:
-            mean_mark = np.mean(mark_durations)
-            dot_marks = [d for d in mark_durations if d < mean_mark]
-            if not dot_marks: dot_marks = [d / 3 for d in mark_durations]
-        else:
-            dot_marks = mark_durations
-
-        if not dot_marks:
-            return {'full_text': '[ERROR: Could not determine dot timing]', 'wpm': 0, 'avg_snr': avg_snr, 'events': [], 'binary_signal_data': binary_signal.tolist(), 'frequency': target_freq}
+        estimated_dot_s = estimate_dot_duration(mark_durations)
+        if estimated_dot_s is None:
+            return {'full_text': '[ERROR: Could not determine dot timing]', 'wpm': 0, 'avg_snr': avg_snr, 'events': [], 'binary_signal_data': binary_signal_data, 'frequency': target_freq, 'frequency_detection': frequency_detection}
 
-        estimated_dot_s = np.median(dot_marks)
         if estimated_dot_s == 0:
-           return {'full_text': '[ERROR: No signal duration detected]', 'wpm': 0, 'avg_snr': avg_snr, 'events': [], 'binary_signal_data': binary_signal.tolist(), 'frequency': target_freq}
+           return {'full_text': '[ERROR: No signal duration detected]', 'wpm': 0, 'avg_snr': avg_snr, 'events': [], 'binary_signal_data': binary_signal_data, 'frequency': target_freq, 'frequency_detection': frequency_detection}
         
         wpm = 1.2 / estimated_dot_s
         print(f"Auto-detected dot duration: {estimated_dot_s:.3f}s, Calculated WPM: {wpm:.1f}")
 
-    DOT_MAX = estimated_dot_s * 1.7
-    DASH_MIN = estimated_dot_s * 2.0
-    CHAR_SPACE_MIN = estimated_dot_s * 2.0
-    WORD_SPACE_MIN = estimated_dot_s * 5.0
-    
-    MORSE_DECODE_DICT = {v: k for k, v in MORSE_CODE_DICT.items()}
-    decoded_parts = []
-    current_char = ""
-    timestamped_events = []
-    char_start_time = 0
-
-    time_cursor = 0.0
-    for i, state in enumerate(states):
-        duration_s = durations[i]
-        if state == 1: # Mark (tone)
-            if not current_char: # First mark of a new potential character
-                char_start_time = time_cursor
-            
-            if duration_s < DOT_MAX:
-                current_char += "."
-            elif duration_s > DASH_MIN:
-                current_char += "-"
-        else: # Space
-            if current_char and duration_s > CHAR_SPACE_MIN:
-                letter = MORSE_DECODE_DICT.get(current_char, '?')
-                decoded_parts.append(letter)
-                
-                # The character region starts at the beginning of its first mark
-                # and ends at the end of its last mark (the start of the current space).
-                timestamped_events.append({
-                    'start': char_start_time,
-                    'end': time_cursor,
-                    'char': letter
-                })
-                
-                if duration_s > WORD_SPACE_MIN:
-                    decoded_parts.append(' ')
-                
-                current_char = ""
-        time_cursor += duration_s
-
-    # Add the final character if it exists at the end of the file
-    if current_char:
-        letter = MORSE_DECODE_DICT.get(current_char, '?')
-        decoded_parts.append(letter)
-        timestamped_events.append({
-            'start': char_start_time,
-            'end': time_cursor,
-            'char': letter
-        })
-    
-    # Assemble the final string from the parts
-    final_text = "".join(decoded_parts)
+    final_text, timestamped_events = decode_runs(states, durations, estimated_dot_s)
+    if time_offset_s:
+        # Overlapping frames: timestamp each run from the centre of its first frame
+        for event in timestamped_events:
+            event['start'] += time_offset_s
+            event['end'] += time_offset_s
     
     print(f"Decoded text: {final_text}")
 
@@ -239,7 +958,475 @@ def process_audio_file(filepath, wpm_override=None, threshold_factor=1.0, freque
         'wpm': round(wpm, 1),
         'threshold_factor': threshold_factor,
         'frequency': round(target_freq),
+        'frequency_detection': frequency_detection,
         'avg_snr': avg_snr,
         'events': timestamped_events,
-        'binary_signal_data': binary_signal.tolist()
+        'binary_signal_data': binary_signal_data
+    }
+
+def sweep_audio_file(filepath, threshold_factors=(1.0,), wpm_values=(None,), frequencies=(None,),
+                     front_end='direct', resample_quality='balanced', include_binary_signal=False,
+                     threshold_mode='global', adaptive_window_s=3.0, window_s=0.01, hop_s=None):
+    """
+    Decodes one file under a grid of settings from a single analysis pass.
+
+    The file is loaded once and the Goertzel envelope is computed once per
+    entry of ``frequencies`` (``None`` = auto-detect); every threshold factor
+    is then applied to the cached envelope, and every WPM value (``None`` =
+    auto-detect) reuses that threshold's run-length encoding. Returns one
+    ``process_audio_file``-style result per configuration, each with a
+    ``config`` dict naming the settings that produced it.
+    """
+    try:
+        y, sr = load_audio(filepath, resample_quality=resample_quality)
+    except Exception as e:
+        return [{'full_text': f'[ERROR: Could not load audio file: {e}]', 'wpm': 0, 'avg_snr': 0, 'events': [], 'binary_signal_data': []}]
+
+    results = []
+    for frequency_override in frequencies:
+        target_freq, frequency_detection = select_target_frequency(y, sr, frequency_override)
+        magnitudes, envelope = compute_envelope(y, sr, target_freq, window_s, hop_s, front_end, resample_quality)
+        chunk_duration_s = envelope.hop_size / sr
+        window_frames = max(1, int(round(adaptive_window_s / chunk_duration_s)))
+
+        for threshold_factor in threshold_factors:
+            binary_signal, avg_snr = threshold_envelope(magnitudes, threshold_factor, threshold_mode, window_frames)
+            states, run_lengths = run_length_encode(binary_signal)
+            durations = run_lengths * chunk_duration_s
+
+            for wpm_override in wpm_values:
+                result = _decode_timings(binary_signal, states, durations, avg_snr, target_freq, threshold_factor,
+                                         wpm_override, frequency_detection, include_binary_signal,
+                                         envelope.time_offset_s)
+                result['config'] = {
+                    'frequency': frequency_override,
+                    'threshold_factor': threshold_factor,
+                    'wpm': wpm_override
+                }
+                results.append(result)
+    return results
+
+PREPASS_SECONDS = 60  # Audio read by the parallel decoder's frequency/dot-length pre-pass
+MIN_SEGMENT_SECONDS = 30
+
+def _read_mono(sound_file, start, frames):
+    """Reads ``frames`` samples from ``start`` as mono float32 (like librosa.load)."""
+    sound_file.seek(start)
+    data = sound_file.read(frames, dtype='float32', always_2d=True)
+    return data.mean(axis=1, dtype=np.float32) if data.shape[1] > 1 else data[:, 0]
+
+def _segment_envelope(filepath, start, end, is_last, target_freq, window_size, hop_size, front_end, resample_quality):
+    """
+    Worker: envelope frames starting in ``[start, end)`` of a file, read lazily.
+
+    Extra samples are read on both sides so frames at the seams see exactly
+    the samples (and, for the baseband front end, the filter history) they
+    would in a whole-file pass; the last segment also gets the same end-of-file
+    padding frame.
+    """
+    with sf.SoundFile(filepath) as sound_file:
+        sr = sound_file.samplerate
+        envelope = ToneEnvelope(sr, target_freq, window_size, hop_size, front_end=front_end, resample_quality=resample_quality)
+        delay = envelope._decimator._delay if front_end == 'baseband' else 0
+        preroll = min(start, -(-delay // hop_size) * hop_size)
+        read_end = sound_file.frames if is_last else min(sound_file.frames, end + window_size + delay)
+        samples = _read_mono(sound_file, start - preroll, read_end - (start - preroll))
+
+    magnitudes = np.concatenate([envelope.process(samples), envelope.flush()])
+    first = preroll // hop_size
+    return magnitudes[first:] if is_last else magnitudes[first:first + (end - start) // hop_size]
+
+def process_audio_file_parallel(filepath, wpm_override=None, threshold_factor=1.0, frequency_override=None,
+                                front_end='direct', resample_quality='balanced', threshold_mode='global',
+                                adaptive_window_s=3.0, window_s=0.01, hop_s='auto', workers=None, segment_s=None,
+                                timer=None):
+    """
+    Decodes one long file on several cores.
+
+    A cheap pre-pass over the first PREPASS_SECONDS picks the tone frequency
+    and, for ``hop_s='auto'``, the hop from the dot length. The file is then
+    split into hop-aligned segments that worker processes read lazily with
+    ``soundfile`` seeks and turn into envelope frames. Segments are read with
+    enough overlap that every frame is computed from the same samples as in a
+    single pass, so concatenating them has no duplicate or missing frames.
+    The parent thresholds and decodes the joined envelope, which keeps the
+    global threshold statistics and character assembly exact across seams
+    and costs little next to the envelope stage. Formats libsndfile cannot
+    seek (e.g. MP3) fall back to ``process_audio_file``.
+    """
+    timer = timer or StageTimer()
+    try:
+        sound_file = sf.SoundFile(filepath)
+    except Exception:
+        return process_audio_file(filepath, wpm_override=wpm_override, threshold_factor=threshold_factor,
+                                  frequency_override=frequency_override, front_end=front_end,
+                                  resample_quality=resample_quality, threshold_mode=threshold_mode,
+                                  adaptive_window_s=adaptive_window_s, window_s=window_s, hop_s=hop_s,
+                                  timer=timer)
+    with sound_file, timer.stage('load'):
+        sr = sound_file.samplerate
+        total = sound_file.frames
+        head = _read_mono(sound_file, 0, min(total, int(PREPASS_SECONDS * sr)))
+    timer.stages['load']['samples'] = len(head)
+    timer.audio_s = total / sr
+
+    # --- Pre-pass: shared frequency and frame sizes ---
+    with timer.stage('frequency', len(head) if frequency_override is None else 0):
+        target_freq, frequency_detection = select_target_frequency(head, sr, frequency_override)
+    if hop_s == 'auto':
+        if wpm_override:
+            hop_s = choose_hop_s(1.2 / wpm_override, window_s)
+        else:
+            with timer.stage('prepass', len(head)):
+                magnitudes, envelope = compute_envelope(head, sr, target_freq, window_s, None, front_end, resample_quality)
+                frame_duration_s = envelope.hop_size / sr
+                window_frames = max(1, int(round(adaptive_window_s / frame_duration_s)))
+                binary_signal, _ = threshold_envelope(magnitudes, threshold_factor, threshold_mode, window_frames)
+                states, run_lengths = run_length_encode(binary_signal)
+                hop_s = choose_hop_s(estimate_dot_duration(run_lengths[states == 1] * frame_duration_s), window_s)
+    window_size, hop_size = frame_sizes(sr, window_s, hop_s)
+    del head
+
+    workers = workers or os.cpu_count() or 1
+    if segment_s is None:
+        segment_s = max(MIN_SEGMENT_SECONDS, total / sr / (workers * 2))
+    segment_size = max(1, int(segment_s * sr) // hop_size) * hop_size
+    starts = list(range(0, total, segment_size)) or [0]
+    print(f"Processing: {filepath} in {len(starts)} segments on {workers} workers, Freq: {target_freq:.1f} Hz, Hop: {hop_size / sr * 1000:.1f} ms")
+
+    # --- Parallel envelope detection ---
+    with ProcessPoolExecutor(max_workers=workers) as pool, timer.stage('envelope', total):
+        futures = [
+            pool.submit(_segment_envelope, filepath, start, min(start + segment_size, total), i == len(starts) - 1,
+                        target_freq, window_size, hop_size, front_end, resample_quality)
+            for i, start in enumerate(starts)
+        ]
+        magnitudes = np.concatenate([future.result() for future in futures])
+
+    result = decode_envelope(magnitudes, hop_size / sr, target_freq, threshold_factor=threshold_factor,
+                             wpm_override=wpm_override, frequency_detection=frequency_detection,
+                             threshold_mode=threshold_mode, adaptive_window_s=adaptive_window_s,
+                             time_offset_s=(window_size - hop_size) / 2 / sr, timer=timer)
+    result['segments'] = len(starts)
+    return result
+
+# --- ---
+# == Part 3: Streaming Decoder ==
+# --- ---
+
+def _weighted_median(values, counts):
+    """Median of ``values`` repeated ``counts`` times (same convention as np.median)."""
+    cumulative = np.cumsum(counts)
+    total = cumulative[-1]
+    lower = values[np.searchsorted(cumulative, (total - 1) // 2, side='right')]
+    upper = values[np.searchsorted(cumulative, total // 2, side='right')]
+    return (lower + upper) / 2
+
+class StreamingMorseDecoder:
+    """
+    Incremental Goertzel decoder for arbitrarily long recordings.
+
+    Feed sample blocks (e.g. from ``soundfile.blocks``) to ``feed``; every call
+    returns the text and timestamped events completed so far, and ``finish``
+    flushes the trailing character. Only a partial chunk, a bounded warm-up
+    buffer and a fixed-size mark-length histogram are kept between blocks, so
+    memory does not grow with the length of the input.
+
+    ``process_audio_file`` is deliberately not a wrapper over this class: it
+    classifies the whole envelope at once with array operations and relies on
+    file-wide passes (hop refinement, the noise-reduction spectrogram
+    envelope, ``binary_signal_data``) that a stream cannot make. Both apply
+    the same rules (``global_threshold``, ``adaptive_thresholds``,
+    ``estimate_dot_duration``), and ``benchmark.py check`` verifies that they
+    decode the same text. With a fixed base ``threshold`` (Goertzel power,
+    scaled by ``threshold_factor`` like the automatic one) and ``wpm`` the
+    output is identical to ``process_audio_file`` run with ``hop_s=None`` and
+    no preprocessing; with its default ``hop_s='auto'`` fast traffic gets a
+    finer hop, and noise reduction a different envelope. Otherwise the threshold
+    follows the running ``global_threshold`` statistics, or with
+    ``threshold_mode='adaptive'`` the same trailing-window floor/peak rule as
+    the batch path (only the last window of magnitudes is kept), and the dot
+    length is re-estimated from the mark-length histogram as marks arrive.
+    The adaptive noise floor uses ``noise_level`` when given (the output is
+    then identical to the batch path with that level) and is otherwise
+    estimated from the warm-up.
+
+    ``preprocess_config`` runs each block through an
+    ``audio_preprocessor.Preprocessor`` first; its output keeps the input's
+    timeline, so event times are unaffected by its latency.
+    """
+    MAX_MARK_FRAMES = 512   # Histogram bins for mark lengths; longer marks share the last bin
+    MAX_PENDING_RUNS = 1024  # Runs held back while the dot length is still unknown
+
+    def __init__(self, sample_rate, frequency=None, wpm=None, threshold_factor=1.0,
+                 threshold=None, chunk_duration_s=0.01, warmup_s=2.0, min_marks=8,
+                 front_end='direct', resample_quality='balanced', threshold_mode='global', adaptive_window_s=3.0,
+                 window_s=None, preprocess_config=None, noise_level=None):
+        self.sample_rate = sample_rate
+        self.frequency = frequency
+        self.wpm = wpm
+        self.threshold_factor = threshold_factor
+        self.threshold = threshold
+        # chunk_duration_s is the hop; window_s (default: the hop) may be longer
+        self.window_size, self.chunk_size = frame_sizes(sample_rate, window_s or chunk_duration_s, chunk_duration_s)
+        self.chunk_duration_s = self.chunk_size / sample_rate
+        self.time_offset_s = (self.window_size - self.chunk_size) / 2 / sample_rate
+        self.warmup_samples = int(sample_rate * warmup_s)
+        self.warmup_frames = max(1, int(round(warmup_s / chunk_duration_s)))
+        self.min_marks = min_marks
+        self.front_end = front_end
+        self.resample_quality = resample_quality
+        self.threshold_mode = threshold_mode
+        self.adaptive_window_frames = max(1, int(round(adaptive_window_s / chunk_duration_s)))
+        self.noise_level = noise_level
+        self._preprocessor = audio_preprocessor.Preprocessor(sample_rate, preprocess_config) if preprocess_config else None
+
+        self._detect_buffer = []
+        self._detect_buffered = 0
+        self._envelope = None
+        self._warmup_magnitudes = []
+        self._warmup_thresholds = []
+        self._warming_up = threshold is None and (threshold_mode == 'global' or noise_level is None)
+        self._adaptive_history = np.zeros(0, dtype=np.float64)
+
+        # Running threshold statistics
+        self._mag_sum = 0.0
+        self._mag_count = 0
+        self._mag_max = 0.0
+        self._on_sum = 0.0
+        self._on_count = 0
+
+        # Run-length state
+        self._run_state = None
+        self._run_length = 0
+        self._pending_runs = deque()
+        self._mark_histogram = np.zeros(self.MAX_MARK_FRAMES + 1, dtype=np.int64)
+        self._marks_seen = 0
+        self.dot_duration_s = 1.2 / wpm if wpm else None
+
+        # Character assembly state
+        self._current_char = ""
+        self._char_start_time = 0.0
+        self._time_cursor = 0.0
+        self._text = []
+        self._events = []
+
+    @property
+    def avg_snr(self):
+        return self._on_sum / self._on_count if self._on_count else 0.0
+
+    @property
+    def estimated_wpm(self):
+        return 1.2 / self.dot_duration_s if self.dot_duration_s else 0
+
+    def feed(self, block):
+        """Consumes a block of samples and returns ``(text, events)`` decoded so far."""
+        block = np.asarray(block, dtype=np.float32)
+        if block.ndim > 1:
+            block = block.mean(axis=1)
+        if self._preprocessor is not None:
+            block = self._preprocessor.process(block)
+        self._feed_samples(block)
+        return self._drain_output()
+
+    def finish(self):
+        """Flushes buffered samples and the trailing character; returns ``(text, events)``."""
+        if self._preprocessor is not None:
+            self._feed_samples(self._preprocessor.flush())
+        if self.frequency is None:
+            if not self._detect_buffered:
+                return "", []
+            magnitudes = self._get_envelope().process(self._detect_frequency())
+            if len(magnitudes):
+                self._consume_magnitudes(magnitudes)
+
+        # Same end-of-file padding as process_audio_file (always at least one partial chunk)
+        self._consume_magnitudes(self._envelope.flush())
+
+        if self._warming_up:
+            self._release_warmup()
+        if self._run_state is not None:
+            self._push_run(self._run_state, self._run_length)
+            self._run_state = None
+        self._drain_pending(force=True)
+
+        if self._current_char:
+            self._emit_char(self._time_cursor)
+        return self._drain_output()
+
+    def _feed_samples(self, block):
+        if self.frequency is None:
+            self._detect_buffer.append(block)
+            self._detect_buffered += len(block)
+            if self._detect_buffered < self.warmup_samples:
+                return
+            block = self._detect_frequency()
+
+        magnitudes = self._get_envelope().process(block)
+        if len(magnitudes):
+            self._consume_magnitudes(magnitudes)
+
+    def _get_envelope(self):
+        if self._envelope is None:
+            self._envelope = ToneEnvelope(self.sample_rate, self.frequency, self.window_size, self.chunk_size,
+                                          front_end=self.front_end, resample_quality=self.resample_quality)
+        return self._envelope
+
+    def _detect_frequency(self):
+        buffered = np.concatenate(self._detect_buffer)
+        self._detect_buffer = []
+        self._detect_buffered = 0
+        self.frequency = detect_peak_frequency(buffered, self.sample_rate)
+        return buffered
+
+    def _consume_magnitudes(self, magnitudes):
+        if self.threshold is not None:
+            thresholds = self.threshold * self.threshold_factor
+        elif self.threshold_mode == 'adaptive':
+            # Prepend the previous window so block boundaries do not matter
+            history = self._adaptive_history
+            values = np.concatenate([history, magnitudes])
+            thresholds = adaptive_thresholds(values, self.adaptive_window_frames, self.threshold_factor,
+                                             self.noise_level or 0.0)[len(history):]
+            self._adaptive_history = values[max(0, len(values) - (self.adaptive_window_frames - 1)):]
+        else:
+            # Per-frame running (mean + max) / 2.5, independent of block boundaries
+            cumulative_sum = self._mag_sum + np.cumsum(magnitudes)
+            counts = self._mag_count + np.arange(1, len(magnitudes) + 1)
+            running_max = np.maximum(self._mag_max, np.maximum.accumulate(magnitudes))
+            thresholds = global_threshold(cumulative_sum / counts, running_max) * self.threshold_factor
+        self._mag_sum += float(np.sum(magnitudes))
+        self._mag_count += len(magnitudes)
+        self._mag_max = max(self._mag_max, float(np.max(magnitudes)))
+
+        if self._warming_up:
+            self._warmup_magnitudes.append(magnitudes)
+            self._warmup_thresholds.append(thresholds)
+            if self._mag_count >= self.warmup_frames:
+                self._release_warmup()
+            return
+        self._consume_binary(magnitudes, magnitudes > thresholds)
+
+    def _release_warmup(self):
+        """Binarizes the held-back warm-up frames against the statistics gathered so far."""
+        self._warming_up = False
+        if not self._warmup_magnitudes:
+            return
+        magnitudes = np.concatenate(self._warmup_magnitudes)
+        thresholds = np.concatenate(self._warmup_thresholds)
+        self._warmup_magnitudes = []
+        self._warmup_thresholds = []
+        base_threshold = global_threshold(self._mag_sum / self._mag_count, self._mag_max)
+        if self.threshold_mode == 'adaptive':
+            # The adaptive thresholds so far had no noise floor
+            self.noise_level = envelope_noise_level(magnitudes, base_threshold)
+            floor = ADAPTIVE_NOISE_FLOOR_FACTOR * self.noise_level * self.threshold_factor
+            binary = magnitudes > np.maximum(thresholds, floor)
+        elif self._mag_max > 0:
+            binary = magnitudes > base_threshold * self.threshold_factor
+        else:
+            binary = np.zeros(len(magnitudes), dtype=bool)
+        self._consume_binary(magnitudes, binary)
+
+    def _consume_binary(self, magnitudes, binary):
+        self._on_sum += float(np.sum(magnitudes[binary]))
+        self._on_count += int(np.count_nonzero(binary))
+
+        binary = binary.astype(np.int8)
+        boundaries = np.flatnonzero(np.diff(binary)) + 1
+        starts = np.concatenate(([0], boundaries))
+        lengths = np.diff(np.concatenate((starts, [len(binary)])))
+        for start, length in zip(starts, lengths):
+            state = int(binary[start])
+            if state == self._run_state:
+                self._run_length += int(length)
+                continue
+            if self._run_state is not None:
+                self._push_run(self._run_state, self._run_length)
+            self._run_state = state
+            self._run_length = int(length)
+
+    def _push_run(self, state, length):
+        if state == 1 and self.wpm is None:
+            self._mark_histogram[min(length, self.MAX_MARK_FRAMES)] += 1
+            self._marks_seen += 1
+            if self.dot_duration_s is not None:
+                self.dot_duration_s = self._estimate_dot_duration()
+        self._pending_runs.append((state, length))
+        self._drain_pending(force=len(self._pending_runs) > self.MAX_PENDING_RUNS)
+
+    def _drain_pending(self, force=False):
+        if self.dot_duration_s is None:
+            if self._marks_seen < self.min_marks and not force:
+                return
+            self.dot_duration_s = self._estimate_dot_duration()
+            if self.dot_duration_s is None:
+                # Nothing but silence so far; gaps before the first mark never emit
+                self._pending_runs.clear()
+                return
+        while self._pending_runs:
+            state, length = self._pending_runs.popleft()
+            self._assemble(state, length * self.chunk_duration_s)
+
+    def _estimate_dot_duration(self):
+        """``estimate_dot_duration``, as in process_audio_file, evaluated on the mark-length histogram."""
+        durations = np.arange(len(self._mark_histogram)) * self.chunk_duration_s
+        dot_s = estimate_dot_duration(durations, self._mark_histogram)
+        return dot_s if dot_s else None
+
+    def _assemble(self, state, duration_s):
+        dot_s = self.dot_duration_s
+        if state == 1:
+            if not self._current_char:
+                self._char_start_time = self._time_cursor
+            if duration_s < dot_s * 1.7:
+                self._current_char += "."
+            elif duration_s > dot_s * 2.0:
+                self._current_char += "-"
+        elif self._current_char and duration_s > dot_s * 2.0:
+            self._emit_char(self._time_cursor)
+            if duration_s > dot_s * 5.0:
+                self._text.append(' ')
+        self._time_cursor += duration_s
+
+    def _emit_char(self, end_time):
+        letter = MORSE_DECODE_DICT.get(self._current_char, '?')
+        self._text.append(letter)
+        self._events.append({'start': self._char_start_time + self.time_offset_s,
+                             'end': end_time + self.time_offset_s, 'char': letter})
+        self._current_char = ""
+
+    def _drain_output(self):
+        text, events = "".join(self._text), self._events
+        self._text, self._events = [], []
+        return text, events
+
+def decode_stream(blocks, sample_rate, **decoder_kwargs):
+    """
+    Decodes an iterable of sample blocks with ``StreamingMorseDecoder``.
+
+    Returns a dict shaped like ``process_audio_file``'s result (without the
+    per-frame ``binary_signal_data``), e.g.::
+
+        with sf.SoundFile(path) as f:
+            result = decode_stream(f.blocks(blocksize=65536, dtype='float32'), f.samplerate)
+    """
+    decoder = StreamingMorseDecoder(sample_rate, **decoder_kwargs)
+    text_parts, events = [], []
+    for block in blocks:
+        text, new_events = decoder.feed(block)
+        text_parts.append(text)
+        events.extend(new_events)
+    text, new_events = decoder.finish()
+    text_parts.append(text)
+    events.extend(new_events)
+
+    return {
+        'full_text': "".join(text_parts),
+        'wpm': round(decoder.estimated_wpm, 1),
+        'threshold_factor': decoder.threshold_factor,
+        'frequency': round(decoder.frequency) if decoder.frequency is not None else 0,
+        'avg_snr': decoder.avg_snr,
+        'events': events,
+        'binary_signal_data': []
     }
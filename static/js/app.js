@@ -27,6 +27,8 @@ document.addEventListener('DOMContentLoaded', () => {
     const textInput = document.getElementById('text-input');
     const textToMorseResults = document.getElementById('text-to-morse-results');
     const generatedAudioPlayer = document.getElementById('generated-audio-player');
+    const STREAM_MIN_CHARS = 200;  // Messages at least this long are streamed instead of cached
+    const STREAM_MAX_URL_LENGTH = 6000;  // Longer texts fall back to POST to stay under URL limits
     const textToMorseError = document.getElementById('text-to-morse-error');
     
     // Preprocessing controls
@@ -62,6 +64,13 @@ document.addEventListener('DOMContentLoaded', () => {
     const batchFileInput = document.getElementById('batch-file-input');
     const batchProcessButton = document.getElementById('batch-process-button');
     const batchStatus = document.getElementById('batch-status');
+    const batchProgress = document.getElementById('batch-progress');
+    const batchCancelButton = document.getElementById('batch-cancel-button');
+    // Request body limit of /batch-upload (the server's MAX_CONTENT_LENGTH), and a generous
+    // allowance for the multipart headers and boundary that each file adds to the body
+    const MAX_UPLOAD_BYTES = parseInt(batchFileInput.dataset.maxUploadBytes, 10) || 16 * 1024 * 1024;
+    const UPLOAD_PART_OVERHEAD = 1024;
+    const BATCH_FAILURES_SHOWN = 3;  // Most recent failed filenames listed under the progress bar
     
     // Waterfall display elements
     const waterfallContainer = document.getElementById('waterfall-container');
@@ -77,6 +86,8 @@ document.addEventListener('DOMContentLoaded', () => {
     let decodedRegions = [];
     let currentDecodedData = null; // Store decoded data for export
     let batchQueue = []; // Files queued for batch processing
+    let batchJob = null; // Batch job being watched, and its event stream
+    let batchEvents = null;
     let waterfallCtx = null;
     let waterfallData = []; // Waterfall frequency data
     let audioContext = null;
@@ -218,6 +229,8 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     });
     
+    batchCancelButton.addEventListener('click', cancelBatch);
+    
     // Waterfall toggle buttons
     const showWaterfallBtn = document.getElementById('show-waterfall-btn');
     
@@ -655,30 +668,35 @@ document.addEventListener('DOMContentLoaded', () => {
         batchStatus.style.color = 'var(--primary-color)';
         
         try {
-            // Upload files
-            const formData = new FormData();
-            for (let i = 0; i < files.length; i++) {
-                formData.append('files[]', files[i]);
-            }
-            
-            const uploadResponse = await fetch('/batch-upload', {
-                method: 'POST',
-                body: formData
-            });
-            
-            if (!uploadResponse.ok) {
-                throw new Error('Upload failed');
+            // Upload files in chunks whose total size stays under the request size limit;
+            // a file too large to upload on its own is reported instead of failing the batch
+            const { chunks, tooLarge } = chunkBatchUpload(files);
+            const uploadedFiles = [];
+            const uploadable = files.length - tooLarge.length;
+            let sent = 0;
+            for (const chunk of chunks) {
+                const formData = new FormData();
+                chunk.forEach(file => formData.append('files[]', file));
+                
+                const uploadResponse = await fetch('/batch-upload', {
+                    method: 'POST',
+                    body: formData
+                });
+                
+                if (!uploadResponse.ok) {
+                    throw new Error(uploadResponse.status === 413 ? 'Upload too large' : 'Upload failed');
+                }
+                
+                const uploadData = await uploadResponse.json();
+                uploadedFiles.push(...(uploadData.files || []));
+                sent += chunk.length;
+                batchStatus.textContent = `Uploading: ${sent}/${uploadable} file(s)...`;
             }
             
-            const uploadData = await uploadResponse.json();
-            const uploadedFiles = uploadData.files || [];
-            
             if (uploadedFiles.length === 0) {
-                throw new Error('No files were uploaded');
+                throw new Error(tooLarge.length > 0 ? `Too large to upload: ${tooLarge.join(', ')}` : 'No files were uploaded');
             }
             
-            batchStatus.textContent = `Processing ${uploadedFiles.length} file(s)...`;
-            
             // Get preprocessing config if enabled
             const config = {};
             if (preprocessEnabled && preprocessEnabled.checked) {
@@ -699,8 +717,8 @@ document.addEventListener('DOMContentLoaded', () => {
                 };
             }
             
-            // Process files
-            const processResponse = await fetch('/batch-process', {
+            // Queue the job; it returns at once and progress arrives over Server-Sent Events
+            const submitResponse = await fetch('/batch-jobs', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify({
@@ -712,34 +730,168 @@ document.addEventListener('DOMContentLoaded', () => {
                 })
             });
             
-            if (!processResponse.ok) {
-                throw new Error('Processing failed');
+            if (!submitResponse.ok) {
+                throw new Error('Could not queue batch');
             }
             
-            const processData = await processResponse.json();
-            const summary = processData.summary || {};
-            
-            // Update status
-            batchStatus.textContent = `Completed: ${summary.successful || 0}/${summary.total || 0} successful. Avg Quality: ${(summary.average_quality || 0).toFixed(1)}%`;
-            batchStatus.style.color = summary.failed === 0 ? '#10b981' : '#f59e0b';
+            const submitData = await submitResponse.json();
             
             // Reset batch queue
             batchQueue = [];
             batchFileInput.value = '';
             
-            setTimeout(() => {
-                batchStatus.style.display = 'none';
-            }, 5000);
+            watchBatchJob(submitData.job, tooLarge);
             
         } catch (error) {
             batchStatus.textContent = `Error: ${error.message}`;
             batchStatus.style.color = '#ef4444';
             console.error('Batch processing error:', error);
-        } finally {
             batchProcessButton.disabled = false;
         }
     }
     
+    function chunkBatchUpload(files) {
+        // Greedy packing in selection order: a chunk is closed when the next file would push
+        // it over the limit. Files that exceed the limit by themselves are returned by name.
+        const limit = MAX_UPLOAD_BYTES;
+        const chunks = [];
+        const tooLarge = [];
+        let chunk = [];
+        let chunkBytes = 0;
+        for (const file of files) {
+            const bytes = file.size + UPLOAD_PART_OVERHEAD;
+            if (bytes > limit) {
+                tooLarge.push(file.name);
+                continue;
+            }
+            if (chunk.length > 0 && chunkBytes + bytes > limit) {
+                chunks.push(chunk);
+                chunk = [];
+                chunkBytes = 0;
+            }
+            chunk.push(file);
+            chunkBytes += bytes;
+        }
+        if (chunk.length > 0) chunks.push(chunk);
+        return { chunks, tooLarge };
+    }
+    
+    function watchBatchJob(job, tooLarge = []) {
+        // Only counters and the last few failures are kept, and the DOM is updated at most
+        // once per animation frame, so batches of thousands of files render cheaply
+        const failures = [];
+        let frame = null;
+        
+        const scheduleRender = () => {
+            if (frame === null) {
+                frame = requestAnimationFrame(() => {
+                    frame = null;
+                    renderBatchJob(failures, tooLarge);
+                });
+            }
+        };
+        
+        batchJob = job;
+        batchProgress.max = Math.max(job.total, 1);
+        batchProgress.value = 0;
+        batchProgress.style.display = 'block';
+        batchCancelButton.style.display = 'block';
+        batchCancelButton.disabled = false;
+        renderBatchJob(failures, tooLarge);
+        
+        // EventSource reconnects by itself and resumes from the last file it saw
+        batchEvents = new EventSource(`/batch-jobs/${job.id}/events`);
+        batchEvents.addEventListener('progress', (e) => {
+            const item = JSON.parse(e.data);
+            if (item.status === 'failed') {
+                failures.push(item.filename);
+                if (failures.length > BATCH_FAILURES_SHOWN) failures.shift();
+                scheduleRender();
+            }
+        });
+        batchEvents.addEventListener('status', (e) => {
+            batchJob = JSON.parse(e.data);
+            scheduleRender();
+        });
+        batchEvents.addEventListener('end', (e) => {
+            batchJob = JSON.parse(e.data);
+            finishBatchJob();
+            renderBatchJob(failures, tooLarge);
+        });
+        batchEvents.addEventListener('error', () => {
+            if (batchEvents && batchEvents.readyState === EventSource.CLOSED) {
+                finishBatchJob();
+                batchStatus.textContent = 'Error: lost connection to batch job';
+                batchStatus.style.color = '#ef4444';
+            }
+        });
+    }
+    
+    function renderBatchJob(failures, tooLarge) {
+        const job = batchJob;
+        batchProgress.value = job.completed;
+        
+        let text;
+        if (job.status === 'queued') {
+            text = `Queued: ${job.total} file(s)`;
+        } else if (job.status === 'running') {
+            text = `Processing: ${job.completed}/${job.total} (${job.failed} failed)`;
+        } else if (job.status === 'completed') {
+            text = `Completed: ${job.succeeded}/${job.total} successful. Avg Quality: ${(job.average_quality || 0).toFixed(1)}%`;
+        } else if (job.status === 'cancelled') {
+            text = `Cancelled after ${job.completed}/${job.total} file(s)`;
+        } else {
+            text = `Error: ${job.error || 'batch failed'}`;
+        }
+        if (failures.length > 0) {
+            text += ` | Failed: ${failures.join(', ')}`;
+        }
+        if (tooLarge.length > 0) {
+            text += ` | Too large to upload: ${tooLarge.join(', ')}`;
+        }
+        batchStatus.textContent = text;
+        
+        if (job.status === 'failed') {
+            batchStatus.style.color = '#ef4444';
+        } else if (job.status === 'completed' || job.status === 'cancelled') {
+            batchStatus.style.color = job.failed === 0 && tooLarge.length === 0 && job.status === 'completed' ? '#10b981' : '#f59e0b';
+        } else {
+            batchStatus.style.color = 'var(--primary-color)';
+        }
+    }
+    
+    function finishBatchJob() {
+        if (batchEvents) {
+            batchEvents.close();
+            batchEvents = null;
+        }
+        batchCancelButton.style.display = 'none';
+        batchProcessButton.disabled = batchQueue.length === 0;
+        
+        setTimeout(() => {
+            if (!batchEvents) {
+                batchStatus.style.display = 'none';
+                batchProgress.style.display = 'none';
+            }
+        }, 5000);
+    }
+    
+    async function cancelBatch() {
+        if (!batchJob) return;
+        batchCancelButton.disabled = true;
+        try {
+            const response = await fetch(`/batch-jobs/${batchJob.id}/cancel`, { method: 'POST' });
+            if (!response.ok) {
+                const data = await response.json();
+                throw new Error(data.error || 'Cancel failed');
+            }
+            // The event stream reports the job once the current file finishes
+        } catch (error) {
+            console.error('Batch cancel error:', error);
+            batchCancelButton.disabled = false;
+        }
+    }
+    
     // --- WATERFALL DISPLAY ---
     function initializeWaterfall() {
         if (!waterfallCanvas || !waterfallCtx) return;
@@ -1079,6 +1231,15 @@ document.addEventListener('DOMContentLoaded', () => {
         if (!text) { showError(textToMorseError, 'Please enter some text.'); return; }
         textToMorseResults.classList.add('hidden');
         hideError(textToMorseError);
+        // Long messages are streamed straight into the player so playback starts immediately;
+        // short ones go through the cached generator
+        const streamUrl = `/translate-to-morse/stream?text=${encodeURIComponent(text)}`;
+        if (text.length >= STREAM_MIN_CHARS && streamUrl.length <= STREAM_MAX_URL_LENGTH) {
+            generatedAudioPlayer.src = streamUrl;
+            generatedAudioPlayer.load();
+            textToMorseResults.classList.remove('hidden');
+            return;
+        }
         try {
             const response = await fetch('/translate-to-morse', {
                 method: 'POST',